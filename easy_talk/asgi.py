@@ -3,6 +3,9 @@ ASGI config for easy_talk project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn easy_talk.asgi:application``) to enable
+the notifications stream (see ``NOTIFICACOES_AO_VIVO_SSE`` in settings).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -65,6 +65,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'terapia.context_processors.notificacoes',
             ],
         },
     },
@@ -139,6 +140,28 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 FORM_RENDERER = 'easy_talk.renderers.CustomFormRenderer'
 FIXTURE_DIRS = [BASE_DIR / 'fixtures']
 
+# Cache
+# LocMemCache é por processo: cada worker guarda a sua própria cópia da matriz de disponibilidade
+# (ver Psicologo.get_matriz_disponibilidade_booleanos_em_json), que não é compartilhada entre
+# workers. As chaves incluem a versão da disponibilidade, então nenhum worker serve uma matriz
+# desatualizada; só a primeira leitura em cada worker a reconstrói. Para compartilhar o cache
+# (e os contadores do django-ratelimit) entre workers em produção, troque o backend, por exemplo:
+#     'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#     'LOCATION': 'redis://127.0.0.1:6379',
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Notificações ao vivo
+# Entrega as notificações do cabeçalho por server-sent events. Só deve ser habilitado quando o
+# projeto é servido por um servidor ASGI (ex.: uvicorn easy_talk.asgi:application); com WSGI, o
+# cabeçalho consulta periodicamente as notificações novas
+
+NOTIFICACOES_AO_VIVO_SSE = False
+
 # Email
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
@@ -10,6 +10,7 @@
     }
 
     const OCUPADOS = new Set(Array.isArray(SERVER.ocupados) ? SERVER.ocupados : []);
+    const AGENDAVEIS = Array.isArray(SERVER.agendaveis) ? new Set(SERVER.agendaveis) : null;
 
     const CFG = {
         MATRIZ: Array.isArray(SERVER.matriz) ? SERVER.matriz : [],
@@ -61,6 +62,7 @@
 
             if (CFG.MIN_ANT && dt < minOK) continue;
             if (maxOK && dt > maxOK) continue;
+            if (AGENDAVEIS && !AGENDAVEIS.has(value)) continue;
 
             opcoes.push({label: `${pad(hh)}:${pad(mm)}`, value, disabled: false});
         }
@@ -2,7 +2,9 @@ from django.contrib import admin
 from django.contrib.auth import get_user_model
 from usuario.admin import UsuarioAdmin
 from .models import (
+    EmailPendente,
     Notificacao,
+    NotificacaoArquivada,
     Paciente,
     Psicologo,
     Consulta,
@@ -73,3 +75,16 @@ class IntervaloDisponibilidadeAdmin(admin.ModelAdmin):
 class NotificacaoAdmin(admin.ModelAdmin):
     list_display = ['__str__']
     list_display_links = None
+
+
+@admin.register(NotificacaoArquivada)
+class NotificacaoArquivadaAdmin(admin.ModelAdmin):
+    list_display = ['assunto', 'destinatario', 'data_hora_criada', 'data_hora_arquivada']
+    list_display_links = None
+
+
+@admin.register(EmailPendente)
+class EmailPendenteAdmin(admin.ModelAdmin):
+    list_display = ['assunto', 'destinatario', 'data_hora_criado', 'tentativas', 'enviado_em']
+    search_fields = ['destinatario', 'assunto']
+    list_filter = ['enviado_em']
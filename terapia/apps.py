@@ -25,6 +25,8 @@ class TerapiaConfig(AppConfig):
 
     def ready(self):
         """Initialize app: connect signals and run seed for development."""
+        from . import signals  # noqa: F401
+
         post_migrate.connect(run_seed_on_migrate, sender=self)
 
         is_runserver = 'runserver' in sys.argv
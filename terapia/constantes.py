@@ -14,3 +14,23 @@ CONSULTA_ANTECEDENCIA_MAXIMA = timedelta(days=60)
 CONSULTA_DURACAO = timedelta(hours=1)
 CONSULTA_DURACAO_MINUTOS = int(get_consulta_duracao_minutos())
 NUMERO_PERIODOS_POR_DIA = int(get_numero_periodos_por_dia())
+NUMERO_PERIODOS_POR_SEMANA = NUMERO_PERIODOS_POR_DIA * 7
+CACHE_MATRIZ_DISPONIBILIDADE_TIMEOUT = int(timedelta(days=1).total_seconds())
+SLOTS_AGENDAVEIS_HORIZONTE = CONSULTA_ANTECEDENCIA_MAXIMA + timedelta(days=1)
+ORDENACAO_DISPONIVEL_MAIS_CEDO = "disponivel_mais_cedo"
+CONVERSAO_DIA_SEMANA_CACHE_TAMANHO = 4096
+TRANSICOES_AUTOMATICAS_TAMANHO_LOTE = 500
+EMAILS_PENDENTES_TAMANHO_LOTE = 100
+EMAILS_PENDENTES_MAXIMO_TENTATIVAS = 5
+EMAILS_PENDENTES_ESPERA_BASE = timedelta(minutes=1)
+EMAILS_PENDENTES_RESERVA = timedelta(minutes=5)
+NOTIFICACOES_RECENTES_QUANTIDADE = 10
+NOTIFICACOES_POR_PAGINA = 20
+NOTIFICACOES_AO_VIVO_INTERVALO_POLLING = timedelta(seconds=15)
+NOTIFICACOES_AO_VIVO_DURACAO_MAXIMA = timedelta(minutes=5)
+NOTIFICACOES_AO_VIVO_ESPERA_RECONEXAO = timedelta(seconds=3)
+NOTIFICACOES_RETENCAO = timedelta(days=90)
+RETENCAO_TAMANHO_LOTE = 500
+MINHAS_CONSULTAS_POR_PAGINA = 20
+PESQUISA_PSICOLOGOS_POR_PAGINA = 12
+PESQUISA_SOBRE_MIM_RESUMO_TAMANHO = 500
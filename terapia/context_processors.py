@@ -0,0 +1,13 @@
+from django.conf import settings
+from .constantes import NOTIFICACOES_AO_VIVO_INTERVALO_POLLING
+
+
+def notificacoes(request):
+    """
+    Define como o cabeçalho recebe as notificações novas: pelo stream de server-sent events
+    (só com servidor ASGI) ou consultando-as a cada NOTIFICACOES_AO_VIVO_INTERVALO_POLLING.
+    """
+    return {
+        "NOTIFICACOES_AO_VIVO_SSE": settings.NOTIFICACOES_AO_VIVO_SSE,
+        "NOTIFICACOES_INTERVALO_POLLING_MS": int(NOTIFICACOES_AO_VIVO_INTERVALO_POLLING.total_seconds() * 1000),
+    }
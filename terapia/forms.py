@@ -5,10 +5,12 @@ from .widgets import (
     DisponibilidadeInput,
 )
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from easy_talk.renderers import (
     FormComValidacaoRenderer,
     FormDeFiltrosRenderer
 )
+from .constantes import ORDENACAO_DISPONIVEL_MAIS_CEDO
 from .models import (
     Paciente,
     Psicologo,
@@ -63,6 +65,14 @@ class PsicologoFiltrosForm(forms.Form):
         label="Máximo",
         widget=forms.NumberInput(attrs={'placeholder': 'Máximo'}),
     )
+    ordenacao = forms.ChoiceField(
+        required=False,
+        choices=[
+            ("", "Ordenar por"),
+            (ORDENACAO_DISPONIVEL_MAIS_CEDO, "Disponível mais cedo"),
+        ],
+        label="Ordenação",
+    )
 
 
 class ConsultaFiltrosForm(forms.Form):
@@ -157,9 +167,12 @@ class PsicologoDisponibilidadeChangeForm(forms.ModelForm):
 
         for intervalo in disponibilidade:
             intervalo.psicologo = psicologo
+            intervalo.atualizar_minutos_semana()
 
-        IntervaloDisponibilidade.objects.filter(psicologo=psicologo).delete()
-        IntervaloDisponibilidade.objects.bulk_create(disponibilidade)
+        # A máscara e os slots são reconstruídos uma vez só, e não a cada intervalo deletado
+        with transaction.atomic(), psicologo.adiar_atualizacao_da_mascara():
+            IntervaloDisponibilidade.objects.filter(psicologo=psicologo).delete()
+            IntervaloDisponibilidade.objects.bulk_create(disponibilidade)
 
         if commit:
             psicologo.save()
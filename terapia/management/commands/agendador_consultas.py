@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from terapia.models import Consulta
+
+
+class Command(BaseCommand):
+    help = (
+        'Long-running scheduler that applies the automatic consulta state transitions '
+        '(start and end of every active consulta) as soon as they are due'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=60,
+            help='Maximum number of seconds to sleep between checks for due transitions (default: 60)',
+        )
+        parser.add_argument(
+            '--uma-vez',
+            action='store_true',
+            help='Run a single iteration and exit',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                agora = timezone.now()
+                # Também põe em dia as transições que venceram enquanto o agendador estava parado
+                self.aplicar_transicoes(agora)
+
+                if options['uma_vez']:
+                    break
+
+                time.sleep(self.get_segundos_ate_a_proxima_transicao(agora, options['intervalo']))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('Scheduler stopped'))
+
+    def aplicar_transicoes(self, agora):
+        atualizadas = Consulta.atualizar_estados_automaticamente(agora=agora)
+
+        if atualizadas:
+            self.stdout.write(self.style.SUCCESS(f'{atualizadas} consulta(s) updated'))
+
+    def get_segundos_ate_a_proxima_transicao(self, agora, intervalo):
+        """
+        Retorna quanto dormir até a próxima transição posterior a "agora", lida do banco pelo
+        índice de proximo_evento_em (no máximo "intervalo"). Como o próximo instante é sempre
+        relido, consultas criadas, remarcadas ou confirmadas com atraso são vistas na próxima
+        verificação, sem nenhum estado em memória. As transições que não puderam ser aplicadas
+        em "agora" são tentadas de novo a cada "intervalo".
+        """
+        proximo_evento_em = Consulta.objects.filter(proximo_evento_em__gt=agora).order_by(
+            'proximo_evento_em',
+        ).values_list('proximo_evento_em', flat=True).first()
+
+        if proximo_evento_em is None:
+            return intervalo
+
+        segundos = (proximo_evento_em - timezone.now()).total_seconds()
+        return min(max(segundos, 0), intervalo)
@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from terapia.constantes import NOTIFICACOES_RETENCAO, RETENCAO_TAMANHO_LOTE
+from terapia.models import Notificacao
+from terapia.utilidades.geral import iterar_lotes_de_pks
+
+
+class Command(BaseCommand):
+    help = (
+        'Archives (or deletes) old read notifications and deletes expired sessions in small '
+        'primary-key-ordered batches, each in its own short transaction'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=NOTIFICACOES_RETENCAO.days,
+            help=f'Age in days after which read notifications are archived (default: {NOTIFICACOES_RETENCAO.days})',
+        )
+        parser.add_argument(
+            '--apagar',
+            action='store_true',
+            help='Delete the notifications instead of moving them to the archive table',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=RETENCAO_TAMANHO_LOTE,
+            help=f'Number of rows handled per transaction (default: {RETENCAO_TAMANHO_LOTE})',
+        )
+
+    def handle(self, *args, **options):
+        agora = timezone.now()
+
+        notificacoes = Notificacao.objects.a_arquivar(timedelta(days=options['dias']), agora).arquivar(
+            options['lote'], apagar=options['apagar'],
+        )
+        acao = 'deleted' if options['apagar'] else 'archived'
+        self.stdout.write(self.style.SUCCESS(f'{notificacoes} notification(s) {acao}'))
+
+        sessoes = 0
+
+        for pks in iterar_lotes_de_pks(Session.objects.filter(expire_date__lt=agora), options['lote']):
+            with transaction.atomic():
+                sessoes += Session.objects.filter(pk__in=pks, expire_date__lt=agora).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'{sessoes} expired session(s) deleted'))
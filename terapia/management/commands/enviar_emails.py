@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+from terapia.constantes import EMAILS_PENDENTES_TAMANHO_LOTE
+from terapia.models import EmailPendente
+
+
+class Command(BaseCommand):
+    help = 'Worker that delivers the queued emails (outbox) in batches over a single connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=EMAILS_PENDENTES_TAMANHO_LOTE,
+            help=f'Number of emails claimed per batch (default: {EMAILS_PENDENTES_TAMANHO_LOTE})',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=5,
+            help='Number of seconds to sleep when the outbox is empty (default: 5)',
+        )
+        parser.add_argument(
+            '--uma-vez',
+            action='store_true',
+            help='Deliver everything that is currently due and exit',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                try:
+                    enviados, falhas = EmailPendente.objects.enviar(options['lote'])
+                except OSError as e:
+                    # Não conseguiu nem abrir a conexão. Os e-mails reservados voltam para a fila
+                    # quando a reserva expirar
+                    if options['uma_vez']:
+                        raise
+                    self.stderr.write(self.style.ERROR(f'Could not connect to the mail server: {e}'))
+                    time.sleep(options['intervalo'])
+                    continue
+
+                if enviados or falhas:
+                    self.stdout.write(self.style.SUCCESS(f'{enviados} email(s) sent, {falhas} failed'))
+                    continue
+
+                if options['uma_vez']:
+                    break
+
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('Worker stopped'))
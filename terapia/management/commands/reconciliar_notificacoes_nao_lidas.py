@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from terapia.models import Notificacao
+
+
+class Command(BaseCommand):
+    help = 'Fixes the denormalized unread-notification counter of users whose counter drifted'
+
+    def handle(self, *args, **options):
+        corrigidos = Notificacao.reconciliar_contadores()
+        self.stdout.write(self.style.SUCCESS(f'{corrigidos} user(s) fixed'))
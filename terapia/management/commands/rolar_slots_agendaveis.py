@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from terapia.models import Psicologo, SlotAgendavel
+
+
+class Command(BaseCommand):
+    help = 'Rolls the materialized bookable-slot calendar forward (run daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=2,
+            help='Number of days at the end of the horizon to materialize (default: 2)',
+        )
+        parser.add_argument(
+            '--completo',
+            action='store_true',
+            help='Rebuild the whole horizon for every psychologist',
+        )
+
+    def handle(self, *args, **options):
+        if options['completo']:
+            psicologos = Psicologo.objects.only('id', 'mascara_disponibilidade')
+
+            for psicologo in psicologos:
+                SlotAgendavel.objects.sincronizar(psicologo)
+
+            self.stdout.write(self.style.SUCCESS(f'Slots rebuilt for {len(psicologos)} psychologist(s)'))
+            return
+
+        apagados = SlotAgendavel.objects.rolar_horizonte(dias=options['dias'])
+        self.stdout.write(self.style.SUCCESS(f'{apagados} past slot(s) removed and horizon rolled forward'))
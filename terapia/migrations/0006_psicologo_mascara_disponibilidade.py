@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-17 07:39
+
+from django.db import migrations, models
+from terapia.utilidades.disponibilidade import criar_mascara_disponibilidade, mascara_para_bytes
+
+
+def preencher_mascara_disponibilidade(apps, schema_editor):
+    Psicologo = apps.get_model('terapia', 'Psicologo')
+
+    for psicologo in Psicologo.objects.all():
+        psicologo.mascara_disponibilidade = mascara_para_bytes(criar_mascara_disponibilidade(
+            psicologo.disponibilidade.values_list('data_hora_inicio', 'data_hora_fim')
+        ))
+        psicologo.save(update_fields=['mascara_disponibilidade'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terapia', '0005_alter_consulta_checklist_tarefas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='psicologo',
+            name='mascara_disponibilidade',
+            field=models.BinaryField(default=b'', help_text='Um bit por período de CONSULTA_DURACAO da semana em UTC, reconstruído sempre que a disponibilidade muda.', verbose_name='Máscara semanal de disponibilidade'),
+        ),
+        migrations.RunPython(
+            code=preencher_mascara_disponibilidade,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-17 07:51
+
+from django.db import migrations, models
+from terapia.utilidades.disponibilidade import get_minuto_da_semana_utc
+
+
+def preencher_minutos_semana(apps, schema_editor):
+    IntervaloDisponibilidade = apps.get_model('terapia', 'IntervaloDisponibilidade')
+    intervalos = list(IntervaloDisponibilidade.objects.all())
+
+    for intervalo in intervalos:
+        intervalo.inicio_minuto_semana = get_minuto_da_semana_utc(intervalo.data_hora_inicio)
+        intervalo.fim_minuto_semana = get_minuto_da_semana_utc(intervalo.data_hora_fim)
+
+    IntervaloDisponibilidade.objects.bulk_update(intervalos, ['inicio_minuto_semana', 'fim_minuto_semana'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terapia', '0006_psicologo_mascara_disponibilidade'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='intervalodisponibilidade',
+            name='fim_minuto_semana',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Minuto da semana (UTC) do fim do intervalo'),
+        ),
+        migrations.AddField(
+            model_name='intervalodisponibilidade',
+            name='inicio_minuto_semana',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Minuto da semana (UTC) do início do intervalo'),
+        ),
+        migrations.RunPython(
+            code=preencher_minutos_semana,
+            reverse_code=migrations.RunPython.noop,
+        ),
+        migrations.AddIndex(
+            model_name='intervalodisponibilidade',
+            index=models.Index(fields=['psicologo', 'inicio_minuto_semana', 'fim_minuto_semana'], name='intervalo_psicologo_min_idx'),
+        ),
+    ]
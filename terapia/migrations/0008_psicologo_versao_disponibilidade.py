@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terapia', '0007_intervalodisponibilidade_minutos_semana'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='psicologo',
+            name='versao_disponibilidade',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Incrementada sempre que a disponibilidade muda. Usada nas chaves de cache da matriz de disponibilidade.', verbose_name='Versão da disponibilidade'),
+        ),
+    ]
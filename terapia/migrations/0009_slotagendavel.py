@@ -0,0 +1,64 @@
+# Generated by Django 5.2.8 on 2026-10-17 08:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+from terapia.constantes import CONSULTA_DURACAO, SLOTS_AGENDAVEIS_HORIZONTE
+from terapia.utilidades.disponibilidade import (
+    gerar_datas_hora_agendaveis,
+    get_inicio_do_periodo,
+    mascara_de_bytes,
+)
+
+
+def preencher_slots_agendaveis(apps, schema_editor):
+    Psicologo = apps.get_model('terapia', 'Psicologo')
+    SlotAgendavel = apps.get_model('terapia', 'SlotAgendavel')
+
+    agora = timezone.now()
+    inicio = get_inicio_do_periodo(agora)
+    fim = agora + SLOTS_AGENDAVEIS_HORIZONTE
+
+    for psicologo in Psicologo.objects.all():
+        datas_hora_ocupadas = list(psicologo.consultas.filter(
+            data_hora_agendada__gt=inicio - CONSULTA_DURACAO,
+            data_hora_agendada__lt=fim + CONSULTA_DURACAO,
+        ).exclude(
+            estado='CANCELADA',
+        ).order_by('data_hora_agendada').values_list('data_hora_agendada', flat=True))
+
+        SlotAgendavel.objects.bulk_create([
+            SlotAgendavel(psicologo=psicologo, data_hora=data_hora)
+            for data_hora in gerar_datas_hora_agendaveis(
+                mascara_de_bytes(psicologo.mascara_disponibilidade), datas_hora_ocupadas, inicio, fim,
+            )
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terapia', '0008_psicologo_versao_disponibilidade'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotAgendavel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_hora', models.DateTimeField(verbose_name='Data-hora de início')),
+                ('psicologo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots_agendaveis', to='terapia.psicologo')),
+            ],
+            options={
+                'verbose_name': 'Slot agendável',
+                'verbose_name_plural': 'Slots agendáveis',
+                'ordering': ['data_hora'],
+                'indexes': [models.Index(fields=['data_hora', 'psicologo'], name='slot_dh_psicologo_idx')],
+                'constraints': [models.UniqueConstraint(fields=('psicologo', 'data_hora'), name='slot_psicologo_dh_uniq')],
+            },
+        ),
+        migrations.RunPython(
+            code=preencher_slots_agendaveis,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-17 10:12
+
+from django.db import migrations, models
+from terapia.utilidades.disponibilidade import get_slot
+
+
+def preencher_slots_das_consultas(apps, schema_editor):
+    Consulta = apps.get_model('terapia', 'Consulta')
+    consultas = []
+
+    for consulta in Consulta.objects.only('id', 'data_hora_agendada').iterator(chunk_size=1000):
+        consulta.slot = get_slot(consulta.data_hora_agendada)
+        consultas.append(consulta)
+
+    Consulta.objects.bulk_update(consultas, ['slot'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terapia', '0009_slotagendavel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consulta',
+            name='slot',
+            field=models.IntegerField(editable=False, null=True, verbose_name='Slot'),
+        ),
+        migrations.RunPython(preencher_slots_das_consultas, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='consulta',
+            name='slot',
+            field=models.IntegerField(editable=False, verbose_name='Slot'),
+        ),
+        migrations.AddConstraint(
+            model_name='consulta',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado__in', ['SOLICITADA', 'CONFIRMADA', 'EM_ANDAMENTO'])), fields=('psicologo', 'slot'), name='consulta_psicologo_slot_ativo_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='consulta',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado__in', ['SOLICITADA', 'CONFIRMADA', 'EM_ANDAMENTO'])), fields=('paciente', 'slot'), name='consulta_paciente_slot_ativo_uniq'),
+        ),
+    ]
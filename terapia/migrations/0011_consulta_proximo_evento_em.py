@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:40
+
+from django.db import migrations, models
+from django.db.models import Case, DateTimeField, ExpressionWrapper, F, When
+from terapia.constantes import CONSULTA_DURACAO
+
+
+def preencher_proximo_evento_em(apps, schema_editor):
+    Consulta = apps.get_model('terapia', 'Consulta')
+
+    Consulta.objects.update(proximo_evento_em=Case(
+        When(estado__in=['SOLICITADA', 'CONFIRMADA'], then=F('data_hora_agendada')),
+        When(estado='EM_ANDAMENTO', then=ExpressionWrapper(
+            F('data_hora_agendada') + CONSULTA_DURACAO, output_field=DateTimeField(),
+        )),
+        default=None,
+        output_field=DateTimeField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terapia', '0010_consulta_slot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consulta',
+            name='proximo_evento_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Próximo evento em'),
+        ),
+        migrations.RunPython(preencher_proximo_evento_em, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(condition=models.Q(('proximo_evento_em__isnull', False)), fields=['proximo_evento_em'], name='consulta_proximo_evento_idx'),
+        ),
+    ]
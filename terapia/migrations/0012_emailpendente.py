@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 12:25
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terapia', '0011_consulta_proximo_evento_em'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailPendente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('assunto', models.CharField(max_length=255, verbose_name='Assunto')),
+                ('mensagem', models.TextField(verbose_name='Mensagem')),
+                ('destinatario', models.EmailField(max_length=254, verbose_name='Destinatário')),
+                ('data_hora_criado', models.DateTimeField(auto_now_add=True)),
+                ('enviar_a_partir_de', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Enviar a partir de')),
+                ('tentativas', models.PositiveSmallIntegerField(default=0, verbose_name='Tentativas')),
+                ('ultimo_erro', models.TextField(blank=True, verbose_name='Último erro')),
+                ('enviado_em', models.DateTimeField(blank=True, null=True, verbose_name='Enviado em')),
+            ],
+            options={
+                'verbose_name': 'E-mail pendente',
+                'verbose_name_plural': 'E-mails pendentes',
+                'ordering': ['data_hora_criado'],
+                'indexes': [models.Index(condition=models.Q(('enviado_em__isnull', True)), fields=['enviar_a_partir_de'], name='email_pendente_a_enviar_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-17 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terapia', '0012_emailpendente'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notificacao',
+            index=models.Index(fields=['destinatario', 'lida', 'data_hora_criada'], name='notificacao_dest_lida_dh_idx'),
+        ),
+    ]
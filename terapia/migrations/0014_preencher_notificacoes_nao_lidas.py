@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-17 14:41
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def preencher_notificacoes_nao_lidas(apps, schema_editor):
+    Usuario = apps.get_model('usuario', 'Usuario')
+    Notificacao = apps.get_model('terapia', 'Notificacao')
+
+    Usuario.objects.update(
+        notificacoes_nao_lidas=Coalesce(
+            Subquery(
+                Notificacao.objects.filter(destinatario=OuterRef('pk'), lida=False)
+                .order_by()
+                .values('destinatario')
+                .annotate(quantidade=Count('pk'))
+                .values('quantidade')
+            ),
+            0,
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terapia', '0013_notificacao_notificacao_dest_lida_dh_idx'),
+        ('usuario', '0002_usuario_notificacoes_nao_lidas'),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_notificacoes_nao_lidas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:20
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# Cópia de Notificacao.MENSAGENS na época desta migração (os modelos históricos não têm os métodos)
+MENSAGENS = {
+    'CONSULTA_SOLICITADA': 'O paciente {remetente} solicitou uma nova consulta agendada para {data_hora_agendada}.',
+    'CONSULTA_CONFIRMADA': 'O psicólogo {remetente} aceitou sua solicitação de consulta agendada para {data_hora_agendada}.',
+    'CONSULTA_RECUSADA': 'O psicólogo {remetente} recusou sua solicitação de consulta agendada para {data_hora_agendada}.',
+    'CONSULTA_CANCELADA': 'O paciente {remetente} cancelou a consulta agendada para {data_hora_agendada}.',
+    'CONSULTA_EM_ANDAMENTO': 'Você tem uma consulta em andamento. Acesse "Minhas Consultas" para ingressar na chamada.',
+    'CONSULTA_EXPIRADA': 'A solicitação de consulta agendada para {data_hora_agendada} expirou por não ter sido respondida.',
+}
+TAMANHO_LOTE = 500
+
+
+def get_nome_do_remetente(remetente):
+    if remetente is None:
+        return ''
+
+    for atributo, campo in (('paciente', 'nome'), ('psicologo', 'nome_completo')):
+        try:
+            return getattr(getattr(remetente, atributo), campo)
+        except models.ObjectDoesNotExist:
+            pass
+
+    return ''
+
+
+def preencher_assunto_e_mensagem(apps, schema_editor):
+    Notificacao = apps.get_model('terapia', 'Notificacao')
+    ultimo_id = 0
+
+    while True:
+        notificacoes = list(
+            Notificacao.objects.filter(mensagem='', pk__gt=ultimo_id).select_related(
+                'consulta', 'remetente__paciente', 'remetente__psicologo',
+            ).order_by('pk')[:TAMANHO_LOTE]
+        )
+
+        if not notificacoes:
+            break
+
+        for notificacao in notificacoes:
+            notificacao.assunto = notificacao.get_tipo_display()
+            notificacao.mensagem = MENSAGENS.get(notificacao.tipo, '').format(
+                remetente=get_nome_do_remetente(notificacao.remetente),
+                data_hora_agendada=timezone.localtime(notificacao.consulta.data_hora_agendada).strftime('%d/%m/%Y %H:%M'),
+            )
+
+        Notificacao.objects.bulk_update(notificacoes, ['assunto', 'mensagem'])
+        ultimo_id = notificacoes[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terapia', '0014_preencher_notificacoes_nao_lidas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacao',
+            name='assunto',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Assunto'),
+        ),
+        migrations.AddField(
+            model_name='notificacao',
+            name='mensagem',
+            field=models.TextField(blank=True, verbose_name='Mensagem'),
+        ),
+        migrations.RunPython(
+            code=preencher_assunto_e_mensagem,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
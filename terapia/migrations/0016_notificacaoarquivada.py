@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terapia', '0015_notificacao_assunto_notificacao_mensagem'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacaoArquivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('CONSULTA_SOLICITADA', 'Consulta Solicitada'), ('CONSULTA_CONFIRMADA', 'Consulta Confirmada'), ('CONSULTA_CANCELADA', 'Consulta Cancelada'), ('CONSULTA_RECUSADA', 'Consulta Recusada'), ('CONSULTA_EM_ANDAMENTO', 'Consulta Em Andamento'), ('CONSULTA_EXPIRADA', 'Consulta Expirada')], max_length=50, verbose_name='Tipo')),
+                ('data_hora_criada', models.DateTimeField(verbose_name='Criada em')),
+                ('data_hora_arquivada', models.DateTimeField(auto_now_add=True, verbose_name='Arquivada em')),
+                ('assunto', models.CharField(blank=True, max_length=255, verbose_name='Assunto')),
+                ('mensagem', models.TextField(blank=True, verbose_name='Mensagem')),
+                ('consulta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notificacoes_arquivadas', to='terapia.consulta', verbose_name='Consulta')),
+                ('destinatario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notificacoes_arquivadas_como_destinatario', to=settings.AUTH_USER_MODEL, verbose_name='Destinatário')),
+                ('remetente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notificacoes_arquivadas_como_remetente', to=settings.AUTH_USER_MODEL, verbose_name='Remetente')),
+            ],
+            options={
+                'verbose_name': 'Notificação arquivada',
+                'verbose_name_plural': 'Notificações arquivadas',
+                'ordering': ['-data_hora_criada'],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-17 16:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terapia', '0016_notificacaoarquivada'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='psicologo',
+            index=models.Index(fields=['nome_completo', 'id'], name='psicologo_nome_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['paciente', '-data_hora_solicitada', '-data_hora_agendada', 'id'], name='consulta_paciente_lista_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['psicologo', '-data_hora_solicitada', '-data_hora_agendada', 'id'], name='consulta_psicologo_lista_idx'),
+        ),
+    ]
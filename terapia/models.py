@@ -1,18 +1,48 @@
 import secrets
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from heapq import merge
+from itertools import chain
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.core.mail import send_mail
-from django.db import models
-from django.db.models import Q, F
+from django.core.mail import EmailMessage, get_connection
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, Exists, ExpressionWrapper, OuterRef, Prefetch, Q, F, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest, Left
 from django.urls import reverse
 from django.contrib import admin
+from django.contrib.auth import get_user_model
 from django.utils import timezone
 from .utilidades.geral import (
     converter_dia_semana_iso_com_hora_para_data_hora,
     desprezar_segundos_e_microssegundos,
+    iterar_lotes_de_pks,
     regra_de_3_numero_periodos_por_dia,
 )
+from .utilidades.matriz_disponibilidade import (
+    criar_semana_achatada,
+    extrair_faixas,
+    matriz_para_semana_achatada,
+    semana_achatada_para_matriz,
+)
+from .utilidades.disponibilidade import (
+    MINUTOS_POR_SEMANA,
+    cabe_consulta_na_mascara,
+    criar_mascara_disponibilidade_em_minutos,
+    gerar_datas_hora_agendaveis,
+    get_inicio_do_periodo,
+    get_minuto_da_semana_utc,
+    get_slot,
+    get_slots_que_tomariam_tempo_de,
+    mascara_de_bytes,
+    mascara_para_bytes,
+    tem_consulta_conflitante,
+)
+from .utilidades.notificacoes_ao_vivo import canal_de_notificacoes
 from .validadores.crp import validate_crp
 from .validadores.cpf import validate_cpf
 from .validadores.geral import (
@@ -25,24 +55,48 @@ from .validadores.geral import (
 )
 from .constantes import (
     CONSULTA_DURACAO,
+    CONSULTA_DURACAO_MINUTOS,
     CONSULTA_ANTECEDENCIA_MINIMA,
     CONSULTA_ANTECEDENCIA_MAXIMA,
+    CACHE_MATRIZ_DISPONIBILIDADE_TIMEOUT,
+    EMAILS_PENDENTES_ESPERA_BASE,
+    EMAILS_PENDENTES_MAXIMO_TENTATIVAS,
+    EMAILS_PENDENTES_RESERVA,
+    EMAILS_PENDENTES_TAMANHO_LOTE,
+    NOTIFICACOES_RETENCAO,
     NUMERO_PERIODOS_POR_DIA,
+    PESQUISA_SOBRE_MIM_RESUMO_TAMANHO,
+    RETENCAO_TAMANHO_LOTE,
+    SLOTS_AGENDAVEIS_HORIZONTE,
+    TRANSICOES_AUTOMATICAS_TAMANHO_LOTE,
 )
 from datetime import UTC, timedelta, time
 import json
 
 
+# Psicólogos cuja reconstrução da máscara por intervalo está adiada (ver Psicologo.adiar_atualizacao_da_mascara)
+_mascaras_com_atualizacao_adiada = ContextVar("mascaras_com_atualizacao_adiada", default=frozenset())
+
+
 class BasePacienteOuPsicologo(models.Model):
     def ja_tem_consulta_em(self, data_hora):
         """
-        Verifica se já há alguma consulta que tomaria tempo da data-hora enviada.
+        Verifica se já há alguma consulta que ocupa horário e tomaria tempo da data-hora enviada.
+
+        Como as consultas são alinhadas à duração, basta uma busca por igualdade no slot
+        (ou nos dois slots vizinhos, se a data-hora não estiver alinhada).
+        """
+        return self.consultas.ocupando_horario().filter(slot__in=get_slots_que_tomariam_tempo_de(data_hora)).exists()
+
+    def get_datas_hora_ocupadas_entre(self, inicio, fim):
+        """
+        Retorna, em ordem crescente e com uma única query, as data-horas de início das
+        consultas que ocupam horário e tomariam tempo de alguma data-hora entre as enviadas.
         """
-        return self.consultas.filter(
-            Q(data_hora_agendada__gt = data_hora - CONSULTA_DURACAO) &
-            Q(data_hora_agendada__lt = data_hora + CONSULTA_DURACAO) &
-            ~ Q(estado = EstadoConsulta.CANCELADA)
-        ).exists()
+        return list(self.consultas.ocupando_horario().filter(
+            Q(data_hora_agendada__gt = inicio - CONSULTA_DURACAO) &
+            Q(data_hora_agendada__lt = fim + CONSULTA_DURACAO)
+        ).order_by("data_hora_agendada").values_list("data_hora_agendada", flat=True))
 
     def get_url_foto_propria_ou_padrao(self):
         if self.foto:
@@ -85,7 +139,102 @@ class Especializacao(models.Model):
         return self.titulo
 
 
-class PsicologoCompletosManager(models.Manager):
+class PsicologoQuerySet(models.QuerySet):
+    def agendaveis_em(self, data_hora):
+        """
+        Filtra, inteiramente no banco de dados, os psicólogos agendáveis na data-hora enviada.
+        O resultado é o mesmo de Psicologo.esta_agendavel_em para cada psicólogo.
+
+        Como intervalos de disponibilidade e consultas são múltiplos de CONSULTA_DURACAO,
+        o início do período que contém a data-hora é sempre um horário livre quando a
+        consulta cabe e não há conflito. Logo, a condição "depois da próxima data-hora
+        agendável" se reduz a esse início respeitar a antecedência mínima.
+        """
+        agora = timezone.now()
+
+        if not (
+            get_inicio_do_periodo(data_hora) >= agora + CONSULTA_ANTECEDENCIA_MINIMA and
+            data_hora <= agora + CONSULTA_ANTECEDENCIA_MAXIMA
+        ):
+            return self.none()
+
+        minuto_inicio = get_minuto_da_semana_utc(data_hora)
+        minuto_fim = (minuto_inicio + CONSULTA_DURACAO_MINUTOS) % MINUTOS_POR_SEMANA
+
+        intervalo_de_semana_completa = Q(inicio_minuto_semana=F("fim_minuto_semana"))
+        intervalo_que_nao_vira_a_semana = Q(inicio_minuto_semana__lt=F("fim_minuto_semana"))
+        intervalo_que_vira_a_semana = Q(fim_minuto_semana__lt=F("inicio_minuto_semana"))
+
+        if minuto_fim <= minuto_inicio:
+            cabe_no_intervalo = intervalo_de_semana_completa | (
+                intervalo_que_vira_a_semana &
+                Q(inicio_minuto_semana__lte=minuto_inicio, fim_minuto_semana__gte=minuto_fim)
+            )
+        else:
+            cabe_no_intervalo = intervalo_de_semana_completa | (
+                intervalo_que_nao_vira_a_semana &
+                Q(inicio_minuto_semana__lte=minuto_inicio, fim_minuto_semana__gte=minuto_fim)
+            ) | (
+                intervalo_que_vira_a_semana &
+                (Q(inicio_minuto_semana__lte=minuto_inicio) | Q(fim_minuto_semana__gte=minuto_fim))
+            )
+
+        return self.filter(
+            Exists(IntervaloDisponibilidade.objects.filter(cabe_no_intervalo, psicologo=OuterRef("pk"))),
+            ~ Exists(Consulta.objects.ocupando_horario().filter(
+                Q(data_hora_agendada__gt = data_hora - CONSULTA_DURACAO) &
+                Q(data_hora_agendada__lt = data_hora + CONSULTA_DURACAO),
+                psicologo=OuterRef("pk"),
+            )),
+        )
+
+    def com_slot_agendavel_em(self, data_hora):
+        """
+        Filtra os psicólogos agendáveis na data-hora enviada com uma leitura indexada
+        da tabela materializada SlotAgendavel.
+
+        Como os slots são sempre alinhados aos períodos de CONSULTA_DURACAO, uma
+        data-hora fora desse alinhamento é verificada com PsicologoQuerySet.agendaveis_em.
+        """
+        if get_inicio_do_periodo(data_hora) != data_hora:
+            return self.agendaveis_em(data_hora)
+
+        return self.filter(Exists(
+            SlotAgendavel.objects.agendaveis().filter(psicologo=OuterRef("pk"), data_hora=data_hora)
+        ))
+
+    def com_proximo_slot_agendavel(self):
+        """
+        Anota em "proximo_slot_agendavel" a próxima data-hora agendável de cada
+        psicólogo, lida da tabela materializada SlotAgendavel.
+        """
+        return self.annotate(proximo_slot_agendavel=Subquery(
+            SlotAgendavel.objects.agendaveis().filter(
+                psicologo=OuterRef("pk"),
+            ).order_by("data_hora").values("data_hora")[:1]
+        ))
+
+    def para_pesquisa(self):
+        """
+        Listagem da pesquisa com custo fixo de queries: filtra os psicólogos com perfil completo
+        com EXISTS (em vez dos joins com DISTINCT de Psicologo.completos), carrega só as colunas
+        do card (com o começo de "sobre_mim" em "sobre_mim_resumo"), anota o próximo slot
+        agendável na mesma query e pré-carrega as especializações numa query só.
+        """
+        return self.filter(
+            Exists(Psicologo.especializacoes.through.objects.filter(psicologo=OuterRef("pk"))),
+            Exists(IntervaloDisponibilidade.objects.filter(psicologo=OuterRef("pk"))),
+            valor_consulta__isnull=False,
+        ).only(
+            "id", "nome_completo", "foto", "valor_consulta", "mascara_disponibilidade",
+        ).annotate(
+            sobre_mim_resumo=Left("sobre_mim", PESQUISA_SOBRE_MIM_RESUMO_TAMANHO),
+        ).com_proximo_slot_agendavel().prefetch_related(
+            Prefetch("especializacoes", queryset=Especializacao.objects.only("id", "titulo")),
+        )
+
+
+class PsicologoCompletosManager(models.Manager.from_queryset(PsicologoQuerySet)):
     def get_filtros(self):
         return (
             Q(valor_consulta__isnull=False) &
@@ -124,13 +273,29 @@ class Psicologo(BasePacienteOuPsicologo):
         related_name="psicologos",
         blank=True,
     )
+    mascara_disponibilidade = models.BinaryField(
+        "Máscara semanal de disponibilidade",
+        default=b"",
+        editable=False,
+        help_text="Um bit por período de CONSULTA_DURACAO da semana em UTC, reconstruído sempre que a disponibilidade muda.",
+    )
+    versao_disponibilidade = models.PositiveIntegerField(
+        "Versão da disponibilidade",
+        default=0,
+        editable=False,
+        help_text="Incrementada sempre que a disponibilidade muda. Usada nas chaves de cache da matriz de disponibilidade.",
+    )
 
-    objects = models.Manager() # Manager padrão (deve ser declarado explicitamente por conta do manager customizado abaixo)
+    objects = PsicologoQuerySet.as_manager() # Manager padrão (deve ser declarado explicitamente por conta do manager customizado abaixo)
     completos = PsicologoCompletosManager() # Manager para psicólogos com perfil completo
 
     class Meta:
         verbose_name = "Psicólogo"
         verbose_name_plural = "Psicólogos"
+        indexes = [
+            # Paginação por cursor da pesquisa (ver PesquisaView.ordenacao_cursor)
+            models.Index(fields=['nome_completo', 'id'], name='psicologo_nome_id_idx'),
+        ]
 
     @property
     def primeiro_nome(self):
@@ -147,52 +312,72 @@ class Psicologo(BasePacienteOuPsicologo):
 
     @property
     def intervalo_de_semana_completa(self):
-        return self.disponibilidade.filter(data_hora_inicio=F("data_hora_fim"))
+        return self.disponibilidade.filter(inicio_minuto_semana=F("fim_minuto_semana"))
 
     @property
     def intervalos_que_nao_viram_a_semana(self):
-        return self.disponibilidade.filter(data_hora_inicio__lt=F("data_hora_fim"))
+        return self.disponibilidade.filter(inicio_minuto_semana__lt=F("fim_minuto_semana"))
 
     @property
     def intervalo_que_vira_a_semana(self):
-        return self.disponibilidade.filter(data_hora_fim__lt=F("data_hora_inicio"))
+        return self.disponibilidade.filter(fim_minuto_semana__lt=F("inicio_minuto_semana"))
 
     @property
     def proxima_data_hora_agendavel(self):
         """
         Retorna a data-hora agendável mais próxima do psicólogo.
-        """
-        if not self.disponibilidade.exists():
-            return None
 
-        semanas = 0
-        tempo_decorrido = timedelta(0)
+        As consultas da janela de antecedência são carregadas de uma só vez, então
+        o custo em queries é constante, independentemente de quão cheia está a agenda.
+        """
         agora = timezone.localtime()
         agora_convertido = converter_dia_semana_iso_com_hora_para_data_hora(agora.isoweekday(), agora.time(), agora.tzinfo)
-        datas_hora_ordenadas = self._get_datas_hora_dos_intervalos_da_mais_proxima_a_mais_distante_partindo_de(agora)
+        datas_hora_ordenadas = self._iterar_datas_hora_dos_intervalos_da_mais_proxima_a_mais_distante_partindo_de(agora)
+        datas_hora_vistas = []
+        datas_hora_ocupadas = None
 
-        while True:
+        def iterar_semanas():
+            # A primeira semana consome o iterador preguiçoso, e as seguintes reaproveitam o que já foi
+            # visto. Na prática, o iterador só se esgota se nenhuma data-hora da primeira semana servir.
             for data_hora in datas_hora_ordenadas:
-                esta_na_outra_semana = data_hora <= agora_convertido
+                datas_hora_vistas.append(data_hora)
+                yield data_hora, 0
+
+            if not datas_hora_vistas:
+                return
+
+            semanas = 1
+
+            while True:
+                for data_hora in datas_hora_vistas:
+                    yield data_hora, semanas
+
+                semanas += 1
 
-                if esta_na_outra_semana:
-                    data_hora += timedelta(weeks=1)
+        for data_hora, semanas in iterar_semanas():
+            esta_na_outra_semana = data_hora <= agora_convertido
 
-                data_hora += timedelta(weeks=semanas)
-                tempo_decorrido = data_hora - agora_convertido
+            if esta_na_outra_semana:
+                data_hora += timedelta(weeks=1)
 
-                if tempo_decorrido > CONSULTA_ANTECEDENCIA_MAXIMA:
-                    return None
+            data_hora += timedelta(weeks=semanas)
+            tempo_decorrido = data_hora - agora_convertido
 
-                data_hora_inicio = desprezar_segundos_e_microssegundos(agora + tempo_decorrido)
+            if tempo_decorrido > CONSULTA_ANTECEDENCIA_MAXIMA:
+                return None
 
-                if (
-                    data_hora_inicio >= agora + CONSULTA_ANTECEDENCIA_MINIMA and
-                    not self.ja_tem_consulta_em(data_hora_inicio)
-                ):
-                    return data_hora_inicio
+            data_hora_inicio = desprezar_segundos_e_microssegundos(agora + tempo_decorrido)
 
-            semanas += 1
+            if data_hora_inicio < agora + CONSULTA_ANTECEDENCIA_MINIMA:
+                continue
+
+            if datas_hora_ocupadas is None:
+                datas_hora_ocupadas = self.get_datas_hora_ocupadas_entre(agora, agora + CONSULTA_ANTECEDENCIA_MAXIMA)
+
+            if not tem_consulta_conflitante(datas_hora_ocupadas, data_hora_inicio):
+                return data_hora_inicio
+
+        return None
 
     def __str__(self):
         return self.nome_completo
@@ -205,24 +390,32 @@ class Psicologo(BasePacienteOuPsicologo):
         Retorna as datas e horas dos intervalos de disponibilidade do psicólogo na ordem do mais
         próximo ao mais distante partindo de um instante no tempo.
         """
+        return list(self._iterar_datas_hora_dos_intervalos_da_mais_proxima_a_mais_distante_partindo_de(instante))
+
+    def _iterar_datas_hora_dos_intervalos_da_mais_proxima_a_mais_distante_partindo_de(self, instante):
+        """
+        Versão preguiçosa de _get_datas_hora_dos_intervalos_da_mais_proxima_a_mais_distante_partindo_de.
+
+        As datas e horas de cada intervalo são ordenadas separadamente e intercaladas com um heap,
+        então quem só precisa das primeiras não paga pela ordenação de todas elas.
+        """
         instante_convertido = converter_dia_semana_iso_com_hora_para_data_hora(
             instante.isoweekday(),
             instante.time(),
             instante.tzinfo,
         )
+        limiar = instante_convertido + CONSULTA_ANTECEDENCIA_MINIMA
 
         datas_hora_essa_semana = []
         datas_hora_proxima_semana = []
 
         for intervalo in self.disponibilidade.all():
-            for data_hora in intervalo.get_datas_hora():
-                if data_hora >= instante_convertido + CONSULTA_ANTECEDENCIA_MINIMA:
-                    datas_hora_essa_semana.append(data_hora)
-                else:
-                    datas_hora_proxima_semana.append(data_hora)
+            datas_hora = sorted(intervalo.iterar_datas_hora())
+            i = bisect_left(datas_hora, limiar)
+            datas_hora_essa_semana.append(datas_hora[i:])
+            datas_hora_proxima_semana.append(datas_hora[:i])
 
-        datas_hora_ordenadas = sorted(datas_hora_essa_semana) + sorted(datas_hora_proxima_semana)
-        return datas_hora_ordenadas
+        return chain(merge(*datas_hora_essa_semana), merge(*datas_hora_proxima_semana))
 
     def _tem_intervalo_onde_cabe_uma_consulta_em(self, data_hora):
         """
@@ -230,81 +423,54 @@ class Psicologo(BasePacienteOuPsicologo):
         encaixa uma consulta que começa na data-hora enviada.
 
         A consulta deve caber completamente no intervalo para que ele seja válido.
+        A verificação é feita sobre a máscara semanal de disponibilidade, sem queries.
 
         @param data_hora: Data-hora em que a consulta começa.
         @return: True se a consulta se encaixa no intervalo, False caso contrário.
         """
-        # Normalize to weekday representation in UTC
-        data_hora_utc = timezone.localtime(data_hora, UTC)
-
-        data_hora_inicio = converter_dia_semana_iso_com_hora_para_data_hora(
-            data_hora_utc.isoweekday(),
-            data_hora_utc.time(),
-            UTC,
-        )
-
-        # Calculate end time
-        data_hora_fim_temp = data_hora_utc + CONSULTA_DURACAO
-        data_hora_fim = converter_dia_semana_iso_com_hora_para_data_hora(
-            data_hora_fim_temp.isoweekday(),
-            data_hora_fim_temp.time(),
-            UTC,
-        )
-
-        consulta_vira_a_semana = data_hora_fim <= data_hora_inicio
-
-        if self.intervalo_de_semana_completa.exists():
-            return True
-
-        if data_hora_inicio == data_hora_fim:
-            return False
+        return cabe_consulta_na_mascara(mascara_de_bytes(self.mascara_disponibilidade), data_hora)
 
-        # Convert availability intervals to UTC for comparison
-        intervalos_nao_viram = self.intervalos_que_nao_viram_a_semana.all()
-        for intervalo in intervalos_nao_viram:
-            intervalo_inicio_utc = timezone.localtime(intervalo.data_hora_inicio, UTC)
-            intervalo_fim_utc = timezone.localtime(intervalo.data_hora_fim, UTC)
+    def atualizar_mascara_disponibilidade(self, commit=True):
+        """
+        Reconstrói a máscara semanal de disponibilidade a partir dos
+        intervalos de disponibilidade do psicólogo e incrementa a versão
+        da disponibilidade, invalidando a matriz em cache.
 
-            intervalo_inicio_normalized = converter_dia_semana_iso_com_hora_para_data_hora(
-                intervalo_inicio_utc.isoweekday(),
-                intervalo_inicio_utc.time(),
-                UTC,
-            )
-            intervalo_fim_normalized = converter_dia_semana_iso_com_hora_para_data_hora(
-                intervalo_fim_utc.isoweekday(),
-                intervalo_fim_utc.time(),
-                UTC,
+        Se commit for True, os slots agendáveis materializados também são reconstruídos.
+        """
+        self.mascara_disponibilidade = mascara_para_bytes(criar_mascara_disponibilidade_em_minutos(
+            self.disponibilidade.values_list("inicio_minuto_semana", "fim_minuto_semana")
+        ))
+
+        if commit:
+            Psicologo.objects.filter(pk=self.pk).update(
+                mascara_disponibilidade=self.mascara_disponibilidade,
+                versao_disponibilidade=F("versao_disponibilidade") + 1,
             )
+            self.refresh_from_db(fields=["versao_disponibilidade"])
+            SlotAgendavel.objects.sincronizar(self)
+        else:
+            self.versao_disponibilidade += 1
 
-            if not consulta_vira_a_semana:
-                if intervalo_inicio_normalized <= data_hora_inicio and intervalo_fim_normalized >= data_hora_fim:
-                    return True
-
-        intervalos_viram = self.intervalo_que_vira_a_semana.all()
-        for intervalo in intervalos_viram:
-            intervalo_inicio_utc = timezone.localtime(intervalo.data_hora_inicio, UTC)
-            intervalo_fim_utc = timezone.localtime(intervalo.data_hora_fim, UTC)
-
-            intervalo_inicio_normalized = converter_dia_semana_iso_com_hora_para_data_hora(
-                intervalo_inicio_utc.isoweekday(),
-                intervalo_inicio_utc.time(),
-                UTC,
-            )
-            intervalo_fim_normalized = converter_dia_semana_iso_com_hora_para_data_hora(
-                intervalo_fim_utc.isoweekday(),
-                intervalo_fim_utc.time(),
-                UTC,
-            )
+    @contextmanager
+    def adiar_atualizacao_da_mascara(self):
+        """
+        Adia a reconstrução da máscara (e dos slots) que cada intervalo salvo ou deletado
+        dentro do bloco dispararia, e a faz uma única vez no final. Útil para trocar vários
+        intervalos de uma vez.
+        """
+        token = _mascaras_com_atualizacao_adiada.set(_mascaras_com_atualizacao_adiada.get() | {self.pk})
 
-            if not consulta_vira_a_semana:
-                if intervalo_inicio_normalized <= data_hora_inicio or intervalo_fim_normalized >= data_hora_fim:
-                    return True
+        try:
+            yield
+        finally:
+            _mascaras_com_atualizacao_adiada.reset(token)
 
-            if consulta_vira_a_semana:
-                if intervalo_inicio_normalized <= data_hora_inicio and intervalo_fim_normalized >= data_hora_fim:
-                    return True
+        self.atualizar_mascara_disponibilidade()
 
-        return False
+    @staticmethod
+    def atualizacao_da_mascara_esta_adiada(psicologo_id):
+        return psicologo_id in _mascaras_com_atualizacao_adiada.get()
 
     def get_intervalos_sobrepostos(self, intervalo):
         """
@@ -314,6 +480,11 @@ class Psicologo(BasePacienteOuPsicologo):
         Se houver qualquer sobreposição, mesmo que parcial, com extremidades inclusas,
         retorna True.
         """
+        # Calculados localmente para não alterar o intervalo recebido
+        inicio = get_minuto_da_semana_utc(intervalo.data_hora_inicio)
+        fim = get_minuto_da_semana_utc(intervalo.data_hora_fim)
+        vira_a_semana = fim <= inicio
+
         intervalos_que_nao_viram_a_semana, intervalo_que_vira_a_semana, intervalo_de_semana_completa = [
             qs.exclude(pk=intervalo.pk) for qs in [
                 self.intervalos_que_nao_viram_a_semana,
@@ -325,27 +496,27 @@ class Psicologo(BasePacienteOuPsicologo):
         if intervalo_de_semana_completa.exists():
             return intervalo_de_semana_completa
 
-        if intervalo.data_hora_inicio == intervalo.data_hora_fim and self.disponibilidade.exists():
+        if inicio == fim and self.disponibilidade.exists():
             return self.disponibilidade.all()
 
-        if not intervalo.vira_a_semana() and (qs := intervalos_que_nao_viram_a_semana.filter(
-            Q(data_hora_inicio__lte=intervalo.data_hora_fim) &
-            Q(data_hora_fim__gte=intervalo.data_hora_inicio)
+        if not vira_a_semana and (qs := intervalos_que_nao_viram_a_semana.filter(
+            Q(inicio_minuto_semana__lte=fim) &
+            Q(fim_minuto_semana__gte=inicio)
         )).exists():
             return qs
 
-        if not intervalo.vira_a_semana() and (qs := intervalo_que_vira_a_semana.filter(
-            Q(data_hora_inicio__lte=intervalo.data_hora_fim) |
-            Q(data_hora_fim__gte=intervalo.data_hora_inicio)
+        if not vira_a_semana and (qs := intervalo_que_vira_a_semana.filter(
+            Q(inicio_minuto_semana__lte=fim) |
+            Q(fim_minuto_semana__gte=inicio)
         )).exists():
             return qs
 
-        if intervalo.vira_a_semana() and (qs := intervalo_que_vira_a_semana).exists():
+        if vira_a_semana and (qs := intervalo_que_vira_a_semana).exists():
             return qs
 
-        if intervalo.vira_a_semana() and (qs := intervalos_que_nao_viram_a_semana.filter(
-            Q(data_hora_inicio__lte=intervalo.data_hora_fim) |
-            Q(data_hora_fim__gte=intervalo.data_hora_inicio)
+        if vira_a_semana and (qs := intervalos_que_nao_viram_a_semana.filter(
+            Q(inicio_minuto_semana__lte=fim) |
+            Q(fim_minuto_semana__gte=inicio)
         )).exists():
             return qs
 
@@ -360,14 +531,21 @@ class Psicologo(BasePacienteOuPsicologo):
         @return: True se o psicólogo tem disponibilidade, False caso contrário.
         """
         agora = timezone.now()
+
+        # Checagens baratas (sem queries) primeiro, para evitar calcular a
+        # próxima data-hora agendável quando a consulta nem cabe na máscara
+        if not (
+            data_hora <= agora + CONSULTA_ANTECEDENCIA_MAXIMA and
+            self._tem_intervalo_onde_cabe_uma_consulta_em(data_hora)
+        ):
+            return False
+
         proxima_data_hora_agendavel = self.proxima_data_hora_agendavel
 
         return bool(
-            self.disponibilidade.exists() and
             proxima_data_hora_agendavel is not None and
-            proxima_data_hora_agendavel <= data_hora <= agora + CONSULTA_ANTECEDENCIA_MAXIMA and
-            self._tem_intervalo_onde_cabe_uma_consulta_em(data_hora) and
-            not self.ja_tem_consulta_em(data_hora)
+            proxima_data_hora_agendavel <= data_hora and
+            not tem_consulta_conflitante(self.get_datas_hora_ocupadas_entre(data_hora, data_hora), data_hora)
         )
 
     def get_matriz_disponibilidade_booleanos_em_json(self):
@@ -376,45 +554,38 @@ class Psicologo(BasePacienteOuPsicologo):
         A ideia é que a matriz seja interpretável nos templates, então
         ela é retornada como uma string de JSON que pode ser decodificada
         pelo JavaScript no template.
-        """
-        def domingo_a_sabado(matriz_disponibilidade_booleanos):
-            matriz_disponibilidade_booleanos.insert(0, matriz_disponibilidade_booleanos.pop())
-
-        matriz = [[False] * NUMERO_PERIODOS_POR_DIA for _ in range(7)]
 
-        if self.disponibilidade.exists():
-            for intervalo in self.disponibilidade.all():
-                dia_semana_inicio = intervalo.dia_semana_inicio_local - 1
-                dia_semana_fim = intervalo.dia_semana_fim_local - 1
-                hil = intervalo.hora_inicio_local
-                hfl = intervalo.hora_fim_local
-                hora_inicio_matriz = regra_de_3_numero_periodos_por_dia(timedelta(hours=hil.hour, minutes=hil.minute).total_seconds() / 3600)
-                hora_fim_matriz = regra_de_3_numero_periodos_por_dia(timedelta(hours=hfl.hour, minutes=hfl.minute).total_seconds() / 3600)
-
-                ranges = []
-
-                if dia_semana_inicio == dia_semana_fim and hora_inicio_matriz < hora_fim_matriz:
-                    ranges = [range(hora_inicio_matriz, hora_fim_matriz)]
-                else:
-                    ranges.append(range(hora_inicio_matriz, NUMERO_PERIODOS_POR_DIA))
-
-                    dia_semana_atual = dia_semana_inicio + 1
-
-                    if dia_semana_inicio >= dia_semana_fim:
-                        dia_semana_atual -= 7
+        A matriz é guardada em cache por psicólogo, versão da disponibilidade
+        e fuso atual, já que as horas da matriz são locais. Com o cache padrão
+        (settings.CACHES), cada processo guarda a sua própria cópia.
+        """
+        if self.pk is None:
+            return self._criar_matriz_disponibilidade_booleanos_em_json()
 
-                    while dia_semana_atual <= dia_semana_fim:
-                        if dia_semana_atual != dia_semana_fim:
-                            ranges.append(range(0, NUMERO_PERIODOS_POR_DIA))
-                        else:
-                            ranges.append(range(0, hora_fim_matriz))
-                        dia_semana_atual += 1
+        chave = (
+            f"terapia:psicologo:{self.pk}:matriz_disponibilidade:"
+            f"{self.versao_disponibilidade}:{timezone.get_current_timezone_name()}"
+        )
+        return cache.get_or_set(
+            chave,
+            self._criar_matriz_disponibilidade_booleanos_em_json,
+            CACHE_MATRIZ_DISPONIBILIDADE_TIMEOUT,
+        )
 
-                for i, _range in enumerate(ranges):
-                    for hora in _range:
-                        matriz[(dia_semana_inicio + i) % 7][hora] = True
+    def _criar_matriz_disponibilidade_booleanos_em_json(self):
+        faixas = []
 
-        domingo_a_sabado(matriz)
+        for intervalo in self.disponibilidade.all():
+            hil = intervalo.hora_inicio_local
+            hfl = intervalo.hora_fim_local
+            hora_inicio_matriz = regra_de_3_numero_periodos_por_dia(timedelta(hours=hil.hour, minutes=hil.minute).total_seconds() / 3600)
+            hora_fim_matriz = regra_de_3_numero_periodos_por_dia(timedelta(hours=hfl.hour, minutes=hfl.minute).total_seconds() / 3600)
+            faixas.append((
+                (intervalo.dia_semana_inicio_local - 1) * NUMERO_PERIODOS_POR_DIA + hora_inicio_matriz,
+                (intervalo.dia_semana_fim_local - 1) * NUMERO_PERIODOS_POR_DIA + hora_fim_matriz,
+            ))
+
+        matriz = semana_achatada_para_matriz(criar_semana_achatada(faixas))
         matriz_em_json = json.dumps(matriz)
         return matriz_em_json
 
@@ -433,6 +604,7 @@ class IntervaloDisponibilidadeManager(models.Manager):
             data_hora_fim=converter_dia_semana_iso_com_hora_para_data_hora(dia_semana_fim_iso, hora_fim, fuso),
             psicologo=psicologo,
         )
+        intervalo.atualizar_minutos_semana()
         return intervalo
 
     def criar_por_dia_semana_e_hora(self,
@@ -480,6 +652,7 @@ class IntervaloDisponibilidadeManager(models.Manager):
             data_hora_fim=converter_dia_semana_iso_com_hora_para_data_hora(dia_semana_fim_iso, hora_fim, fuso),
             psicologo=psicologo,
         )
+        intervalo.atualizar_minutos_semana()
         return intervalo
 
     def criar_por_dia_semana_e_hora(self,
@@ -524,6 +697,16 @@ class IntervaloDisponibilidade(models.Model):
         on_delete=models.CASCADE,
         related_name="disponibilidade",
     )
+    inicio_minuto_semana = models.PositiveSmallIntegerField(
+        "Minuto da semana (UTC) do início do intervalo",
+        default=0,
+        editable=False,
+    )
+    fim_minuto_semana = models.PositiveSmallIntegerField(
+        "Minuto da semana (UTC) do fim do intervalo",
+        default=0,
+        editable=False,
+    )
     objects = IntervaloDisponibilidadeManager()
 
     @property
@@ -581,6 +764,13 @@ class IntervaloDisponibilidade(models.Model):
         verbose_name = "Intervalo de Disponibilidade"
         verbose_name_plural = "Intervalos de Disponibilidade"
         ordering = ["data_hora_inicio"]
+        indexes = [
+            # Checagens de sobreposição e disponibilidade por faixa de minutos da semana
+            models.Index(
+                fields=["psicologo", "inicio_minuto_semana", "fim_minuto_semana"],
+                name="intervalo_psicologo_min_idx",
+            ),
+        ]
 
     def descrever(self, fuso=UTC):
         with timezone.override(fuso):
@@ -589,6 +779,13 @@ class IntervaloDisponibilidade(models.Model):
     def __str__(self):
         return self.descrever(timezone.get_current_timezone())
 
+    def atualizar_minutos_semana(self):
+        """
+        Atualiza os minutos da semana (UTC) de início e fim a partir das data-horas do intervalo.
+        """
+        self.inicio_minuto_semana = get_minuto_da_semana_utc(self.data_hora_inicio)
+        self.fim_minuto_semana = get_minuto_da_semana_utc(self.data_hora_fim)
+
     def vira_a_semana(self):
         """
         Verifica se o intervalo começa em uma semana e termina em outra.
@@ -637,26 +834,30 @@ class IntervaloDisponibilidade(models.Model):
         Retorna a lista de datas e horas que estão dentro do intervalo,
         dando passos correspondentes à duração de uma consulta.
         """
-        datas_hora = []
+        return list(self.iterar_datas_hora())
+
+    def iterar_datas_hora(self):
+        """
+        Gera, em ordem, as datas e horas que estão dentro do intervalo,
+        dando passos correspondentes à duração de uma consulta.
+        """
         data_hora_atual = self.data_hora_inicio
+        fim_da_semana = converter_dia_semana_iso_com_hora_para_data_hora(7, time(23, 59), data_hora_atual.tzinfo)
+        ultima_data_hora = self.data_hora_fim - CONSULTA_DURACAO
+        nao_vira_a_semana = self.data_hora_inicio < self.data_hora_fim
         virou_a_semana = False
 
         while True:
-            datas_hora.append(data_hora_atual)
+            yield data_hora_atual
             data_hora_atual = data_hora_atual + CONSULTA_DURACAO
 
-            if data_hora_atual > converter_dia_semana_iso_com_hora_para_data_hora(7, time(23, 59), data_hora_atual.tzinfo):
+            if data_hora_atual > fim_da_semana:
                 data_hora_atual -= timedelta(weeks=1)
                 virou_a_semana = True
 
-            if (
-                (self.data_hora_inicio < self.data_hora_fim or virou_a_semana) and
-                data_hora_atual > self.data_hora_fim - CONSULTA_DURACAO
-            ):
+            if (nao_vira_a_semana or virou_a_semana) and data_hora_atual > ultima_data_hora:
                 break
 
-        return datas_hora
-
     def clean(self):
         super().clean()
 
@@ -695,9 +896,6 @@ class IntervaloDisponibilidade(models.Model):
             timedelta_hora = indice * CONSULTA_DURACAO
             return time(timedelta_hora.seconds // 3600, (timedelta_hora.seconds // 60) % 60)
 
-        def segunda_a_domingo(matriz):
-            matriz.append(matriz.pop(0))
-
         def to_dia_semana_iso(indice):
             return indice % 7 + 1
 
@@ -709,63 +907,128 @@ class IntervaloDisponibilidade(models.Model):
         if not (isinstance(m,list) and all(isinstance(row, list) for row in m)):
             raise ValueError("Fromato inválido para matriz de disponibilidade")
 
-        segunda_a_domingo(m)
+        if not m:
+            return []
 
+        numero_periodos_por_dia = len(m[0])
+        fuso_atual = timezone.get_current_timezone()
         disponibilidade = []
-        intervalo_no_comeco = None
-
-        i = j = 0
-        while i < len(m):
-            while j < len(m[0]):
-                if m[i][j]:
-                    comeca_no_inicio_da_semana = i == 0 and j == 0
-                    vira_a_semana = False
-
-                    hora_inicio = get_hora_por_indice(j)
-                    dia_semana_inicio_iso = to_dia_semana_iso(i)
-
-                    while m[i][j]:
-                        if j < len(m[0]) - 1:
-                            j += 1
-                        else:
-                            j = 0
-                            i += 1
-                            if i >= len(m):
-                                vira_a_semana = True
-                                break
-
-                    fuso_atual = timezone.get_current_timezone()
-
-                    if vira_a_semana and intervalo_no_comeco:
-                        hora_fim = intervalo_no_comeco.hora_fim_local
-                        dia_semana_fim_iso = intervalo_no_comeco.dia_semana_fim_local
-                        disponibilidade.remove(intervalo_no_comeco)
-                    else:
-                        hora_fim = get_hora_por_indice(j)
-                        dia_semana_fim_iso = to_dia_semana_iso(i)
-
-                    intervalo = IntervaloDisponibilidade.objects.inicializar_por_dia_semana_e_hora(
-                        dia_semana_inicio_iso=dia_semana_inicio_iso,
-                        hora_inicio=hora_inicio,
-                        dia_semana_fim_iso=dia_semana_fim_iso,
-                        hora_fim=hora_fim,
-                        fuso=fuso_atual,
-                    )
 
-                    if comeca_no_inicio_da_semana:
-                        intervalo_no_comeco = intervalo
+        for inicio, fim in extrair_faixas(matriz_para_semana_achatada(m)):
+            dia_semana_inicio, indice_hora_inicio = divmod(inicio, numero_periodos_por_dia)
+            dia_semana_fim, indice_hora_fim = divmod(fim, numero_periodos_por_dia)
 
-                    disponibilidade.append(intervalo)
+            disponibilidade.append(IntervaloDisponibilidade.objects.inicializar_por_dia_semana_e_hora(
+                dia_semana_inicio_iso=to_dia_semana_iso(dia_semana_inicio),
+                hora_inicio=get_hora_por_indice(indice_hora_inicio),
+                dia_semana_fim_iso=to_dia_semana_iso(dia_semana_fim),
+                hora_fim=get_hora_por_indice(indice_hora_fim),
+                fuso=fuso_atual,
+            ))
 
-                if i >= len(m):
-                    break
+        return disponibilidade
+
+
+class SlotAgendavelQuerySet(models.QuerySet):
+    def agendaveis(self, agora=None):
+        """
+        Filtra os slots que respeitam as antecedências mínima e máxima de agendamento.
+        """
+        if agora is None:
+            agora = timezone.now()
 
-                j += 1
+        return self.filter(
+            data_hora__gte=agora + CONSULTA_ANTECEDENCIA_MINIMA,
+            data_hora__lte=agora + CONSULTA_ANTECEDENCIA_MAXIMA,
+        )
 
-            j = 0
-            i += 1
 
-        return disponibilidade
+class SlotAgendavelManager(models.Manager.from_queryset(SlotAgendavelQuerySet)):
+    def sincronizar(self, psicologo, inicio=None, fim=None, agora=None):
+        """
+        Reconstrói os slots agendáveis do psicólogo no intervalo [inicio, fim), limitado ao
+        horizonte materializado, a partir da máscara de disponibilidade e das consultas
+        não canceladas. Se inicio e fim não forem enviados, reconstrói o horizonte inteiro.
+
+        Usa um número fixo de queries: uma para as consultas, uma para apagar os slots
+        antigos e uma para criar os novos.
+        """
+        if agora is None:
+            agora = timezone.now()
+
+        inicio_do_horizonte = get_inicio_do_periodo(agora)
+        fim_do_horizonte = agora + SLOTS_AGENDAVEIS_HORIZONTE
+        inicio = inicio_do_horizonte if inicio is None else max(inicio, inicio_do_horizonte)
+        fim = fim_do_horizonte if fim is None else min(fim, fim_do_horizonte)
+
+        if inicio >= fim:
+            return
+
+        datas_hora = gerar_datas_hora_agendaveis(
+            mascara_de_bytes(psicologo.mascara_disponibilidade),
+            psicologo.get_datas_hora_ocupadas_entre(inicio, fim),
+            inicio,
+            fim,
+        )
+
+        with transaction.atomic():
+            self.filter(psicologo=psicologo, data_hora__gte=inicio, data_hora__lt=fim).delete()
+            self.bulk_create([self.model(psicologo=psicologo, data_hora=data_hora) for data_hora in datas_hora])
+
+    def sincronizar_em_volta_de(self, psicologo, data_hora, agora=None):
+        """
+        Reconstrói os slots do psicólogo que podem conflitar com uma consulta na data-hora enviada.
+        """
+        self.sincronizar(psicologo, data_hora - CONSULTA_DURACAO, data_hora + CONSULTA_DURACAO, agora=agora)
+
+    def rolar_horizonte(self, agora=None, dias=1):
+        """
+        Apaga os slots que já passaram e materializa os slots dos últimos dias do
+        horizonte para todos os psicólogos com alguma disponibilidade.
+        """
+        if agora is None:
+            agora = timezone.now()
+
+        apagados, _ = self.filter(data_hora__lt=get_inicio_do_periodo(agora)).delete()
+        fim = agora + SLOTS_AGENDAVEIS_HORIZONTE
+        inicio = fim - timedelta(days=dias)
+        psicologos = Psicologo.objects.filter(disponibilidade__isnull=False).distinct().only("id", "mascara_disponibilidade")
+
+        for psicologo in psicologos:
+            self.sincronizar(psicologo, inicio, fim, agora=agora)
+
+        return apagados
+
+
+class SlotAgendavel(models.Model):
+    """
+    Data-hora de início concreta em que uma consulta pode ser agendada com um psicólogo.
+    É uma materialização de IntervaloDisponibilidade e Consulta para o horizonte de
+    SLOTS_AGENDAVEIS_HORIZONTE, mantida incrementalmente:
+
+    - a edição da disponibilidade reconstrói os slots do psicólogo;
+    - o agendamento e o cancelamento de consultas reconstroem os slots em volta da consulta;
+    - o comando "rolar_slots_agendaveis" apaga os slots passados e avança o horizonte.
+    """
+    psicologo = models.ForeignKey(Psicologo, on_delete=models.CASCADE, related_name="slots_agendaveis")
+    data_hora = models.DateTimeField("Data-hora de início")
+
+    objects = SlotAgendavelManager()
+
+    class Meta:
+        verbose_name = "Slot agendável"
+        verbose_name_plural = "Slots agendáveis"
+        ordering = ["data_hora"]
+        constraints = [
+            models.UniqueConstraint(fields=["psicologo", "data_hora"], name="slot_psicologo_dh_uniq"),
+        ]
+        indexes = [
+            # Psicólogos agendáveis em uma data-hora
+            models.Index(fields=["data_hora", "psicologo"], name="slot_dh_psicologo_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.psicologo} em {timezone.localtime(self.data_hora):%d/%m/%Y %H:%M}"
 
 
 class EstadoConsulta(models.TextChoices):
@@ -777,12 +1040,198 @@ class EstadoConsulta(models.TextChoices):
     __empty__ = "Estado"
 
 
+# Estados em que a consulta ocupa o seu horário na agenda do paciente e do psicólogo: só o
+# cancelamento libera o horário. Usados em todas as verificações de disponibilidade
+ESTADOS_CONSULTA_QUE_OCUPAM_HORARIO = [
+    EstadoConsulta.SOLICITADA, EstadoConsulta.CONFIRMADA, EstadoConsulta.EM_ANDAMENTO, EstadoConsulta.FINALIZADA,
+]
+
+# Estados das consultas que ocupam horário e ainda não terminaram. Os índices únicos parciais
+# contra o agendamento duplo usam só estes, pois o horário de uma consulta finalizada já passou
+# e não pode mais ser agendado
+ESTADOS_CONSULTA_ATIVOS = [EstadoConsulta.SOLICITADA, EstadoConsulta.CONFIRMADA, EstadoConsulta.EM_ANDAMENTO]
+
+
+class ConsultaQuerySet(models.QuerySet):
+    def ativas(self):
+        return self.filter(estado__in=ESTADOS_CONSULTA_ATIVOS)
+
+    def ocupando_horario(self):
+        return self.filter(estado__in=ESTADOS_CONSULTA_QUE_OCUPAM_HORARIO)
+
+    @staticmethod
+    def get_condicoes_de_horario(agora):
+        """
+        Retorna as condições (já começou, já terminou) sobre o horário das consultas.
+        """
+        return Q(data_hora_agendada__lte=agora), Q(data_hora_agendada__lte=agora - CONSULTA_DURACAO)
+
+    def com_estado_efetivo(self, agora=None):
+        """
+        Anota em cada consulta o "estado_efetivo": o estado que ela teria se as transições
+        automáticas (ver Consulta.atualizar_estado_automatico) já tivessem sido aplicadas.
+        Assim, páginas só de leitura mostram e filtram o estado correto sem escrever no banco,
+        e o estado persistido é atualizado depois, em lote.
+        """
+        if agora is None:
+            agora = timezone.now()
+
+        ja_comecou, ja_terminou = self.get_condicoes_de_horario(agora)
+
+        return self.annotate(estado_efetivo=Case(
+            When(ja_comecou, estado=EstadoConsulta.SOLICITADA, then=Value(EstadoConsulta.CANCELADA)),
+            When(
+                ja_terminou,
+                estado__in=[EstadoConsulta.CONFIRMADA, EstadoConsulta.EM_ANDAMENTO],
+                then=Value(EstadoConsulta.FINALIZADA),
+            ),
+            When(ja_comecou, estado=EstadoConsulta.CONFIRMADA, then=Value(EstadoConsulta.EM_ANDAMENTO)),
+            default=F("estado"),
+            output_field=models.CharField(max_length=20, choices=EstadoConsulta.choices),
+        ))
+
+    def get_transicoes_automaticas(self, agora):
+        """
+        Retorna as regras de Consulta.atualizar_estado_automatico como tuplas
+        (consultas que devem transicionar, novo estado, tipo de notificação ou None).
+        """
+        ja_comecou, ja_terminou = self.get_condicoes_de_horario(agora)
+        # Restringe as buscas às consultas com transição devida, usando o índice de proximo_evento_em
+        devidas = self.filter(proximo_evento_em__lte=agora)
+
+        return [
+            (
+                devidas.filter(ja_comecou, estado=EstadoConsulta.SOLICITADA),
+                EstadoConsulta.CANCELADA,
+                TipoNotificacao.CONSULTA_EXPIRADA,
+            ),
+            (
+                devidas.filter(ja_comecou & ~ja_terminou, estado=EstadoConsulta.CONFIRMADA),
+                EstadoConsulta.EM_ANDAMENTO,
+                TipoNotificacao.CONSULTA_EM_ANDAMENTO,
+            ),
+            (
+                devidas.filter(ja_terminou, estado__in=[EstadoConsulta.CONFIRMADA, EstadoConsulta.EM_ANDAMENTO]),
+                EstadoConsulta.FINALIZADA,
+                None,
+            ),
+        ]
+
+    def atualizar_estados_automaticamente(self, agora=None):
+        """
+        Aplica as transições automáticas de estado às consultas do queryset de forma
+        conjunta: cada regra vira um UPDATE condicional sobre as consultas que devem
+        transicionar, e as notificações correspondentes são criadas em lote.
+
+        As consultas são processadas em lotes de TRANSICOES_AUTOMATICAS_TAMANHO_LOTE, então o
+        número de queries depende só de quantas consultas transicionaram, e não do histórico.
+        Quando nada transiciona, são 3 queries (uma por regra). Retorna quantas consultas
+        tiveram o estado atualizado.
+
+        Os slots agendáveis não precisam ser sincronizados (o UPDATE não dispara sinais),
+        porque só transicionam consultas cujo horário já começou.
+        """
+        if agora is None:
+            agora = timezone.now()
+
+        atualizadas = 0
+
+        for consultas, novo_estado, tipo_notificacao in self.get_transicoes_automaticas(agora):
+            consultas = consultas.order_by().select_for_update(of=("self",))
+
+            if tipo_notificacao is None:
+                consultas = consultas.only("pk")
+            else:
+                consultas = consultas.select_related("paciente__usuario", "psicologo__usuario").only(
+                    "data_hora_agendada", "paciente__usuario__email", "psicologo__usuario__email",
+                )
+
+            while True:
+                with transaction.atomic():
+                    lote = list(consultas[:TRANSICOES_AUTOMATICAS_TAMANHO_LOTE])
+
+                    if not lote:
+                        break
+
+                    atualizadas_no_lote = Consulta.objects.filter(pk__in=[consulta.pk for consulta in lote]).update(
+                        estado=novo_estado,
+                    )
+
+                    if tipo_notificacao is not None:
+                        Notificacao.criar_em_lote([
+                            Notificacao(tipo=tipo_notificacao, destinatario=destinatario, consulta=consulta)
+                            for consulta in lote
+                            for destinatario in (consulta.paciente.usuario, consulta.psicologo.usuario)
+                        ])
+
+                atualizadas += atualizadas_no_lote
+
+                if not atualizadas_no_lote:
+                    break
+
+        return atualizadas
+
+    @staticmethod
+    def get_proximo_evento_em(estado, data_hora_agendada):
+        """
+        Retorna o instante da próxima transição automática de uma consulta com o estado e a
+        data-hora agendada enviados: o início para SOLICITADA e CONFIRMADA, o fim para
+        EM_ANDAMENTO e None para os estados terminais.
+
+        @param data_hora_agendada: data-hora ou expressão (ex.: F("data_hora_agendada")).
+        """
+        if estado in (EstadoConsulta.SOLICITADA, EstadoConsulta.CONFIRMADA):
+            return data_hora_agendada
+
+        if estado == EstadoConsulta.EM_ANDAMENTO:
+            if hasattr(data_hora_agendada, "resolve_expression"):
+                return ExpressionWrapper(data_hora_agendada + CONSULTA_DURACAO, output_field=models.DateTimeField())
+            return data_hora_agendada + CONSULTA_DURACAO
+
+        return None
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create não chama Consulta.save, então os campos derivados são preenchidos aqui
+        objs = list(objs)
+
+        for consulta in objs:
+            consulta.atualizar_campos_derivados()
+
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def update(self, **kwargs):
+        # UPDATEs também não chamam Consulta.save, então os campos derivados são mantidos aqui
+        if "data_hora_agendada" in kwargs and not hasattr(kwargs["data_hora_agendada"], "resolve_expression"):
+            kwargs.setdefault("slot", get_slot(kwargs["data_hora_agendada"]))
+
+        if "proximo_evento_em" not in kwargs and ("estado" in kwargs or "data_hora_agendada" in kwargs):
+            data_hora_agendada = kwargs.get("data_hora_agendada", F("data_hora_agendada"))
+
+            if "estado" in kwargs:
+                kwargs["proximo_evento_em"] = self.get_proximo_evento_em(kwargs["estado"], data_hora_agendada)
+            else:
+                kwargs["proximo_evento_em"] = Case(
+                    *[
+                        When(estado=estado, then=self.get_proximo_evento_em(estado, data_hora_agendada))
+                        for estado in ESTADOS_CONSULTA_ATIVOS
+                    ],
+                    default=None,
+                    output_field=models.DateTimeField(),
+                )
+
+        return super().update(**kwargs)
+
+
 class Consulta(models.Model):
     data_hora_solicitada = models.DateTimeField(auto_now_add=True)
     data_hora_agendada = models.DateTimeField(
         "Data-hora agendada para a consulta",
         validators=[validate_antecedencia, validate_divisivel_por_duracao_consulta],
     )
+    # Índice do período de CONSULTA_DURACAO desde a época Unix, derivado de data_hora_agendada
+    slot = models.IntegerField("Slot", editable=False)
+    # Instante da próxima transição automática de estado (ver ConsultaQuerySet.get_proximo_evento_em)
+    proximo_evento_em = models.DateTimeField("Próximo evento em", editable=False, blank=True, null=True)
     duracao = models.DurationField(
         "Duração que a consulta teve em minutos",
         blank=True,
@@ -830,8 +1279,38 @@ class Consulta(models.Model):
                 fields=['psicologo', 'data_hora_agendada'],
                 name='consulta_psicologo_dh_idx',
             ),
+            # Paginação por cursor de "Minhas consultas" (ver MinhasConsultasView.ordenacao_cursor)
+            models.Index(
+                fields=['paciente', '-data_hora_solicitada', '-data_hora_agendada', 'id'],
+                name='consulta_paciente_lista_idx',
+            ),
+            models.Index(
+                fields=['psicologo', '-data_hora_solicitada', '-data_hora_agendada', 'id'],
+                name='consulta_psicologo_lista_idx',
+            ),
+            # Busca das consultas com transição automática devida (proximo_evento_em <= agora)
+            models.Index(
+                fields=['proximo_evento_em'],
+                condition=Q(proximo_evento_em__isnull=False),
+                name='consulta_proximo_evento_idx',
+            ),
+        ]
+        constraints = [
+            # Impedem, no próprio banco, dois agendamentos ativos no mesmo slot
+            models.UniqueConstraint(
+                fields=['psicologo', 'slot'],
+                condition=Q(estado__in=ESTADOS_CONSULTA_ATIVOS),
+                name='consulta_psicologo_slot_ativo_uniq',
+            ),
+            models.UniqueConstraint(
+                fields=['paciente', 'slot'],
+                condition=Q(estado__in=ESTADOS_CONSULTA_ATIVOS),
+                name='consulta_paciente_slot_ativo_uniq',
+            ),
         ]
 
+    objects = ConsultaQuerySet.as_manager()
+
     def clean(self):
         super().clean()
         self.data_hora_agendada = desprezar_segundos_e_microssegundos(self.data_hora_agendada)
@@ -852,14 +1331,11 @@ class Consulta(models.Model):
                     )
                 })
 
-        # Validar se o paciente está disponível no horário (não tem outra consulta)
+        # Validar se o paciente está disponível no horário (não tem outra consulta). Isso só
+        # antecipa o erro para formulários: quem de fato impede o agendamento duplo, mesmo com
+        # requisições concorrentes, são os índices únicos parciais no INSERT/UPDATE (ver save)
         if self.paciente and self.data_hora_agendada:
-            consultas_conflitantes = Consulta.objects.filter(
-                paciente=self.paciente,
-                data_hora_agendada=self.data_hora_agendada
-            ).exclude(
-                estado__in=[EstadoConsulta.CANCELADA, EstadoConsulta.FINALIZADA]
-            )
+            consultas_conflitantes = self.paciente.consultas.ativas().filter(slot=get_slot(self.data_hora_agendada))
 
             # Excluir a própria consulta se estiver editando
             if self.pk:
@@ -939,17 +1415,16 @@ class Consulta(models.Model):
         return False
 
     @classmethod
-    def atualizar_estados_automaticamente(cls, queryset=None):
+    def atualizar_estados_automaticamente(cls, queryset=None, agora=None):
         """
-        Atualiza automaticamente o estado de todas as consultas do queryset.
+        Atualiza automaticamente o estado de todas as consultas do queryset, com as mesmas
+        regras de atualizar_estado_automatico, mas em lote (ver ConsultaQuerySet).
         Se nenhum queryset for informado, atualiza todas as consultas.
         """
         if queryset is None:
             queryset = cls.objects.all()
 
-        agora = timezone.now()
-        for consulta in queryset:
-            consulta.atualizar_estado_automatico(agora=agora)
+        return queryset.atualizar_estados_automaticamente(agora=agora)
 
     def ensure_jitsi_room(self):
         """
@@ -980,9 +1455,55 @@ class Consulta(models.Model):
             f"{self.paciente.nome} e {self.psicologo.nome_completo}"
         )
     
+    def atualizar_campos_derivados(self):
+        """
+        Atualiza os campos derivados de data_hora_agendada e estado (slot e proximo_evento_em).
+        """
+        if self.data_hora_agendada:
+            self.slot = get_slot(self.data_hora_agendada)
+            self.proximo_evento_em = ConsultaQuerySet.get_proximo_evento_em(self.estado, self.data_hora_agendada)
+
+    def get_erro_de_conflito(self):
+        """
+        Identifica qual dos índices únicos parciais rejeitou a consulta e retorna o erro de
+        validação correspondente, ou None se a recusa não se deve a um conflito de agenda.
+        Só é chamado depois de o banco recusar o agendamento.
+        """
+        conflitantes = Consulta.objects.ativas().filter(slot=self.slot).exclude(pk=self.pk)
+
+        if conflitantes.filter(paciente_id=self.paciente_id).exists():
+            mensagem, code = 'O paciente já tem uma consulta agendada neste horário.', 'paciente_nao_disponivel'
+        elif conflitantes.filter(psicologo_id=self.psicologo_id).exists():
+            mensagem, code = 'O psicólogo não está disponível neste horário.', 'psicologo_nao_disponivel'
+        else:
+            return None
+
+        return ValidationError({'data_hora_agendada': ValidationError(mensagem, code=code)})
+
     def save(self, *args, **kwargs):
         pk = self.pk
-        consulta = super().save(*args, **kwargs)
+        self.atualizar_campos_derivados()
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+
+            if "data_hora_agendada" in update_fields:
+                update_fields.add("slot")
+            if "data_hora_agendada" in update_fields or "estado" in update_fields:
+                update_fields.add("proximo_evento_em")
+
+            kwargs["update_fields"] = update_fields
+
+        try:
+            with transaction.atomic():
+                consulta = super().save(*args, **kwargs)
+        except IntegrityError as e:
+            erro = self.get_erro_de_conflito()
+            if erro is None:
+                raise
+            raise erro from e
+
         if pk is None:
             Notificacao.objects.create(
                 tipo=TipoNotificacao.CONSULTA_SOLICITADA,
@@ -1001,6 +1522,76 @@ class TipoNotificacao(models.TextChoices):
     CONSULTA_EM_ANDAMENTO = "CONSULTA_EM_ANDAMENTO", "Consulta Em Andamento"
     CONSULTA_EXPIRADA = "CONSULTA_EXPIRADA", "Consulta Expirada"
 
+class NotificacaoQuerySet(models.QuerySet):
+    def para_caixa_de_entrada(self):
+        """
+        Ordena as notificações da mais recente para a mais antiga, carregando só as colunas
+        exibidas. A mensagem já está renderizada na linha, então não há joins.
+        """
+        return self.only("id", "destinatario", "lida", "data_hora_criada", "mensagem").order_by("-data_hora_criada", "-pk")
+
+    def a_arquivar(self, retencao=NOTIFICACOES_RETENCAO, agora=None):
+        """
+        Retorna as notificações lidas criadas há mais do que a retenção enviada.
+        """
+        if agora is None:
+            agora = timezone.now()
+
+        return self.filter(lida=True, data_hora_criada__lt=agora - retencao)
+
+    def arquivar(self, tamanho_lote=RETENCAO_TAMANHO_LOTE, apagar=False):
+        """
+        Move as notificações do queryset para NotificacaoArquivada (ou só as apaga, se apagar
+        for verdadeiro) em lotes ordenados por pk, cada um na sua própria transação curta, para
+        não segurar o lock de escrita do banco durante toda a operação. Retorna quantas foram
+        removidas da tabela de notificações.
+        """
+        removidas = 0
+
+        for pks in iterar_lotes_de_pks(self, tamanho_lote):
+            with transaction.atomic():
+                lote = self.filter(pk__in=pks)
+
+                if not apagar:
+                    NotificacaoArquivada.objects.bulk_create(
+                        [NotificacaoArquivada.de_notificacao(notificacao) for notificacao in lote],
+                        ignore_conflicts=True,
+                    )
+
+                removidas += lote.delete()[0]
+
+        return removidas
+
+    def marcar_como_lidas(self, usuario, ids=None):
+        """
+        Marca como lidas as notificações não lidas do usuário (só as dos ids enviados, se houver)
+        e atualiza o seu contador. Retorna o número de notificações marcadas.
+
+        Ao marcar todas, o contador é zerado primeiro para que o lock na linha do usuário
+        serialize esta operação com a criação de novas notificações (ver
+        Notificacao.incrementar_contadores). Ao marcar só algumas, o contador é decrementado
+        pelo número de linhas que o UPDATE realmente mudou, então confirmações repetidas ou
+        concorrentes não o descontam duas vezes.
+        """
+        usuarios = get_user_model().objects.filter(pk=usuario.pk)
+        notificacoes = self.filter(destinatario=usuario, lida=False)
+
+        with transaction.atomic():
+            if ids is None:
+                usuarios.update(notificacoes_nao_lidas=0)
+                marcadas = notificacoes.update(lida=True)
+                usuario.notificacoes_nao_lidas = 0
+            else:
+                marcadas = notificacoes.filter(pk__in=ids).update(lida=True)
+
+                if marcadas:
+                    usuarios.update(notificacoes_nao_lidas=Greatest(F("notificacoes_nao_lidas") - marcadas, 0))
+
+                usuario.notificacoes_nao_lidas = usuarios.values_list("notificacoes_nao_lidas", flat=True).get()
+
+        return marcadas
+
+
 class Notificacao(models.Model):
     tipo = models.CharField("Tipo", max_length=50, choices=TipoNotificacao.choices)
     lida = models.BooleanField("Lida", default=False)
@@ -1026,43 +1617,334 @@ class Notificacao(models.Model):
         related_name="notificacoes",
     )
 
-    @property
-    def mensagem(self):
-        mensagens = {
-            TipoNotificacao.CONSULTA_SOLICITADA: "O paciente {remetente} solicitou uma nova consulta agendada para {data_hora_agendada}.",
-            TipoNotificacao.CONSULTA_CONFIRMADA: "O psicólogo {remetente} aceitou sua solicitação de consulta agendada para {data_hora_agendada}.",
-            TipoNotificacao.CONSULTA_RECUSADA: "O psicólogo {remetente} recusou sua solicitação de consulta agendada para {data_hora_agendada}.",
-            TipoNotificacao.CONSULTA_CANCELADA: "O paciente {remetente} cancelou a consulta agendada para {data_hora_agendada}.",
-            TipoNotificacao.CONSULTA_EM_ANDAMENTO: 'Você tem uma consulta em andamento. Acesse "Minhas Consultas" para ingressar na chamada.',
-            TipoNotificacao.CONSULTA_EXPIRADA: "A solicitação de consulta agendada para {data_hora_agendada} expirou por não ter sido respondida.",
-        }
+    # Texto e assunto já renderizados na criação (ver renderizar), para que listar notificações
+    # não precise de joins com consulta e remetente
+    assunto = models.CharField("Assunto", max_length=255, blank=True)
+    mensagem = models.TextField("Mensagem", blank=True)
+
+    MENSAGENS = {
+        TipoNotificacao.CONSULTA_SOLICITADA: "O paciente {remetente} solicitou uma nova consulta agendada para {data_hora_agendada}.",
+        TipoNotificacao.CONSULTA_CONFIRMADA: "O psicólogo {remetente} aceitou sua solicitação de consulta agendada para {data_hora_agendada}.",
+        TipoNotificacao.CONSULTA_RECUSADA: "O psicólogo {remetente} recusou sua solicitação de consulta agendada para {data_hora_agendada}.",
+        TipoNotificacao.CONSULTA_CANCELADA: "O paciente {remetente} cancelou a consulta agendada para {data_hora_agendada}.",
+        TipoNotificacao.CONSULTA_EM_ANDAMENTO: 'Você tem uma consulta em andamento. Acesse "Minhas Consultas" para ingressar na chamada.',
+        TipoNotificacao.CONSULTA_EXPIRADA: "A solicitação de consulta agendada para {data_hora_agendada} expirou por não ter sido respondida.",
+    }
+
+    objects = NotificacaoQuerySet.as_manager()
 
+    class Meta:
+        verbose_name = "Notificação"
+        verbose_name_plural = "Notificações"
+        ordering = ["-data_hora_criada"]
+        indexes = [
+            # Caixa de entrada e busca de notificações não lidas de cada usuário
+            models.Index(
+                fields=['destinatario', 'lida', 'data_hora_criada'],
+                name='notificacao_dest_lida_dh_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Notificação de {self.tipo} de {self.remetente} para {self.destinatario}"
+
+    def get_mensagem_renderizada(self):
         if self.tipo == TipoNotificacao.CONSULTA_EM_ANDAMENTO:
-            return mensagens[self.tipo]
+            return self.MENSAGENS[self.tipo]
         elif self.tipo == TipoNotificacao.CONSULTA_EXPIRADA:
-            return mensagens[self.tipo].format(
+            return self.MENSAGENS[self.tipo].format(
                 data_hora_agendada=timezone.localtime(self.consulta.data_hora_agendada).strftime("%d/%m/%Y %H:%M"),
             )
-        return mensagens[self.tipo].format(
+        return self.MENSAGENS[self.tipo].format(
             remetente=self.remetente.paciente.nome if self.remetente.is_paciente else self.remetente.psicologo.nome_completo,
             data_hora_agendada=timezone.localtime(self.consulta.data_hora_agendada).strftime("%d/%m/%Y %H:%M"),
         )
 
+    def renderizar(self):
+        """
+        Preenche o assunto e a mensagem a partir do tipo, da consulta e do remetente.
+        """
+        self.assunto = self.get_tipo_display()
+        self.mensagem = self.get_mensagem_renderizada()
+
+    def get_email_pendente(self):
+        return EmailPendente(
+            assunto=self.assunto,
+            mensagem=self.mensagem,
+            destinatario=self.destinatario.email,
+        )
+
+    @classmethod
+    def criar_em_lote(cls, notificacoes):
+        """
+        Cria as notificações com um único INSERT e enfileira os e-mails correspondentes
+        com outro, na mesma transação (ver EmailPendente).
+        """
+        for notificacao in notificacoes:
+            if not notificacao.mensagem:
+                notificacao.renderizar()
+
+        with transaction.atomic(savepoint=False):
+            notificacoes = cls.objects.bulk_create(notificacoes)
+            cls.incrementar_contadores(notificacoes)
+            cls.publicar(notificacoes)
+            EmailPendente.objects.bulk_create([notificacao.get_email_pendente() for notificacao in notificacoes])
+
+        return notificacoes
+
+    @staticmethod
+    def incrementar_contadores(notificacoes):
+        """
+        Incrementa Usuario.notificacoes_nao_lidas dos destinatários das notificações não lidas
+        com um único UPDATE atômico (F() + CASE por destinatário).
+        """
+        quantidades = Counter(notificacao.destinatario_id for notificacao in notificacoes if not notificacao.lida)
+
+        if not quantidades:
+            return
+
+        if len(quantidades) == 1:
+            incremento = Value(next(iter(quantidades.values())))
+        else:
+            incremento = Case(
+                *(When(pk=pk, then=Value(quantidade)) for pk, quantidade in quantidades.items()),
+                default=Value(0),
+            )
+
+        get_user_model().objects.filter(pk__in=quantidades).update(
+            notificacoes_nao_lidas=F("notificacoes_nao_lidas") + incremento,
+        )
+
+    @staticmethod
+    def publicar(notificacoes):
+        """
+        Acorda, depois do commit, os streams de notificações ao vivo dos destinatários
+        (ver NotificacoesAoVivoView).
+        """
+        destinatarios = [notificacao.destinatario_id for notificacao in notificacoes]
+        transaction.on_commit(lambda: canal_de_notificacoes.publicar(destinatarios))
+
+    @classmethod
+    def reconciliar_contadores(cls):
+        """
+        Corrige Usuario.notificacoes_nao_lidas dos usuários cujo contador divergiu do número real
+        de notificações não lidas (por exemplo, após notificações serem apagadas em cascata).
+        Retorna o número de usuários corrigidos.
+        """
+        nao_lidas = Coalesce(
+            Subquery(
+                cls.objects.filter(destinatario=OuterRef("pk"), lida=False)
+                .order_by()
+                .values("destinatario")
+                .annotate(quantidade=Count("pk"))
+                .values("quantidade")
+            ),
+            0,
+        )
+        Usuario = get_user_model()
+        divergentes = Usuario.objects.annotate(nao_lidas=nao_lidas).exclude(
+            notificacoes_nao_lidas=F("nao_lidas"),
+        ).values_list("pk", flat=True)
+
+        return Usuario.objects.filter(pk__in=list(divergentes)).update(notificacoes_nao_lidas=nao_lidas)
+
+    def save(self, *args, **kwargs):
+        # O e-mail não é enviado aqui, e sim enfileirado na mesma transação, para que a
+        # requisição não dependa do servidor de e-mail (ver o comando enviar_emails)
+        if self._state.adding and not self.mensagem:
+            self.renderizar()
+
+        with transaction.atomic(savepoint=False):
+            adicionando = self._state.adding
+            super().save(*args, **kwargs)
+
+            if adicionando:
+                self.incrementar_contadores([self])
+                self.publicar([self])
+                self.get_email_pendente().save()
+
+
+class NotificacaoArquivada(models.Model):
+    """
+    Notificação lida e antiga, removida de Notificacao pelo comando aplicar_retencao para
+    manter pequena a tabela lida em toda página. Mantém o id original.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    tipo = models.CharField("Tipo", max_length=50, choices=TipoNotificacao.choices)
+    data_hora_criada = models.DateTimeField("Criada em")
+    data_hora_arquivada = models.DateTimeField("Arquivada em", auto_now_add=True)
+    remetente = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name="Remetente",
+        on_delete=models.CASCADE,
+        related_name="notificacoes_arquivadas_como_remetente",
+        blank=True,
+        null=True,
+    )
+    destinatario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name="Destinatário",
+        on_delete=models.CASCADE,
+        related_name="notificacoes_arquivadas_como_destinatario",
+    )
+    consulta = models.ForeignKey(
+        Consulta,
+        verbose_name="Consulta",
+        on_delete=models.CASCADE,
+        related_name="notificacoes_arquivadas",
+    )
+    assunto = models.CharField("Assunto", max_length=255, blank=True)
+    mensagem = models.TextField("Mensagem", blank=True)
+
     class Meta:
-        verbose_name = "Notificação"
-        verbose_name_plural = "Notificações"
+        verbose_name = "Notificação arquivada"
+        verbose_name_plural = "Notificações arquivadas"
         ordering = ["-data_hora_criada"]
 
     def __str__(self):
-        return f"Notificação de {self.tipo} de {self.remetente} para {self.destinatario}"
+        return f"Notificação arquivada de {self.tipo} para {self.destinatario_id}"
 
-    def save(self, *args, **kwargs):
-        if self._state.adding:
-            send_mail(
-                subject=self.get_tipo_display(),
-                message=self.mensagem,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[self.destinatario.email],
+    @classmethod
+    def de_notificacao(cls, notificacao):
+        return cls(
+            id=notificacao.pk,
+            tipo=notificacao.tipo,
+            data_hora_criada=notificacao.data_hora_criada,
+            remetente_id=notificacao.remetente_id,
+            destinatario_id=notificacao.destinatario_id,
+            consulta_id=notificacao.consulta_id,
+            assunto=notificacao.assunto,
+            mensagem=notificacao.mensagem,
+        )
+
+
+class EmailPendenteQuerySet(models.QuerySet):
+    def a_enviar(self, agora=None):
+        """
+        Retorna os e-mails ainda não enviados cujo próximo envio já pode ser tentado.
+        """
+        if agora is None:
+            agora = timezone.now()
+
+        return self.filter(
+            enviado_em__isnull=True,
+            enviar_a_partir_de__lte=agora,
+            tentativas__lt=EMAILS_PENDENTES_MAXIMO_TENTATIVAS,
+        )
+
+    def reservar(self, quantidade=EMAILS_PENDENTES_TAMANHO_LOTE, agora=None):
+        """
+        Reserva até "quantidade" e-mails a enviar, adiando o próximo envio deles por
+        EMAILS_PENDENTES_RESERVA para que outros processos não os peguem ao mesmo tempo.
+        Se o processo morrer antes de enviá-los, a reserva expira e eles voltam para a fila.
+        """
+        if agora is None:
+            agora = timezone.now()
+
+        with transaction.atomic():
+            emails = list(
+                self.a_enviar(agora).order_by("enviar_a_partir_de").select_for_update(skip_locked=True)[:quantidade]
             )
+            EmailPendente.objects.filter(pk__in=[email.pk for email in emails]).update(
+                enviar_a_partir_de=agora + EMAILS_PENDENTES_RESERVA,
+            )
+
+        return emails
 
-        super().save(*args, **kwargs)
+    def enviar(self, quantidade=EMAILS_PENDENTES_TAMANHO_LOTE, agora=None):
+        """
+        Envia um lote de e-mails pendentes numa única chamada a send_messages, por uma única
+        conexão. Os que falharem são reagendados, a partir do momento da falha, com espera
+        exponencial (EMAILS_PENDENTES_ESPERA_BASE * 2 ^ tentativas) até
+        EMAILS_PENDENTES_MAXIMO_TENTATIVAS. Retorna uma tupla (enviados, falhas).
+        """
+        if agora is None:
+            agora = timezone.now()
+
+        emails = self.reservar(quantidade, agora)
+
+        if not emails:
+            return 0, 0
+
+        enviados, falhas = [], []
+        pendentes = iter(emails)
+
+        def mensagens(entregues):
+            # O backend consome as mensagens em ordem e para na primeira que falhar, então o
+            # último e-mail entregue a ele quando a exceção sobe é o que falhou
+            for email in pendentes:
+                entregues.append(email)
+                yield email.get_mensagem()
+
+        with get_connection() as conexao:
+            while True:
+                entregues = []
+                try:
+                    conexao.send_messages(mensagens(entregues))
+                except Exception as e:
+                    if not entregues:
+                        # Falhou sem chegar a nenhuma mensagem, como na conexão. Os e-mails que
+                        # sobraram voltam para a fila quando a reserva expirar
+                        if not enviados and not falhas:
+                            raise
+                        break
+                    email = entregues.pop()
+                    email.tentativas += 1
+                    email.enviar_a_partir_de = timezone.now() + EMAILS_PENDENTES_ESPERA_BASE * 2 ** (email.tentativas - 1)
+                    email.ultimo_erro = str(e)
+                    falhas.append(email)
+                    # Os anteriores ao que falhou foram enviados; o restante do lote segue pela mesma conexão
+                    enviados.extend(entregues)
+                else:
+                    enviados.extend(entregues)
+                    break
+
+        enviado_em = timezone.now()
+        for email in enviados:
+            email.enviado_em = enviado_em
+
+        EmailPendente.objects.bulk_update(enviados, ["enviado_em"])
+        EmailPendente.objects.bulk_update(falhas, ["tentativas", "enviar_a_partir_de", "ultimo_erro"])
+
+        return len(enviados), len(falhas)
+
+
+class EmailPendente(models.Model):
+    """
+    Caixa de saída de e-mails. Os e-mails são gravados na mesma transação da operação que os
+    gerou e enviados depois, em lotes, pelo comando enviar_emails.
+    """
+    assunto = models.CharField("Assunto", max_length=255)
+    mensagem = models.TextField("Mensagem")
+    destinatario = models.EmailField("Destinatário")
+    data_hora_criado = models.DateTimeField(auto_now_add=True)
+    enviar_a_partir_de = models.DateTimeField("Enviar a partir de", default=timezone.now)
+    tentativas = models.PositiveSmallIntegerField("Tentativas", default=0)
+    ultimo_erro = models.TextField("Último erro", blank=True)
+    enviado_em = models.DateTimeField("Enviado em", blank=True, null=True)
+
+    objects = EmailPendenteQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "E-mail pendente"
+        verbose_name_plural = "E-mails pendentes"
+        ordering = ["data_hora_criado"]
+        indexes = [
+            # Busca dos e-mails a enviar (ver EmailPendenteQuerySet.a_enviar)
+            models.Index(
+                fields=['enviar_a_partir_de'],
+                condition=Q(enviado_em__isnull=True),
+                name='email_pendente_a_enviar_idx',
+            ),
+        ]
+
+    def get_mensagem(self):
+        return EmailMessage(
+            subject=self.assunto,
+            body=self.mensagem,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[self.destinatario],
+        )
+
+    def __str__(self):
+        return f"E-mail \"{self.assunto}\" para {self.destinatario}"
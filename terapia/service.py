@@ -1,7 +1,18 @@
-from django.db import transaction
+from bisect import insort
+from django.db import DatabaseError, transaction
 from django.core.exceptions import ValidationError
 from django.utils import timezone
-from terapia.models import Consulta, EstadoConsulta, TipoNotificacao, Notificacao
+from terapia.constantes import (
+    CONSULTA_ANTECEDENCIA_MAXIMA,
+    CONSULTA_DURACAO,
+)
+from terapia.models import Consulta, EstadoConsulta, TipoNotificacao, Notificacao, SlotAgendavel
+from terapia.utilidades.disponibilidade import (
+    cabe_consulta_na_mascara,
+    mascara_de_bytes,
+    tem_consulta_conflitante,
+)
+from terapia.utilidades.geral import desprezar_segundos_e_microssegundos
 
 
 class AgendamentoService:
@@ -24,16 +35,9 @@ class AgendamentoService:
         )
         if not ignorar_validacao:
             consulta.full_clean()
+        # Consulta.save já cria a notificação de CONSULTA_SOLICITADA
         consulta.save()
 
-        if estado == EstadoConsulta.SOLICITADA:
-            Notificacao.objects.create(
-                tipo=TipoNotificacao.CONSULTA_SOLICITADA,
-                remetente=paciente.usuario,
-                destinatario=psicologo.usuario,
-                consulta=consulta,
-            )
-
         return consulta
 
     @staticmethod
@@ -41,32 +45,164 @@ class AgendamentoService:
         """
         Cria múltiplas consultas a partir de uma lista de horários (strings ISO ou datetimes).
         Retorna uma tupla (criadas, falhas).
+
+        Em vez de validar e salvar uma consulta por vez, o lote é processado em quatro etapas:
+
+        1. Carrega um único retrato da agenda do psicólogo e do paciente na janela do lote;
+        2. Valida todos os horários em memória, inclusive sobreposições entre horários do lote;
+        3. Cria as consultas válidas com um único bulk_create;
+        4. Cria as notificações e envia os e-mails em lote.
         """
         tz = timezone.get_current_timezone()
-        criadas = 0
         falhas = []
+        datas_hora = []
+
+        for slot in slots_horarios:
+            try:
+                if isinstance(slot, str):
+                    dt_naive = timezone.datetime.fromisoformat(slot)
+                    dt = timezone.make_aware(dt_naive, tz)
+                else:
+                    dt = slot
+
+                datas_hora.append((slot, dt, None))
+            except Exception as e:
+                datas_hora.append((slot, None, str(e)))
+
+        datas_hora_validas = [dt for _, dt, erro in datas_hora if erro is None]
+
+        if not datas_hora_validas:
+            return 0, [(slot, erro) for slot, _, erro in datas_hora]
 
         with transaction.atomic():
-            for slot in slots_horarios:
-                try:
-                    if isinstance(slot, str):
-                        dt_naive = timezone.datetime.fromisoformat(slot)
-                        dt = timezone.make_aware(dt_naive, tz)
-                    else:
-                        dt = slot
+            agenda = AgendaEmLote(paciente, psicologo, datas_hora_validas)
+            slots_e_consultas = []
+
+            for slot, dt, erro in datas_hora:
+                if erro is not None:
+                    falhas.append((slot, erro))
+                    continue
 
-                    AgendamentoService.criar_consulta(
+                try:
+                    slots_e_consultas.append((slot, Consulta(
                         paciente=paciente,
                         psicologo=psicologo,
-                        data_hora_agendada=dt
-                    )
-                    criadas += 1
+                        data_hora_agendada=agenda.validar_e_reservar(dt),
+                    )))
                 except ValidationError as ve:
-                    falhas.append((slot, "; ".join(sum(ve.message_dict.values(), []))))
-                except Exception as e:
-                    falhas.append((slot, str(e)))
+                    falhas.append((slot, "; ".join(ve.messages)))
+
+            consultas = AgendamentoService._inserir_consultas(slots_e_consultas, falhas)
+
+            if consultas:
+                SlotAgendavel.objects.sincronizar(
+                    psicologo,
+                    min(consulta.data_hora_agendada for consulta in consultas) - CONSULTA_DURACAO,
+                    max(consulta.data_hora_agendada for consulta in consultas) + CONSULTA_DURACAO,
+                )
+                Notificacao.criar_em_lote([
+                    Notificacao(
+                        tipo=TipoNotificacao.CONSULTA_SOLICITADA,
+                        remetente=paciente.usuario,
+                        destinatario=psicologo.usuario,
+                        consulta=consulta,
+                    )
+                    for consulta in consultas
+                ])
+
+        return len(consultas), falhas
+
+    @staticmethod
+    def _inserir_consultas(slots_e_consultas, falhas):
+        """
+        Insere as consultas já validadas com um único bulk_create. Só se o banco rejeitar o
+        lote (por exemplo, por um agendamento concorrente), cada consulta é inserida no seu
+        próprio savepoint, e as rejeitadas são adicionadas às falhas sem afetar as demais.
+        """
+        if not slots_e_consultas:
+            return []
+
+        try:
+            with transaction.atomic():
+                return Consulta.objects.bulk_create([consulta for _, consulta in slots_e_consultas])
+        except DatabaseError:
+            pass
+
+        consultas = []
+
+        for slot, consulta in slots_e_consultas:
+            try:
+                with transaction.atomic():
+                    consultas.extend(Consulta.objects.bulk_create([consulta]))
+            except DatabaseError:
+                falhas.append((slot, "O horário foi ocupado por outro agendamento."))
+
+        return consultas
+
+
+class AgendaEmLote:
+    """
+    Retrato em memória da agenda de um psicólogo e de um paciente na janela de
+    um lote de agendamentos, carregado com um número fixo de queries.
+
+    Aplica as mesmas regras de Consulta.full_clean, e cada horário aceito passa a
+    ocupar a agenda para os horários seguintes do mesmo lote.
+    """
+
+    def __init__(self, paciente, psicologo, datas_hora):
+        inicio = min(datas_hora)
+        fim = max(datas_hora)
+
+        self.agora = timezone.now()
+        self.mascara = mascara_de_bytes(psicologo.mascara_disponibilidade)
+        self.proxima_data_hora_agendavel = psicologo.proxima_data_hora_agendavel
+        self.datas_hora_ocupadas_psicologo = psicologo.get_datas_hora_ocupadas_entre(inicio, fim)
+        self.datas_hora_ocupadas_paciente = set(paciente.consultas.ocupando_horario().filter(
+            data_hora_agendada__gte=desprezar_segundos_e_microssegundos(inicio),
+            data_hora_agendada__lte=fim,
+        ).values_list("data_hora_agendada", flat=True))
+
+    def psicologo_esta_agendavel_em(self, data_hora):
+        """
+        Mesmo resultado de Psicologo.esta_agendavel_em, mas sobre o retrato em memória.
+        """
+        return (
+            data_hora <= self.agora + CONSULTA_ANTECEDENCIA_MAXIMA and
+            cabe_consulta_na_mascara(self.mascara, data_hora) and
+            self.proxima_data_hora_agendavel is not None and
+            self.proxima_data_hora_agendavel <= data_hora and
+            not tem_consulta_conflitante(self.datas_hora_ocupadas_psicologo, data_hora)
+        )
+
+    def validar_e_reservar(self, data_hora):
+        """
+        Valida a data-hora como Consulta.full_clean faria e, se for válida, a reserva
+        no retrato. Retorna a data-hora sem segundos e microssegundos.
+
+        @raise ValidationError: com as mesmas mensagens de Consulta.full_clean.
+        """
+        erros = []
+
+        for validador in Consulta._meta.get_field("data_hora_agendada").validators:
+            try:
+                validador(data_hora)
+            except ValidationError as ve:
+                erros.extend(ve.messages)
+
+        data_hora = desprezar_segundos_e_microssegundos(data_hora)
+
+        if not self.psicologo_esta_agendavel_em(data_hora):
+            erros.append("O psicólogo não está disponível neste horário.")
+
+        if data_hora in self.datas_hora_ocupadas_paciente:
+            erros.append("O paciente já tem uma consulta agendada neste horário.")
+
+        if erros:
+            raise ValidationError(erros)
 
-        return criadas, falhas
+        insort(self.datas_hora_ocupadas_psicologo, data_hora)
+        self.datas_hora_ocupadas_paciente.add(data_hora)
+        return data_hora
 
 
 class PsicologoService:
@@ -0,0 +1,154 @@
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .models import Consulta, IntervaloDisponibilidade, Psicologo, SlotAgendavel
+
+
+def _exclusao_vem_do_psicologo(origin, psicologo_id):
+    """
+    Verifica se uma exclusão em cascata começou no próprio psicólogo (ou no seu usuário),
+    caso em que os slots dele também serão excluídos e não devem ser recriados.
+    """
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+
+    if issubclass(model, Psicologo):
+        return True
+
+    if issubclass(model, get_user_model()):
+        if isinstance(origin, QuerySet):
+            return origin.filter(psicologo__pk=psicologo_id).exists()
+        return Psicologo.objects.filter(pk=psicologo_id, usuario=origin).exists()
+
+    return False
+
+
+def _psicologo_ainda_nao_carregado(raw, psicologo_id):
+    """
+    Verifica se um save raw (loaddata) ocorre antes de o psicólogo ter sido carregado, caso
+    em que a máscara e os slots são reconstruídos quando ele for (ver
+    reconstruir_disponibilidade_do_psicologo_carregado).
+    """
+    return raw and not Psicologo.objects.filter(pk=psicologo_id).exists()
+
+
+@receiver(pre_save, sender=IntervaloDisponibilidade)
+def atualizar_minutos_semana_do_intervalo(sender, instance, **kwargs):
+    """
+    Preenche os minutos da semana do intervalo a partir das suas data-horas. É feito aqui, e
+    não em save, para valer também nos saves raw (loaddata), que não chamam save.
+    """
+    instance.atualizar_minutos_semana()
+
+
+@receiver([post_save, post_delete], sender=IntervaloDisponibilidade)
+def atualizar_mascara_disponibilidade_do_psicologo(sender, instance, origin=None, raw=False, **kwargs):
+    """
+    Reconstrói a máscara de disponibilidade do psicólogo sempre que um
+    intervalo de disponibilidade é criado, alterado ou deletado. Isso também
+    incrementa a versão da disponibilidade, invalidando a matriz em cache,
+    e reconstrói os slots agendáveis do psicólogo.
+    """
+    if origin is not None and _exclusao_vem_do_psicologo(origin, instance.psicologo_id):
+        return
+
+    if _psicologo_ainda_nao_carregado(raw, instance.psicologo_id):
+        return
+
+    if Psicologo.atualizacao_da_mascara_esta_adiada(instance.psicologo_id):
+        return
+
+    if IntervaloDisponibilidade.psicologo.is_cached(instance):
+        # Atualiza também a instância em memória que está ligada ao intervalo
+        psicologo = instance.psicologo
+    else:
+        psicologo = Psicologo(pk=instance.psicologo_id)
+
+    psicologo.atualizar_mascara_disponibilidade()
+
+
+# Campos da consulta que determinam quais slots agendáveis ela ocupa
+CAMPOS_CONSULTA_QUE_OCUPAM_SLOTS = {"estado", "data_hora_agendada"}
+
+
+@receiver(post_save, sender=Psicologo)
+def reconstruir_disponibilidade_do_psicologo_carregado(sender, instance, raw=False, **kwargs):
+    """
+    Numa carga raw (loaddata), a máscara e os slots do psicólogo não são confiáveis (podem vir
+    de antes da máscara existir) e os seus intervalos e consultas podem ter sido carregados
+    antes dele, então ambos são reconstruídos a partir do que já está no banco.
+    """
+    if raw:
+        instance.atualizar_mascara_disponibilidade()
+
+
+@receiver(pre_save, sender=Consulta)
+def guardar_data_hora_agendada_anterior(sender, instance, update_fields=None, **kwargs):
+    """
+    Guarda a data-hora agendada que está no banco antes de a consulta ser alterada,
+    para que os slots agendáveis do horário antigo possam ser restaurados, e marca se
+    o salvamento muda o estado ou a data-hora agendada, únicos casos em que os slots
+    precisam ser sincronizados.
+    """
+    instance._data_hora_agendada_anterior = None
+    instance._precisa_sincronizar_slots = False
+
+    campos = CAMPOS_CONSULTA_QUE_OCUPAM_SLOTS
+
+    if update_fields is not None:
+        campos = campos.intersection(update_fields)
+
+        if not campos:
+            # Ex.: update_fields=["anotacoes"], que não muda os slots ocupados
+            return
+
+    anteriores = None
+
+    if instance.pk:
+        anteriores = Consulta.objects.filter(pk=instance.pk).values("estado", "data_hora_agendada").first()
+
+    if anteriores is None:
+        instance._precisa_sincronizar_slots = True
+        return
+
+    if "data_hora_agendada" in campos:
+        instance._data_hora_agendada_anterior = anteriores["data_hora_agendada"]
+
+    instance._precisa_sincronizar_slots = any(
+        anteriores[campo] != getattr(instance, campo) for campo in campos
+    )
+
+
+def _sincronizar_slots_agendaveis_da_consulta(consulta):
+    psicologo = Psicologo.objects.only("id", "mascara_disponibilidade").get(pk=consulta.psicologo_id)
+    data_hora_agendada_anterior = consulta._data_hora_agendada_anterior
+
+    if data_hora_agendada_anterior and data_hora_agendada_anterior != consulta.data_hora_agendada:
+        SlotAgendavel.objects.sincronizar_em_volta_de(psicologo, data_hora_agendada_anterior)
+
+    SlotAgendavel.objects.sincronizar_em_volta_de(psicologo, consulta.data_hora_agendada)
+
+
+@receiver(post_save, sender=Consulta)
+def sincronizar_slots_agendaveis_da_consulta_salva(sender, instance, raw=False, **kwargs):
+    """
+    Remove os slots agendáveis tomados por uma consulta agendada e os restaura
+    quando a consulta é cancelada ou remarcada.
+    """
+    if _psicologo_ainda_nao_carregado(raw, instance.psicologo_id):
+        return
+
+    if getattr(instance, "_precisa_sincronizar_slots", True):
+        _sincronizar_slots_agendaveis_da_consulta(instance)
+
+
+@receiver(post_delete, sender=Consulta)
+def sincronizar_slots_agendaveis_da_consulta_deletada(sender, instance, origin=None, **kwargs):
+    """
+    Restaura os slots agendáveis tomados por uma consulta deletada.
+    """
+    if origin is not None and _exclusao_vem_do_psicologo(origin, instance.psicologo_id):
+        return
+
+    instance._data_hora_agendada_anterior = None
+    _sincronizar_slots_agendaveis_da_consulta(instance)
@@ -1,4 +1,5 @@
 from datetime import datetime, time, UTC
+from django.core.cache import cache
 from django.test import TestCase
 from terapia.constantes import CONSULTA_DURACAO
 from terapia.models import (
@@ -25,6 +26,11 @@ class ModelTestCase(TestCase, BaseTestCase):
 
     data_hora_nao_divisivel_por_duracao_consulta = converter_dia_semana_iso_com_hora_para_data_hora(1, time(0, 0), UTC) + (CONSULTA_DURACAO / 2)
     
+    def setUp(self):
+        super().setUp()
+        # Evita que valores em cache de um teste (como a matriz de disponibilidade) vazem para outro
+        cache.clear()
+
     @classmethod
     def setUpTestData(cls):
         cls.especializacoes = [
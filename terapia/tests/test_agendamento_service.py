@@ -0,0 +1,86 @@
+from datetime import UTC, datetime, timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from freezegun import freeze_time
+from terapia.constantes import CONSULTA_DURACAO
+from terapia.models import Consulta, EmailPendente, Notificacao, SlotAgendavel, TipoNotificacao
+from terapia.service import AgendamentoService
+from .model_test_case import ModelTestCase
+
+
+class AgendamentoServiceTest(ModelTestCase):
+    agora = datetime(2025, 3, 3, 9, 30, tzinfo=UTC)
+
+    def test_criar_consulta_cria_uma_unica_notificacao(self):
+        numero_de_emails = EmailPendente.objects.count()
+
+        with freeze_time(self.agora):
+            consulta = AgendamentoService.criar_consulta(
+                self.paciente_dummy,
+                self.psicologo_sempre_disponivel,
+                datetime(2025, 3, 4, 10, 0, tzinfo=UTC),
+            )
+
+        self.assertEqual(consulta.notificacoes.filter(tipo=TipoNotificacao.CONSULTA_SOLICITADA).count(), 1)
+        self.assertEqual(EmailPendente.objects.count(), numero_de_emails + 1)
+
+    def test_criar_consultas_em_lote(self):
+        psicologo = self.psicologo_sempre_disponivel
+        primeira_data_hora = datetime(2025, 3, 4, 10, 0, tzinfo=UTC)
+        datas_hora = [primeira_data_hora + timedelta(days=dia) for dia in range(10)]
+        numero_de_emails = EmailPendente.objects.count()
+
+        with freeze_time(self.agora):
+            SlotAgendavel.objects.sincronizar(psicologo)
+
+            with CaptureQueriesContext(connection) as queries:
+                criadas, falhas = AgendamentoService.criar_consultas_em_lote(self.paciente_dummy, psicologo, datas_hora)
+
+            self.assertEqual((criadas, falhas), (10, []))
+            self.assertLessEqual(len(queries), 17)
+            self.assertFalse(psicologo.slots_agendaveis.filter(data_hora__in=datas_hora).exists())
+
+        consultas = Consulta.objects.filter(psicologo=psicologo, data_hora_agendada__in=datas_hora)
+        self.assertEqual(consultas.count(), 10)
+        self.assertEqual(
+            Notificacao.objects.filter(consulta__in=consultas, tipo=TipoNotificacao.CONSULTA_SOLICITADA).count(),
+            10,
+        )
+        self.assertEqual(EmailPendente.objects.count(), numero_de_emails + 10)
+
+    def test_criar_consultas_em_lote_com_falhas(self):
+        psicologo = self.psicologo_sempre_disponivel
+        data_hora = datetime(2025, 3, 4, 10, 0, tzinfo=UTC)
+
+        with freeze_time(self.agora):
+            Consulta.objects.create(
+                paciente=self.pacientes_dummies[1],
+                psicologo=psicologo,
+                data_hora_agendada=data_hora + timedelta(days=1),
+            )
+
+            slots = [
+                data_hora,
+                "não é uma data",
+                data_hora,
+                data_hora + CONSULTA_DURACAO / 2,
+                data_hora + timedelta(days=1),
+                self.agora - timedelta(days=1),
+                data_hora + CONSULTA_DURACAO,
+            ]
+            criadas, falhas = AgendamentoService.criar_consultas_em_lote(self.paciente_dummy, psicologo, slots)
+
+        self.assertEqual(criadas, 2)
+        self.assertEqual([slot for slot, _ in falhas], slots[1:6])
+
+        for slot, mensagem in falhas[1:]:
+            with self.subTest(slot=slot):
+                self.assertIn("O psicólogo não está disponível neste horário.", mensagem)
+
+        self.assertIn("O paciente já tem uma consulta agendada neste horário.", falhas[1][1])
+        self.assertIn("múltiplo", falhas[2][1])
+        self.assertIn("antecedência", falhas[4][1])
+        self.assertEqual(
+            set(Consulta.objects.filter(paciente=self.paciente_dummy).values_list("data_hora_agendada", flat=True)),
+            {data_hora, data_hora + CONSULTA_DURACAO} | {consulta.data_hora_agendada for consulta in self.consultas},
+        )
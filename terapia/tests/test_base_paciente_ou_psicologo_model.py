@@ -1,6 +1,7 @@
 from terapia.constantes import CONSULTA_DURACAO
+from terapia.models import Consulta, ESTADOS_CONSULTA_QUE_OCUPAM_HORARIO, EstadoConsulta
 from .model_test_case import ModelTestCase
-from datetime import timedelta
+from datetime import UTC, datetime, timedelta
 
 
 class BasePacienteOuPsicologoModelTest(ModelTestCase):
@@ -15,3 +16,25 @@ class BasePacienteOuPsicologoModelTest(ModelTestCase):
             self.assertTrue(envolvido.ja_tem_consulta_em(consultas[1].data_hora_agendada))
             self.assertTrue(envolvido.ja_tem_consulta_em(consultas[1].data_hora_agendada + CONSULTA_DURACAO - timedelta(minutes=1)))
             self.assertFalse(envolvido.ja_tem_consulta_em(consultas[1].data_hora_agendada + CONSULTA_DURACAO))
+
+    def test_ja_tem_consulta_em_e_get_datas_hora_ocupadas_entre_usam_os_mesmos_estados(self):
+        envolvidos = [self.paciente_dummy, self.psicologo_sempre_disponivel]
+        data_hora = datetime(2024, 6, 5, 10, 0, tzinfo=UTC)
+        consulta = Consulta.objects.create(
+            paciente=self.paciente_dummy, psicologo=self.psicologo_sempre_disponivel, data_hora_agendada=data_hora,
+        )
+
+        for estado in EstadoConsulta:
+            Consulta.objects.filter(pk=consulta.pk).update(estado=estado)
+
+            for envolvido in envolvidos:
+                with self.subTest(estado=estado, envolvido=envolvido):
+                    ocupa_horario = estado in ESTADOS_CONSULTA_QUE_OCUPAM_HORARIO
+                    self.assertEqual(envolvido.ja_tem_consulta_em(data_hora), ocupa_horario)
+                    self.assertEqual(
+                        data_hora in envolvido.get_datas_hora_ocupadas_entre(data_hora, data_hora),
+                        ocupa_horario,
+                    )
+
+        self.assertNotIn(EstadoConsulta.CANCELADA, ESTADOS_CONSULTA_QUE_OCUPAM_HORARIO)
+        self.assertIn(EstadoConsulta.FINALIZADA, ESTADOS_CONSULTA_QUE_OCUPAM_HORARIO)
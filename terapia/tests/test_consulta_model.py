@@ -1,9 +1,14 @@
 from datetime import datetime, UTC, timedelta
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from freezegun import freeze_time
-from terapia.constantes import CONSULTA_ANTECEDENCIA_MAXIMA, CONSULTA_ANTECEDENCIA_MINIMA
-from terapia.models import Consulta, EstadoConsulta
+from io import StringIO
+from terapia.constantes import CONSULTA_ANTECEDENCIA_MAXIMA, CONSULTA_ANTECEDENCIA_MINIMA, CONSULTA_DURACAO
+from terapia.management.commands.agendador_consultas import Command as AgendadorConsultas
+from terapia.models import Consulta, EmailPendente, EstadoConsulta, Notificacao, TipoNotificacao
 from .model_test_case import ModelTestCase
 
 
@@ -48,6 +53,7 @@ class ConsultaModelTest(ModelTestCase):
         checklist_tarefas = [{"texto": "Fazer exercícios", "feita": False, "comentario": ""}]
         duracao = timedelta(minutes=45)
         estado = EstadoConsulta.EM_ANDAMENTO
+        data_hora_agendada += CONSULTA_DURACAO
 
         with freeze_time(self.agora_fake):
             consulta = Consulta.objects.create(
@@ -129,6 +135,34 @@ class ConsultaModelTest(ModelTestCase):
 
             self.assertEqual("paciente_nao_disponivel", ctx.exception.error_dict["data_hora_agendada"][0].code)
 
+    def test_banco_impede_agendamento_duplo(self):
+        data_hora_agendada = datetime(2023, 1, 1, 10, 0, tzinfo=UTC)
+        consulta = Consulta.objects.create(
+            paciente=self.paciente_dummy,
+            psicologo=self.psicologo_sempre_disponivel,
+            data_hora_agendada=data_hora_agendada,
+        )
+
+        for paciente, psicologo, code in (
+            (self.pacientes_dummies[1], self.psicologo_sempre_disponivel, "psicologo_nao_disponivel"),
+            (self.paciente_dummy, self.psicologos_dummies[0], "paciente_nao_disponivel"),
+        ):
+            with self.subTest(code=code), self.assertRaises(ValidationError) as ctx:
+                # Sem clean(), como aconteceria numa corrida entre duas requisições
+                Consulta.objects.create(paciente=paciente, psicologo=psicologo, data_hora_agendada=data_hora_agendada)
+
+            self.assertEqual(code, ctx.exception.error_dict["data_hora_agendada"][0].code)
+
+        consulta.estado = EstadoConsulta.CANCELADA
+        consulta.save(update_fields=["estado"])
+
+        nova_consulta = Consulta.objects.create(
+            paciente=self.paciente_dummy,
+            psicologo=self.psicologo_sempre_disponivel,
+            data_hora_agendada=data_hora_agendada,
+        )
+        self.assertEqual(nova_consulta.slot, consulta.slot)
+
     def test_antecedencia_minima(self):
         with freeze_time(self.agora_fake):
             with self.assertRaises(ValidationError) as ctx:
@@ -162,3 +196,165 @@ class ConsultaModelTest(ModelTestCase):
 
             self.assertEqual("data_hora_nao_divisivel_por_duracao_consulta",
                              ctx.exception.error_dict["data_hora_agendada"][0].code)
+
+    def criar_consultas_para_transicoes(self, agora):
+        """
+        Cria consultas em vários estados e horários em volta de agora e retorna pares
+        (consulta, estado esperado depois das transições automáticas).
+        """
+        psicologo = self.psicologo_sempre_disponivel
+        outro_psicologo = self.psicologos_dummies[0]
+        cenarios = [
+            (psicologo, agora - timedelta(hours=2, minutes=30), EstadoConsulta.SOLICITADA, EstadoConsulta.CANCELADA),
+            (psicologo, agora - timedelta(minutes=30), EstadoConsulta.CONFIRMADA, EstadoConsulta.EM_ANDAMENTO),
+            (psicologo, agora - timedelta(hours=1, minutes=30), EstadoConsulta.CONFIRMADA, EstadoConsulta.FINALIZADA),
+            (psicologo, agora - timedelta(hours=3, minutes=30), EstadoConsulta.EM_ANDAMENTO, EstadoConsulta.FINALIZADA),
+            (psicologo, agora + timedelta(minutes=30), EstadoConsulta.SOLICITADA, EstadoConsulta.SOLICITADA),
+            (psicologo, agora + timedelta(hours=1, minutes=30), EstadoConsulta.CONFIRMADA, EstadoConsulta.CONFIRMADA),
+            (outro_psicologo, agora - timedelta(minutes=30), EstadoConsulta.SOLICITADA, EstadoConsulta.CANCELADA),
+            (outro_psicologo, agora - timedelta(hours=4, minutes=30), EstadoConsulta.CANCELADA, EstadoConsulta.CANCELADA),
+        ]
+        consultas = Consulta.objects.bulk_create([
+            Consulta(
+                paciente=self.pacientes_dummies[psicologo_da_consulta == outro_psicologo],
+                psicologo=psicologo_da_consulta,
+                data_hora_agendada=data_hora,
+                estado=estado,
+            )
+            for psicologo_da_consulta, data_hora, estado, _ in cenarios
+        ])
+
+        return list(zip(consultas, [estado_esperado for *_, estado_esperado in cenarios]))
+
+    def test_com_estado_efetivo(self):
+        agora = datetime(2025, 3, 3, 12, 30, tzinfo=UTC)
+        consultas_e_estados_esperados = self.criar_consultas_para_transicoes(agora)
+        estados_efetivos = dict(
+            Consulta.objects.com_estado_efetivo(agora).filter(
+                pk__in=[consulta.pk for consulta, _ in consultas_e_estados_esperados],
+            ).values_list("pk", "estado_efetivo")
+        )
+
+        for consulta, estado_esperado in consultas_e_estados_esperados:
+            with self.subTest(data_hora=consulta.data_hora_agendada, estado=consulta.estado):
+                self.assertEqual(estados_efetivos[consulta.pk], estado_esperado)
+                # A anotação não altera o estado persistido
+                self.assertEqual(Consulta.objects.get(pk=consulta.pk).estado, consulta.estado)
+
+                # E coincide com as regras da atualização automática consulta a consulta
+                with freeze_time(agora):
+                    consulta.atualizar_estado_automatico(agora=agora)
+                self.assertEqual(consulta.estado, estado_esperado)
+
+    def test_atualizar_estados_automaticamente(self):
+        agora = datetime(2025, 3, 3, 12, 30, tzinfo=UTC)
+        consultas_e_estados_esperados = self.criar_consultas_para_transicoes(agora)
+        consultas = [consulta for consulta, _ in consultas_e_estados_esperados]
+        numero_de_emails = EmailPendente.objects.count()
+        queryset = Consulta.objects.filter(pk__in=[consulta.pk for consulta in consultas])
+
+        self.assertEqual(Consulta.atualizar_estados_automaticamente(queryset, agora=agora), 5)
+
+        for consulta, estado_esperado in consultas_e_estados_esperados:
+            with self.subTest(data_hora=consulta.data_hora_agendada):
+                consulta.refresh_from_db()
+                self.assertEqual(consulta.estado, estado_esperado)
+
+        notificacoes = Notificacao.objects.filter(consulta__in=consultas)
+        self.assertEqual(notificacoes.filter(tipo=TipoNotificacao.CONSULTA_EXPIRADA).count(), 4)
+        self.assertEqual(notificacoes.filter(tipo=TipoNotificacao.CONSULTA_EM_ANDAMENTO).count(), 2)
+        self.assertEqual(EmailPendente.objects.count(), numero_de_emails + 6)
+
+        # Sem consultas a transicionar, é só um SELECT por regra, independente do histórico
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(Consulta.atualizar_estados_automaticamente(queryset, agora=agora), 0)
+
+        self.assertEqual(len([query for query in queries if "SAVEPOINT" not in query["sql"]]), 3)
+
+    def test_agendador_consultas(self):
+        agora = datetime(2025, 3, 3, 12, 30, tzinfo=UTC)
+        atrasada, futura = Consulta.objects.bulk_create([
+            Consulta(
+                paciente=self.pacientes_dummies[1],
+                psicologo=self.psicologo_sempre_disponivel,
+                data_hora_agendada=agora - timedelta(minutes=30),
+                estado=EstadoConsulta.SOLICITADA,
+            ),
+            Consulta(
+                paciente=self.pacientes_dummies[1],
+                psicologo=self.psicologo_sempre_disponivel,
+                data_hora_agendada=agora + timedelta(minutes=30),
+                estado=EstadoConsulta.CONFIRMADA,
+            ),
+        ])
+        agendador = AgendadorConsultas()
+
+        with freeze_time(agora):
+            call_command(agendador, "--uma-vez", stdout=StringIO())
+            self.assertEqual(agendador.get_segundos_ate_a_proxima_transicao(agora, intervalo=3600), 30 * 60)
+
+        atrasada.refresh_from_db()
+        self.assertEqual(atrasada.estado, EstadoConsulta.CANCELADA)
+
+        # Uma consulta remarcada depois da última verificação é vista na seguinte
+        Consulta.objects.filter(pk=futura.pk).update(data_hora_agendada=agora + timedelta(minutes=10))
+        futura.refresh_from_db()
+
+        with freeze_time(agora):
+            self.assertEqual(agendador.get_segundos_ate_a_proxima_transicao(agora, intervalo=3600), 10 * 60)
+
+        for instante, estado_esperado in (
+            (futura.data_hora_agendada, EstadoConsulta.EM_ANDAMENTO),
+            (futura.data_hora_agendada + CONSULTA_DURACAO, EstadoConsulta.FINALIZADA),
+        ):
+            with freeze_time(instante):
+                call_command(agendador, "--uma-vez", stdout=StringIO())
+
+            futura.refresh_from_db()
+            self.assertEqual(futura.estado, estado_esperado)
+
+    def test_agendador_consultas_aplica_transicoes_nao_enfileiradas(self):
+        agora = datetime(2025, 3, 3, 12, 30, tzinfo=UTC)
+        agendador = AgendadorConsultas()
+
+        with freeze_time(agora):
+            call_command(agendador, "--uma-vez", stdout=StringIO())
+
+        # Confirmada com atraso, já vencida e com id qualquer: não depende de nenhuma fila em memória
+        consulta = Consulta.objects.bulk_create([Consulta(
+            paciente=self.pacientes_dummies[1],
+            psicologo=self.psicologo_sempre_disponivel,
+            data_hora_agendada=agora - timedelta(minutes=10),
+            estado=EstadoConsulta.CONFIRMADA,
+        )])[0]
+
+        with freeze_time(agora + timedelta(seconds=1)):
+            call_command(agendador, "--uma-vez", stdout=StringIO())
+
+        consulta.refresh_from_db()
+        self.assertEqual(consulta.estado, EstadoConsulta.EM_ANDAMENTO)
+
+    def test_proximo_evento_em(self):
+        data_hora_agendada = datetime(2025, 3, 3, 12, 0, tzinfo=UTC)
+        consulta = Consulta.objects.create(
+            paciente=self.paciente_dummy,
+            psicologo=self.psicologo_sempre_disponivel,
+            data_hora_agendada=data_hora_agendada,
+        )
+        queryset = Consulta.objects.filter(pk=consulta.pk)
+        self.assertEqual(consulta.proximo_evento_em, data_hora_agendada)
+
+        consulta.estado = EstadoConsulta.EM_ANDAMENTO
+        consulta.save(update_fields=["estado"])
+        self.assertEqual(queryset.get().proximo_evento_em, data_hora_agendada + CONSULTA_DURACAO)
+
+        queryset.update(data_hora_agendada=data_hora_agendada + CONSULTA_DURACAO)
+        self.assertEqual(queryset.get().proximo_evento_em, data_hora_agendada + 2 * CONSULTA_DURACAO)
+
+        queryset.update(estado=EstadoConsulta.CONFIRMADA)
+        self.assertEqual(queryset.get().proximo_evento_em, data_hora_agendada + CONSULTA_DURACAO)
+
+        Consulta.atualizar_estados_automaticamente(queryset, agora=data_hora_agendada + 3 * CONSULTA_DURACAO)
+        consulta = queryset.get()
+        self.assertEqual(consulta.estado, EstadoConsulta.FINALIZADA)
+        self.assertIsNone(consulta.proximo_evento_em)
@@ -0,0 +1,132 @@
+from datetime import UTC, datetime, timedelta
+from smtplib import SMTPException
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.test import override_settings
+from freezegun import freeze_time
+from io import StringIO
+from terapia.constantes import EMAILS_PENDENTES_ESPERA_BASE, EMAILS_PENDENTES_MAXIMO_TENTATIVAS
+from terapia.models import EmailPendente, Notificacao, TipoNotificacao
+from .model_test_case import ModelTestCase
+
+
+class EmailBackendQueFalha(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        for _ in email_messages:
+            raise SMTPException("Servidor indisponível")
+        return 0
+
+
+class EmailBackendQueRecusaDestinatarios(BaseEmailBackend):
+    """
+    Envia as mensagens em ordem, como o backend SMTP, levando um minuto em cada uma e
+    recusando as endereçadas a um dos destinatários de "recusados".
+    """
+    recusados = set()
+    chamadas = []
+    relogio = None
+
+    def send_messages(self, email_messages):
+        self.chamadas.append([])
+        for mensagem in email_messages:
+            self.relogio.tick(timedelta(minutes=1))
+            if set(mensagem.to) & self.recusados:
+                raise SMTPException("Destinatário recusado")
+            self.chamadas[-1].append(mensagem)
+            mail.outbox.append(mensagem)
+        return len(self.chamadas[-1])
+
+
+class EmailPendenteModelTest(ModelTestCase):
+    agora = datetime(2025, 3, 3, 9, 30, tzinfo=UTC)
+
+    def setUp(self):
+        super().setUp()
+        # Descarta os e-mails enfileirados na criação dos dados de teste
+        EmailPendente.objects.all().delete()
+
+    def criar_notificacao(self):
+        return Notificacao.objects.create(
+            tipo=TipoNotificacao.CONSULTA_CONFIRMADA,
+            remetente=self.psicologo_sempre_disponivel.usuario,
+            destinatario=self.paciente_dummy.usuario,
+            consulta=self.consultas[0],
+        )
+
+    def test_notificacao_enfileira_email_sem_enviar(self):
+        notificacao = self.criar_notificacao()
+
+        self.assertEqual(len(mail.outbox), 0)
+        email = EmailPendente.objects.get()
+        self.assertEqual(email.assunto, notificacao.get_tipo_display())
+        self.assertEqual(email.mensagem, notificacao.mensagem)
+        self.assertEqual(email.destinatario, self.paciente_dummy.usuario.email)
+
+    def test_enviar_emails(self):
+        for _ in range(3):
+            self.criar_notificacao()
+
+        call_command("enviar_emails", "--uma-vez", "--lote", "2", stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].to, [self.paciente_dummy.usuario.email])
+        self.assertFalse(EmailPendente.objects.a_enviar().exists())
+
+        call_command("enviar_emails", "--uma-vez", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 3)
+
+    @override_settings(EMAIL_BACKEND="terapia.tests.test_email_pendente_model.EmailBackendQueFalha")
+    def test_enviar_emails_com_falhas(self):
+        with freeze_time(self.agora):
+            self.criar_notificacao()
+
+        agora = self.agora
+
+        for tentativa in range(1, EMAILS_PENDENTES_MAXIMO_TENTATIVAS + 1):
+            with self.subTest(tentativa=tentativa):
+                with freeze_time(agora):
+                    self.assertEqual(EmailPendente.objects.enviar(), (0, 1))
+
+                email = EmailPendente.objects.get()
+                self.assertEqual(email.tentativas, tentativa)
+                self.assertEqual(email.ultimo_erro, "Servidor indisponível")
+                self.assertEqual(email.enviar_a_partir_de, agora + EMAILS_PENDENTES_ESPERA_BASE * 2 ** (tentativa - 1))
+                # Antes de terminar a espera, o e-mail não é tentado de novo
+                self.assertEqual(EmailPendente.objects.enviar(agora=email.enviar_a_partir_de - EMAILS_PENDENTES_ESPERA_BASE / 2), (0, 0))
+
+                agora = email.enviar_a_partir_de
+
+        self.assertEqual(EmailPendente.objects.enviar(agora=agora), (0, 0))
+        self.assertIsNone(EmailPendente.objects.get().enviado_em)
+
+    @override_settings(EMAIL_BACKEND="terapia.tests.test_email_pendente_model.EmailBackendQueRecusaDestinatarios")
+    def test_enviar_emails_num_lote_com_espera_a_partir_da_falha(self):
+        destinatarios = ["a@example.com", "recusado@example.com", "b@example.com", "c@example.com"]
+        for destinatario in destinatarios:
+            EmailPendente.objects.create(
+                assunto="Assunto", mensagem="Mensagem", destinatario=destinatario, enviar_a_partir_de=self.agora,
+            )
+
+        EmailBackendQueRecusaDestinatarios.recusados = {"recusado@example.com"}
+        EmailBackendQueRecusaDestinatarios.chamadas = []
+
+        with freeze_time(self.agora) as relogio:
+            EmailBackendQueRecusaDestinatarios.relogio = relogio
+            self.assertEqual(EmailPendente.objects.enviar(agora=self.agora), (3, 1))
+
+        # Uma chamada para o lote, interrompida na falha, e outra pela mesma conexão para o restante
+        self.assertEqual([[m.to[0] for m in chamada] for chamada in EmailBackendQueRecusaDestinatarios.chamadas], [
+            ["a@example.com"],
+            ["b@example.com", "c@example.com"],
+        ])
+        self.assertEqual(
+            set(EmailPendente.objects.filter(enviado_em__isnull=False).values_list("destinatario", flat=True)),
+            {"a@example.com", "b@example.com", "c@example.com"},
+        )
+
+        # A espera conta a partir da falha, no segundo minuto do lote, e não do início dele
+        email = EmailPendente.objects.get(destinatario="recusado@example.com")
+        self.assertEqual(email.tentativas, 1)
+        self.assertEqual(email.ultimo_erro, "Destinatário recusado")
+        self.assertEqual(email.enviar_a_partir_de, self.agora + timedelta(minutes=2) + EMAILS_PENDENTES_ESPERA_BASE)
@@ -1,4 +1,5 @@
 from datetime import datetime, UTC
+from unittest import mock
 from django.test import TestCase
 from terapia.forms import (
     PsicologoDisponibilidadeChangeForm,
@@ -6,7 +7,7 @@ from terapia.forms import (
     PsicologoFiltrosForm,
     ConsultaFiltrosForm,
 )
-from terapia.models import IntervaloDisponibilidade, Consulta
+from terapia.models import IntervaloDisponibilidade, Consulta, SlotAgendavel
 from .model_test_case import ModelTestCase
 
 class FormsTestCase(ModelTestCase):
@@ -42,6 +43,28 @@ class FormsTestCase(ModelTestCase):
         self.assertEqual(intervalo.hora_inicio_local.hour, 8)
         self.assertEqual(intervalo.hora_fim_local.hour, 12)
 
+    def test_psicologo_disponibilidade_change_form_reconstroi_uma_vez(self):
+        """Testa se substituir vários intervalos reconstrói a máscara e os slots uma vez só."""
+        psicologo = self.psicologo_dummy
+        self.assertGreater(psicologo.disponibilidade.count(), 1)
+        versao = psicologo.versao_disponibilidade
+
+        disponibilidade_json = [[False] * 48 for _ in range(7)]
+        for dia in range(7):
+            for i in range(8, 12, 2):
+                disponibilidade_json[dia][i] = True
+
+        form = PsicologoDisponibilidadeChangeForm(data={"disponibilidade": disponibilidade_json}, instance=psicologo)
+        self.assertTrue(form.is_valid())
+
+        with mock.patch.object(SlotAgendavel.objects, "sincronizar", wraps=SlotAgendavel.objects.sincronizar) as sincronizar:
+            form.save()
+
+        psicologo.refresh_from_db()
+        self.assertEqual(psicologo.versao_disponibilidade, versao + 1)
+        self.assertEqual(sincronizar.call_count, 1)
+        self.assertEqual(psicologo.disponibilidade.count(), 14)
+
     def test_consulta_creation_form_valid(self):
         """Testa se o formulário de criação de consulta associa corretamente paciente e psicólogo."""
         data_hora = self.psicologo_completo.proxima_data_hora_agendavel
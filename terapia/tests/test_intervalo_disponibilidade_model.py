@@ -1,5 +1,9 @@
+import json
+from django.apps import apps
+from django.core import serializers
 from django.forms import ValidationError
-from terapia.models import IntervaloDisponibilidade
+from importlib import import_module
+from terapia.models import IntervaloDisponibilidade, Psicologo
 from terapia.utilidades.geral import converter_dia_semana_iso_com_hora_para_data_hora
 from datetime import UTC, datetime, time, timedelta
 from terapia.constantes import CONSULTA_DURACAO
@@ -30,6 +34,105 @@ class IntervaloDisponibilidadeModelTest(ModelTestCase):
         self.assertEqual(intervalo.data_hora_fim, data_hora_fim)
         self.assertEqual(intervalo.psicologo, self.psicologo_dummy)
 
+    def test_minutos_semana(self):
+        for intervalo, esperado in (
+            ((3, time(12, 0), 4, time(12, 30)), (2 * 1440 + 12 * 60, 3 * 1440 + 12 * 60 + 30)),
+            # Domingo -> segunda: o fim fica antes do início
+            ((7, time(22, 0), 1, time(2, 0)), (6 * 1440 + 22 * 60, 2 * 60)),
+            ((1, time(0, 0), 1, time(0, 0)), (0, 0)),
+        ):
+            with self.subTest(intervalo=intervalo):
+                intervalo = IntervaloDisponibilidade.objects.criar_por_dia_semana_e_hora(
+                    *intervalo[:2], *intervalo[2:], UTC, self.psicologo_incompleto,
+                )
+                self.assertEqual((intervalo.inicio_minuto_semana, intervalo.fim_minuto_semana), esperado)
+                intervalo.delete()
+
+    def test_migracao_preenche_minutos_semana(self):
+        migracao = import_module("terapia.migrations.0007_intervalodisponibilidade_minutos_semana")
+        esperado = dict(
+            (pk, (inicio, fim)) for pk, inicio, fim in
+            IntervaloDisponibilidade.objects.values_list("pk", "inicio_minuto_semana", "fim_minuto_semana")
+        )
+        self.assertTrue(any(inicio or fim for inicio, fim in esperado.values()))
+        IntervaloDisponibilidade.objects.update(inicio_minuto_semana=0, fim_minuto_semana=0)
+
+        migracao.preencher_minutos_semana(apps, None)
+
+        self.assertEqual(
+            dict(
+                (pk, (inicio, fim)) for pk, inicio, fim in
+                IntervaloDisponibilidade.objects.values_list("pk", "inicio_minuto_semana", "fim_minuto_semana")
+            ),
+            esperado,
+        )
+
+    def test_carga_raw_preenche_minutos_semana_e_mascara(self):
+        psicologo = self.psicologo_completo
+        mascara = bytes(psicologo.mascara_disponibilidade)
+        esperado = dict(
+            (pk, (inicio, fim)) for pk, inicio, fim in
+            psicologo.disponibilidade.values_list("pk", "inicio_minuto_semana", "fim_minuto_semana")
+        )
+        # Como nas fixtures antigas, sem os minutos da semana
+        dados = [
+            {**objeto, "fields": {
+                campo: valor for campo, valor in objeto["fields"].items() if not campo.endswith("_minuto_semana")
+            }}
+            for objeto in json.loads(serializers.serialize("json", psicologo.disponibilidade.all()))
+        ]
+        IntervaloDisponibilidade.objects.filter(psicologo=psicologo).delete()
+
+        for objeto in serializers.deserialize("json", json.dumps(dados)):
+            objeto.save()
+
+        psicologo.refresh_from_db()
+        self.assertEqual(
+            dict(
+                (pk, (inicio, fim)) for pk, inicio, fim in
+                psicologo.disponibilidade.values_list("pk", "inicio_minuto_semana", "fim_minuto_semana")
+            ),
+            esperado,
+        )
+        self.assertEqual(bytes(psicologo.mascara_disponibilidade), mascara)
+
+        # O psicólogo carregado depois dos intervalos, sem a máscara, tem a máscara reconstruída
+        dados = json.loads(serializers.serialize("json", [psicologo]))
+        del dados[0]["fields"]["mascara_disponibilidade"]
+        Psicologo.objects.filter(pk=psicologo.pk).update(mascara_disponibilidade=b"")
+
+        for objeto in serializers.deserialize("json", json.dumps(dados)):
+            objeto.save()
+
+        psicologo.refresh_from_db()
+        self.assertEqual(bytes(psicologo.mascara_disponibilidade), mascara)
+
+    def test_get_intervalos_sobrepostos_virando_a_semana(self):
+        psicologo = self.psicologo_incompleto
+        # Domingo 22:00 até segunda 02:00 (UTC)
+        IntervaloDisponibilidade.objects.criar_por_dia_semana_e_hora(7, time(22, 0), 1, time(2, 0), UTC, psicologo)
+
+        for intervalo, sobrepoe in (
+            ((1, time(1, 0), 1, time(3, 0)), True),
+            ((7, time(20, 0), 7, time(22, 0)), True),
+            ((1, time(2, 0), 1, time(4, 0)), True),
+            ((7, time(23, 0), 1, time(1, 0)), True),
+            ((6, time(23, 0), 1, time(5, 0)), True),
+            ((1, time(3, 0), 1, time(5, 0)), False),
+            ((7, time(18, 0), 7, time(21, 0)), False),
+            ((3, time(22, 0), 4, time(2, 0)), False),
+        ):
+            with self.subTest(intervalo=intervalo):
+                intervalo = IntervaloDisponibilidade.objects.inicializar_por_dia_semana_e_hora(
+                    *intervalo, UTC, psicologo,
+                )
+                # Valores desatualizados, que o método não deve usar nem corrigir
+                intervalo.inicio_minuto_semana, intervalo.fim_minuto_semana = 1, 1
+                sobrepostos = psicologo.get_intervalos_sobrepostos(intervalo)
+
+                self.assertEqual(sobrepostos is not None and sobrepostos.exists(), sobrepoe)
+                self.assertEqual((intervalo.inicio_minuto_semana, intervalo.fim_minuto_semana), (1, 1))
+
     def test_impede_sobreposicao_com_outro_intervalo_do_psicologo(self):
         with self.assertRaises(ValidationError) as ctx:
             IntervaloDisponibilidade.objects.inicializar_por_dia_semana_e_hora(
@@ -0,0 +1,165 @@
+from datetime import timedelta
+from django.apps import apps
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from importlib import import_module
+from io import StringIO
+from terapia.constantes import NOTIFICACOES_RETENCAO
+from terapia.models import Notificacao, NotificacaoArquivada, TipoNotificacao
+from usuario.models import Usuario
+from .model_test_case import ModelTestCase
+
+
+class NotificacaoModelTest(ModelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.paciente = self.paciente_dummy.usuario
+        self.psicologo = self.psicologo_sempre_disponivel.usuario
+
+    def get_notificacao(self, destinatario, **kwargs):
+        return Notificacao(
+            tipo=TipoNotificacao.CONSULTA_CONFIRMADA,
+            remetente=self.psicologo,
+            destinatario=destinatario,
+            consulta=self.consultas[0],
+            **kwargs,
+        )
+
+    def get_contador(self, usuario):
+        return Usuario.objects.values_list("notificacoes_nao_lidas", flat=True).get(pk=usuario.pk)
+
+    def get_nao_lidas(self, usuario):
+        return usuario.notificacoes_como_destinatario.filter(lida=False).count()
+
+    def test_contador_acompanha_criacao(self):
+        contador = self.get_contador(self.paciente)
+        self.assertEqual(contador, self.get_nao_lidas(self.paciente))
+
+        self.get_notificacao(self.paciente).save()
+        self.get_notificacao(self.paciente, lida=True).save()
+        self.assertEqual(self.get_contador(self.paciente), contador + 1)
+
+        contador_psicologo = self.get_contador(self.psicologo)
+        Notificacao.criar_em_lote([
+            self.get_notificacao(self.paciente),
+            self.get_notificacao(self.paciente),
+            self.get_notificacao(self.psicologo),
+            self.get_notificacao(self.psicologo, lida=True),
+        ])
+
+        self.assertEqual(self.get_contador(self.paciente), contador + 3)
+        self.assertEqual(self.get_contador(self.psicologo), contador_psicologo + 1)
+
+        for usuario in (self.paciente, self.psicologo):
+            with self.subTest(usuario=usuario.email):
+                self.assertEqual(self.get_contador(usuario), self.get_nao_lidas(usuario))
+
+    def test_marcar_como_lidas_zera_contador(self):
+        self.get_notificacao(self.paciente).save()
+        self.client.force_login(self.paciente)
+
+        response = self.client.post(reverse("marcar_notificacoes_como_lidas"))
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.get_contador(self.paciente), 0)
+        self.assertEqual(self.get_nao_lidas(self.paciente), 0)
+
+    def test_reconciliar_contadores(self):
+        self.get_notificacao(self.paciente).save()
+        self.get_notificacao(self.psicologo).save()
+        Usuario.objects.filter(pk=self.paciente.pk).update(notificacoes_nao_lidas=42)
+        Usuario.objects.filter(pk=self.psicologo.pk).update(notificacoes_nao_lidas=0)
+
+        saida = StringIO()
+        call_command("reconciliar_notificacoes_nao_lidas", stdout=saida)
+
+        self.assertIn("2 user(s) fixed", saida.getvalue())
+        for usuario in Usuario.objects.all():
+            with self.subTest(usuario=usuario.email):
+                self.assertEqual(usuario.notificacoes_nao_lidas, self.get_nao_lidas(usuario))
+
+    def test_mensagem_renderizada_na_criacao(self):
+        notificacao = self.get_notificacao(self.paciente)
+        notificacao.save()
+        Notificacao.criar_em_lote([self.get_notificacao(self.psicologo)])
+
+        for notificacao in Notificacao.objects.filter(pk__in=[notificacao.pk, notificacao.pk + 1]):
+            with self.subTest(notificacao=notificacao.pk):
+                self.assertEqual(notificacao.assunto, "Consulta Confirmada")
+                self.assertIn(self.psicologo_sempre_disponivel.nome_completo, notificacao.mensagem)
+
+        with CaptureQueriesContext(connection) as queries:
+            mensagens = [notificacao.mensagem for notificacao in self.paciente.notificacoes_como_destinatario.para_caixa_de_entrada()]
+
+        self.assertTrue(all(mensagens))
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("JOIN", queries[0]["sql"])
+
+    def test_migracao_preenche_assunto_e_mensagem(self):
+        migracao = import_module("terapia.migrations.0015_notificacao_assunto_notificacao_mensagem")
+        esperadas = {notificacao.pk: (notificacao.assunto, notificacao.mensagem) for notificacao in Notificacao.objects.all()}
+        self.assertTrue(esperadas)
+        Notificacao.objects.update(assunto="", mensagem="")
+
+        migracao.preencher_assunto_e_mensagem(apps, None)
+
+        self.assertEqual(
+            {notificacao.pk: (notificacao.assunto, notificacao.mensagem) for notificacao in Notificacao.objects.all()},
+            esperadas,
+        )
+
+    def criar_notificacoes_antigas(self):
+        antiga = timezone.now() - NOTIFICACOES_RETENCAO - timedelta(days=1)
+        notificacoes = Notificacao.criar_em_lote([
+            self.get_notificacao(self.paciente, lida=True),
+            self.get_notificacao(self.paciente, lida=True),
+            self.get_notificacao(self.paciente, lida=True),
+            self.get_notificacao(self.paciente),
+        ])
+        Notificacao.objects.filter(pk__in=[notificacao.pk for notificacao in notificacoes]).update(data_hora_criada=antiga)
+        return [notificacao.pk for notificacao in notificacoes]
+
+    def test_aplicar_retencao(self):
+        *lidas_antigas, nao_lida_antiga = self.criar_notificacoes_antigas()
+        self.get_notificacao(self.paciente, lida=True).save()
+        esperadas = {
+            notificacao.pk: (notificacao.assunto, notificacao.mensagem, notificacao.data_hora_criada)
+            for notificacao in Notificacao.objects.a_arquivar()
+        }
+        total = Notificacao.objects.count()
+
+        agora = timezone.now()
+        Session.objects.create(session_key="expirada", session_data="", expire_date=agora - timedelta(days=1))
+        Session.objects.create(session_key="valida", session_data="", expire_date=agora + timedelta(days=1))
+
+        saida = StringIO()
+        call_command("aplicar_retencao", "--lote", "2", stdout=saida)
+
+        self.assertIn(f"{len(esperadas)} notification(s) archived", saida.getvalue())
+        self.assertIn("1 expired session(s) deleted", saida.getvalue())
+        self.assertEqual(Notificacao.objects.count(), total - len(esperadas))
+        self.assertTrue(Notificacao.objects.filter(pk=nao_lida_antiga).exists())
+        self.assertEqual(
+            {
+                arquivada.pk: (arquivada.assunto, arquivada.mensagem, arquivada.data_hora_criada)
+                for arquivada in NotificacaoArquivada.objects.all()
+            },
+            esperadas,
+        )
+        self.assertEqual(set(esperadas), set(lidas_antigas))
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), ["valida"])
+
+    def test_aplicar_retencao_apagando(self):
+        self.criar_notificacoes_antigas()
+        quantidade = Notificacao.objects.a_arquivar().count()
+
+        saida = StringIO()
+        call_command("aplicar_retencao", "--apagar", stdout=saida)
+
+        self.assertIn(f"{quantidade} notification(s) deleted", saida.getvalue())
+        self.assertFalse(Notificacao.objects.a_arquivar().exists())
+        self.assertFalse(NotificacaoArquivada.objects.exists())
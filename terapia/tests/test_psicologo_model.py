@@ -214,7 +214,7 @@ class PsicologoModelTest(ModelTestCase):
             while tempo_decorrido <= CONSULTA_ANTECEDENCIA_MAXIMA:
                 Consulta.objects.create(
                     data_hora_agendada=data_hora_inicio + tempo_decorrido - CONSULTA_ANTECEDENCIA_MINIMA,
-                    paciente=cls.paciente_dummy,
+                    paciente=cls.pacientes_dummies[1],
                     psicologo=psicologo_com_agenda_lotada,
                 )
                 tempo_decorrido += timedelta(weeks=1)
@@ -251,7 +251,7 @@ class PsicologoModelTest(ModelTestCase):
         )
         psicologo.especializacoes.set(self.especializacoes)
         self.set_disponibilidade_generica(psicologo)
-        consultas = self.criar_consultas_genericas(self.paciente_dummy, psicologo)
+        consultas = self.criar_consultas_genericas(self.pacientes_dummies[1], psicologo)
 
         self.assertEqual(psicologo.nome_completo, nome_completo)
         self.assertEqual(psicologo.crp, crp)
@@ -481,6 +481,30 @@ class PsicologoModelTest(ModelTestCase):
                         self.assertTrue(
                             self.psicologo_sempre_disponivel._tem_intervalo_onde_cabe_uma_consulta_em(data_hora))
 
+    def test_mascara_disponibilidade_acompanha_intervalos(self):
+        data_hora = converter_dia_semana_iso_com_hora_para_data_hora(3, time(10, 0), UTC) + timedelta(weeks=5)
+        psicologo = self.psicologo_dummy
+
+        with self.assertNumQueries(0):
+            self.assertTrue(psicologo._tem_intervalo_onde_cabe_uma_consulta_em(data_hora))
+
+        psicologo.disponibilidade.all().delete()
+
+        self.assertFalse(psicologo._tem_intervalo_onde_cabe_uma_consulta_em(data_hora))
+        self.assertFalse(
+            Psicologo.objects.get(pk=psicologo.pk)._tem_intervalo_onde_cabe_uma_consulta_em(data_hora)
+        )
+
+        IntervaloDisponibilidade.objects.create(
+            data_hora_inicio=converter_dia_semana_iso_com_hora_para_data_hora(3, time(10, 0), UTC),
+            data_hora_fim=converter_dia_semana_iso_com_hora_para_data_hora(3, time(12, 0), UTC),
+            psicologo_id=psicologo.pk,
+        )
+
+        self.assertTrue(
+            Psicologo.objects.get(pk=psicologo.pk)._tem_intervalo_onde_cabe_uma_consulta_em(data_hora)
+        )
+
     def test_get_intervalos_sobrepostos(self):
         psicologo = Psicologo.objects.create(
             usuario=Usuario.objects.create_user(email="psicologo@gmail.com", password="senha123"),
@@ -889,6 +913,16 @@ class PsicologoModelTest(ModelTestCase):
                         "É o mesmo que o teste anterior, porém o intervalo de DOM 22h - SEG 2h está cheio, assim como o intervalo de SEG 8h - SEG 12h. O intervalo SEG 14h - SEG 18h está quase cheio, só restando 16h que ainda está disponível. Portanto, a próxima data-hora agendável deve ser SEG 16h.",
                     )
 
+    def test_proxima_data_hora_agendavel_numero_de_queries_constante(self):
+        psicologo_com_agenda_lotada, uma_antecedencia_minima_antes_do_primeiro_agendamento_do_psicologo_com_agenda_lotada = self.criar_psicologo_com_agenda_lotada()
+
+        with freeze_time(uma_antecedencia_minima_antes_do_primeiro_agendamento_do_psicologo_com_agenda_lotada):
+            with self.assertNumQueries(2):
+                self.assertIsNone(psicologo_com_agenda_lotada.proxima_data_hora_agendavel)
+
+            with self.assertNumQueries(1):
+                self.assertIsNone(self.psicologo_incompleto.proxima_data_hora_agendavel)
+
     def test_get_matriz_disponibilidade_booleanos_em_json(self):
         for fuso, matriz_em_json in MATRIZES_DISPONIBILIDADE_GENERICA_BOOLEANOS_EM_JSON.items():
             with timezone.override(fuso), self.subTest(fuso=fuso, psicologo=self.psicologo_completo.nome_completo):
@@ -911,6 +945,38 @@ class PsicologoModelTest(ModelTestCase):
                         matriz,
                     )
 
+    def test_matriz_disponibilidade_em_cache(self):
+        with timezone.override(UTC):
+            matriz_em_json = self.psicologo_dummy.get_matriz_disponibilidade_booleanos_em_json()
+
+            with self.assertNumQueries(0):
+                self.assertEqual(self.psicologo_dummy.get_matriz_disponibilidade_booleanos_em_json(), matriz_em_json)
+                self.assertEqual(
+                    Psicologo(pk=self.psicologo_dummy.pk, versao_disponibilidade=self.psicologo_dummy.versao_disponibilidade)
+                        .get_matriz_disponibilidade_booleanos_em_json(),
+                    matriz_em_json,
+                )
+
+            versao = self.psicologo_dummy.versao_disponibilidade
+            IntervaloDisponibilidade.objects.criar_por_dia_semana_e_hora(
+                3, time(10, 0), 3, time(12, 0), UTC, self.psicologo_dummy,
+            )
+
+            self.assertGreater(self.psicologo_dummy.versao_disponibilidade, versao)
+            self.assertTrue(json.loads(self.psicologo_dummy.get_matriz_disponibilidade_booleanos_em_json())[3][10])
+
+            psicologo = Psicologo.objects.get(pk=self.psicologo_dummy.pk)
+            self.assertEqual(
+                psicologo.get_matriz_disponibilidade_booleanos_em_json(),
+                psicologo._criar_matriz_disponibilidade_booleanos_em_json(),
+            )
+
+        with timezone.override(ZoneInfo("Asia/Tokyo")):
+            self.assertEqual(
+                psicologo.get_matriz_disponibilidade_booleanos_em_json(),
+                psicologo._criar_matriz_disponibilidade_booleanos_em_json(),
+            )
+
     def test_esta_agendavel_em(self):
         class MotivosParaNaoEstarAgendavel:
             PASSADO = "Não é possível estar agendável no passado"
@@ -1187,4 +1253,44 @@ class PsicologoModelTest(ModelTestCase):
                     data_hora=psicologo_com_agenda_lotada.proxima_data_hora_agendavel,
                     psicologo=psicologo_com_agenda_lotada,
                     descricao="Se passou uma semana desde que o psicólogo estava com a agenda lotada, então a antecedência máxima avançou e agora há espaço para um novo agendamento",
-                )
\ No newline at end of file
+                )
+
+    def test_agendaveis_em(self):
+        psicologo_com_agenda_lotada, uma_antecedencia_minima_antes_do_primeiro_agendamento_do_psicologo_com_agenda_lotada = self.criar_psicologo_com_agenda_lotada()
+        Consulta.objects.create(
+            data_hora_agendada=converter_dia_semana_iso_com_hora_para_data_hora(1, time(9, 0), UTC) + timedelta(weeks=1),
+            paciente=self.paciente_dummy,
+            psicologo=self.psicologo_completo,
+        )
+
+        with freeze_time(uma_antecedencia_minima_antes_do_primeiro_agendamento_do_psicologo_com_agenda_lotada + timedelta(minutes=17)):
+            agora = timezone.now()
+            datas_hora_para_teste = [
+                agora - timedelta(minutes=1),
+                agora + CONSULTA_ANTECEDENCIA_MINIMA,
+                agora + CONSULTA_ANTECEDENCIA_MAXIMA,
+                agora + CONSULTA_ANTECEDENCIA_MAXIMA + timedelta(milliseconds=1),
+            ] + [
+                converter_dia_semana_iso_com_hora_para_data_hora(dia_semana_iso, time(hora, minuto), UTC) + timedelta(weeks=semanas)
+                for dia_semana_iso in [1, 4, 5, 6, 7]
+                for hora in [0, 9, 11, 23]
+                for minuto in [0, 30]
+                for semanas in [0, 1, 8]
+            ] + [
+                psicologo.proxima_data_hora_agendavel + delta for psicologo in Psicologo.objects.all()
+                if psicologo.proxima_data_hora_agendavel is not None
+                for delta in [timedelta(0), timedelta(milliseconds=1), timedelta(minutes=59)]
+            ]
+
+            for data_hora in datas_hora_para_teste:
+                esperado = [psicologo.pk for psicologo in Psicologo.objects.all() if psicologo.esta_agendavel_em(data_hora)]
+
+                for fuso in [UTC, ZoneInfo("America/Sao_Paulo"), ZoneInfo("Asia/Kolkata")]:
+                    data_hora_local = timezone.localtime(data_hora, fuso)
+
+                    with self.subTest(data_hora=data_hora_local):
+                        self.assertQuerySetEqual(
+                            Psicologo.objects.agendaveis_em(data_hora_local).values_list("pk", flat=True),
+                            esperado,
+                            ordered=False,
+                        )
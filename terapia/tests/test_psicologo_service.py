@@ -215,7 +215,7 @@ class PsicologoServiceTest(ModelTestCase):
             while tempo_decorrido <= CONSULTA_ANTECEDENCIA_MAXIMA:
                 Consulta.objects.create(
                     data_hora_agendada=data_hora_inicio + tempo_decorrido - CONSULTA_ANTECEDENCIA_MINIMA,
-                    paciente=cls.paciente_dummy,
+                    paciente=cls.pacientes_dummies[1],
                     psicologo=psicologo_com_agenda_lotada,
                 )
                 tempo_decorrido += timedelta(weeks=1)
@@ -969,4 +969,4 @@ class PsicologoServiceTest(ModelTestCase):
                     data_hora=PsicologoService.obter_proxima_disponibilidade(psicologo_com_agenda_lotada),
                     psicologo=psicologo_com_agenda_lotada,
                     descricao="Se passou uma semana desde que o psicólogo estava com a agenda lotada, então a antecedência máxima avançou e agora há espaço para um novo agendamento",
-                )
\ No newline at end of file
+                )
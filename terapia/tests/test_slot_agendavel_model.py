@@ -0,0 +1,146 @@
+from datetime import UTC, datetime, timedelta
+from django.core.management import call_command
+from django.utils import timezone
+from freezegun import freeze_time
+from io import StringIO
+from unittest import mock
+from terapia.constantes import (
+    CONSULTA_ANTECEDENCIA_MAXIMA,
+    CONSULTA_ANTECEDENCIA_MINIMA,
+    CONSULTA_DURACAO,
+)
+from terapia.models import Consulta, EstadoConsulta, Psicologo, SlotAgendavel
+from terapia.utilidades.disponibilidade import get_inicio_do_periodo
+from .model_test_case import ModelTestCase
+
+
+class SlotAgendavelModelTest(ModelTestCase):
+    agora = datetime(2025, 3, 3, 9, 30, tzinfo=UTC)
+
+    def get_datas_hora_dos_slots(self, psicologo):
+        return list(psicologo.slots_agendaveis.agendaveis().values_list("data_hora", flat=True))
+
+    def test_sincronizar(self):
+        with freeze_time(self.agora):
+            for psicologo in (self.psicologo_completo, self.psicologo_sempre_disponivel, self.psicologo_incompleto):
+                SlotAgendavel.objects.sincronizar(psicologo)
+
+                inicio = get_inicio_do_periodo(self.agora + CONSULTA_ANTECEDENCIA_MINIMA)
+                fim = self.agora + timedelta(days=7)
+                esperado = []
+                data_hora = inicio
+
+                while data_hora < fim:
+                    if psicologo.esta_agendavel_em(data_hora):
+                        esperado.append(data_hora)
+                    data_hora += CONSULTA_DURACAO
+
+                with self.subTest(psicologo=psicologo.nome_completo):
+                    self.assertEqual(
+                        [data_hora for data_hora in self.get_datas_hora_dos_slots(psicologo) if data_hora < fim],
+                        esperado,
+                    )
+                    primeiro_slot = psicologo.slots_agendaveis.agendaveis().first()
+                    self.assertEqual(
+                        primeiro_slot.data_hora if primeiro_slot else None,
+                        psicologo.proxima_data_hora_agendavel,
+                    )
+
+    def test_consultas_removem_e_restauram_slots(self):
+        psicologo = self.psicologo_sempre_disponivel
+
+        with freeze_time(self.agora):
+            SlotAgendavel.objects.sincronizar(psicologo)
+            data_hora = datetime(2025, 3, 5, 10, 0, tzinfo=UTC)
+            self.assertIn(data_hora, self.get_datas_hora_dos_slots(psicologo))
+
+            consulta = Consulta.objects.create(paciente=self.paciente_dummy, psicologo=psicologo, data_hora_agendada=data_hora)
+            self.assertNotIn(data_hora, self.get_datas_hora_dos_slots(psicologo))
+
+            consulta.data_hora_agendada = data_hora + CONSULTA_DURACAO
+            consulta.save()
+            self.assertIn(data_hora, self.get_datas_hora_dos_slots(psicologo))
+            self.assertNotIn(data_hora + CONSULTA_DURACAO, self.get_datas_hora_dos_slots(psicologo))
+
+            consulta.estado = EstadoConsulta.CANCELADA
+            consulta.save(update_fields=["estado"])
+            self.assertIn(data_hora + CONSULTA_DURACAO, self.get_datas_hora_dos_slots(psicologo))
+
+            consulta.estado = EstadoConsulta.SOLICITADA
+            consulta.save(update_fields=["estado"])
+            consulta.delete()
+            self.assertIn(data_hora + CONSULTA_DURACAO, self.get_datas_hora_dos_slots(psicologo))
+
+    def test_salvar_consulta_sem_mudar_slots_ocupados(self):
+        psicologo = self.psicologo_sempre_disponivel
+
+        with freeze_time(self.agora):
+            data_hora = datetime(2025, 3, 5, 10, 0, tzinfo=UTC)
+            consulta = Consulta.objects.create(paciente=self.paciente_dummy, psicologo=psicologo, data_hora_agendada=data_hora)
+
+            with mock.patch.object(SlotAgendavel.objects, "sincronizar_em_volta_de") as sincronizar_em_volta_de:
+                consulta.anotacoes = "Anotações"
+                consulta.save(update_fields=["anotacoes"])
+                consulta.checklist_tarefas = [{"descricao": "Tarefa", "feita": False}]
+                consulta.save(update_fields=["checklist_tarefas"])
+                consulta.save(update_fields=["estado"])
+                consulta.save()
+                sincronizar_em_volta_de.assert_not_called()
+
+                consulta.estado = EstadoConsulta.CONFIRMADA
+                consulta.save(update_fields=["estado"])
+                sincronizar_em_volta_de.assert_called_once_with(mock.ANY, data_hora)
+
+    def test_excluir_psicologo(self):
+        psicologo = self.psicologo_sempre_disponivel
+
+        with freeze_time(self.agora):
+            SlotAgendavel.objects.sincronizar(psicologo)
+            Consulta.objects.create(
+                paciente=self.paciente_dummy,
+                psicologo=psicologo,
+                data_hora_agendada=datetime(2025, 3, 5, 10, 0, tzinfo=UTC),
+            )
+            psicologo.usuario.delete()
+
+        self.assertFalse(Psicologo.objects.filter(pk=psicologo.pk).exists())
+        self.assertFalse(SlotAgendavel.objects.filter(psicologo_id=psicologo.pk).exists())
+
+    def test_rolar_horizonte(self):
+        psicologo = self.psicologo_sempre_disponivel
+
+        with freeze_time(self.agora):
+            SlotAgendavel.objects.sincronizar(psicologo)
+
+        amanha = self.agora + timedelta(days=1)
+
+        with freeze_time(amanha):
+            call_command("rolar_slots_agendaveis", stdout=StringIO())
+            datas_hora = list(psicologo.slots_agendaveis.values_list("data_hora", flat=True))
+
+            self.assertGreaterEqual(datas_hora[0], get_inicio_do_periodo(amanha))
+            self.assertGreaterEqual(datas_hora[-1], get_inicio_do_periodo(amanha + CONSULTA_ANTECEDENCIA_MAXIMA))
+            self.assertEqual(len(datas_hora), len(set(datas_hora)))
+
+    def test_com_slot_agendavel_em(self):
+        with freeze_time(self.agora):
+            for psicologo in Psicologo.objects.all():
+                SlotAgendavel.objects.sincronizar(psicologo)
+
+            for data_hora in (
+                datetime(2025, 3, 3, 10, 0, tzinfo=UTC),
+                datetime(2025, 3, 3, 11, 0, tzinfo=UTC),
+                datetime(2025, 3, 4, 15, 0, tzinfo=UTC),
+                datetime(2025, 3, 4, 15, 30, tzinfo=UTC),
+                datetime(2025, 3, 8, 3, 0, tzinfo=UTC),
+            ):
+                with self.subTest(data_hora=timezone.localtime(data_hora)):
+                    self.assertQuerySetEqual(
+                        Psicologo.objects.com_slot_agendavel_em(data_hora),
+                        Psicologo.objects.agendaveis_em(data_hora),
+                        ordered=False,
+                    )
+
+            for psicologo in Psicologo.objects.com_proximo_slot_agendavel():
+                with self.subTest(psicologo=psicologo.nome_completo):
+                    self.assertEqual(psicologo.proximo_slot_agendavel, psicologo.proxima_data_hora_agendavel)
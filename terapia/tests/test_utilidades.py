@@ -1,10 +1,30 @@
-from datetime import UTC, datetime, time
+from datetime import UTC, datetime, time, timedelta
 from unittest.mock import patch
+from terapia.constantes import (
+    CONSULTA_DURACAO,
+    CONSULTA_DURACAO_MINUTOS,
+    NUMERO_PERIODOS_POR_SEMANA,
+)
 from terapia.utilidades.geral import (
     desprezar_segundos_e_microssegundos,
     converter_dia_semana_iso_com_hora_para_data_hora,
     regra_de_3_numero_periodos_por_dia,
 )
+from terapia.utilidades.disponibilidade import (
+    MASCARA_SEMANA_COMPLETA,
+    cabe_consulta_na_mascara,
+    criar_mascara_disponibilidade,
+    get_minuto_da_semana_utc,
+    mascara_de_bytes,
+    mascara_para_bytes,
+    tem_consulta_conflitante,
+)
+from terapia.utilidades.matriz_disponibilidade import (
+    criar_semana_achatada,
+    extrair_faixas,
+    matriz_para_semana_achatada,
+    semana_achatada_para_matriz,
+)
 from django.utils import timezone
 from .base_test_case import BaseTestCase
 
@@ -42,6 +62,33 @@ class UtilidadesTest(BaseTestCase):
                         datetime(2024, 7, dia_semana_iso, hora.hour, hora.minute, tzinfo=UTC)
                     )
     
+    def test_converter_dia_semana_iso_com_hora_para_data_hora_memorizado(self):
+        converter_dia_semana_iso_com_hora_para_data_hora.cache_clear()
+
+        primeiro = converter_dia_semana_iso_com_hora_para_data_hora(3, time(12, 30), UTC)
+        segundo = converter_dia_semana_iso_com_hora_para_data_hora(3, time(12, 30), UTC)
+        info = converter_dia_semana_iso_com_hora_para_data_hora.cache_info()
+
+        self.assertIs(primeiro, segundo)
+        self.assertEqual((info.hits, info.misses), (1, 1))
+        self.assertIsNotNone(info.maxsize)
+
+    def test_converter_dia_semana_iso_com_hora_para_data_hora_memorizado_com_segundos(self):
+        converter_dia_semana_iso_com_hora_para_data_hora.cache_clear()
+        converter_dia_semana_iso_com_hora_para_data_hora(3, time(12, 30), UTC)
+        hits = converter_dia_semana_iso_com_hora_para_data_hora.cache_info().hits
+
+        # Horas do mesmo minuto, como as de agora.time(), usam a mesma entrada do cache
+        for hora in (time(12, 30, 1), time(12, 30, 45, 123456), time(12, 30, 59, 999999)):
+            with self.subTest(hora=hora):
+                resultado = converter_dia_semana_iso_com_hora_para_data_hora(3, hora, UTC)
+                info = converter_dia_semana_iso_com_hora_para_data_hora.cache_info()
+
+                self.assertEqual(resultado, datetime(2024, 7, 3, 12, 30, tzinfo=UTC))
+                self.assertEqual(info.hits, hits + 1)
+                self.assertEqual(info.misses, 1)
+                hits = info.hits
+
     def test_regra_de_3_numero_periodos_por_dia(self):
         valores_n = [i for i in range(25)]
         lista_numero_periodos_por_dia = [24, 48, 96]
@@ -54,4 +101,92 @@ class UtilidadesTest(BaseTestCase):
                 for n in valores_n:
                     with self.subTest(numero_periodos_por_dia=numero_periodos_por_dia, n=n):
                         resultado = regra_de_3_numero_periodos_por_dia(n)
-                        self.assertEqual(resultado, n * numero_periodos_por_dia // 24)
\ No newline at end of file
+                        self.assertEqual(resultado, n * numero_periodos_por_dia // 24)
+
+class DisponibilidadeUtilidadesTest(BaseTestCase):
+    def test_get_minuto_da_semana_utc(self):
+        for fuso in self.fusos_para_teste:
+            data_hora = timezone.localtime(datetime(2025, 9, 2, 13, 30, 59, tzinfo=UTC), fuso)
+
+            with self.subTest(fuso=fuso):
+                self.assertEqual(get_minuto_da_semana_utc(data_hora), 24 * 60 + 13 * 60 + 30)
+
+    def test_criar_mascara_disponibilidade(self):
+        inicio = converter_dia_semana_iso_com_hora_para_data_hora(1, time(8, 0), UTC)
+        fim = converter_dia_semana_iso_com_hora_para_data_hora(1, time(8, 0), UTC) + 2 * CONSULTA_DURACAO
+        self.assertEqual(criar_mascara_disponibilidade([(inicio, fim)]), 0b11 << (8 * 60 // CONSULTA_DURACAO_MINUTOS))
+
+        self.assertEqual(criar_mascara_disponibilidade([(inicio, inicio)]), MASCARA_SEMANA_COMPLETA)
+        self.assertEqual(criar_mascara_disponibilidade([]), 0)
+
+        inicio_da_semana = converter_dia_semana_iso_com_hora_para_data_hora(1, time(0, 0), UTC)
+        vira_a_semana = criar_mascara_disponibilidade([
+            (inicio_da_semana - CONSULTA_DURACAO, inicio_da_semana + CONSULTA_DURACAO),
+        ])
+        self.assertEqual(vira_a_semana, 1 | (1 << (NUMERO_PERIODOS_POR_SEMANA - 1)))
+
+    def test_cabe_consulta_na_mascara(self):
+        inicio = converter_dia_semana_iso_com_hora_para_data_hora(7, time(22, 0), UTC)
+        fim = converter_dia_semana_iso_com_hora_para_data_hora(1, time(2, 0), UTC)
+        mascara = criar_mascara_disponibilidade([(inicio, fim)])
+
+        self.assertTrue(cabe_consulta_na_mascara(mascara, inicio))
+        self.assertTrue(cabe_consulta_na_mascara(mascara, fim - CONSULTA_DURACAO))
+        self.assertTrue(cabe_consulta_na_mascara(mascara, inicio + timedelta(minutes=1)))
+        self.assertFalse(cabe_consulta_na_mascara(mascara, inicio - timedelta(minutes=1)))
+        self.assertFalse(cabe_consulta_na_mascara(mascara, fim - CONSULTA_DURACAO + timedelta(minutes=1)))
+        self.assertFalse(cabe_consulta_na_mascara(0, inicio))
+
+    def test_mascara_em_bytes(self):
+        for mascara in [0, 1, MASCARA_SEMANA_COMPLETA, 1 << (NUMERO_PERIODOS_POR_SEMANA - 1)]:
+            with self.subTest(mascara=mascara):
+                self.assertEqual(mascara_de_bytes(mascara_para_bytes(mascara)), mascara)
+
+    def test_tem_consulta_conflitante(self):
+        data_hora = datetime(2025, 9, 1, 10, 0, tzinfo=UTC)
+        datas_hora_ocupadas = [data_hora - 2 * CONSULTA_DURACAO, data_hora, data_hora + 3 * CONSULTA_DURACAO]
+
+        self.assertTrue(tem_consulta_conflitante(datas_hora_ocupadas, data_hora))
+        self.assertTrue(tem_consulta_conflitante(datas_hora_ocupadas, data_hora + CONSULTA_DURACAO - timedelta(minutes=1)))
+        self.assertTrue(tem_consulta_conflitante(datas_hora_ocupadas, data_hora - CONSULTA_DURACAO + timedelta(minutes=1)))
+        self.assertFalse(tem_consulta_conflitante(datas_hora_ocupadas, data_hora + CONSULTA_DURACAO))
+        self.assertFalse(tem_consulta_conflitante(datas_hora_ocupadas, data_hora - CONSULTA_DURACAO))
+        self.assertFalse(tem_consulta_conflitante([], data_hora))
+
+
+class MatrizDisponibilidadeUtilidadesTest(BaseTestCase):
+    def test_criar_semana_achatada(self):
+        semana = criar_semana_achatada([(2, 5), (6 * 4 + 3, 1)], numero_periodos_por_dia=4)
+
+        self.assertEqual(len(semana), 28)
+        self.assertEqual(
+            [i for i, disponivel in enumerate(semana) if disponivel],
+            [0, 2, 3, 4, 27],
+        )
+        self.assertTrue(all(criar_semana_achatada([(5, 5)], numero_periodos_por_dia=4)))
+        self.assertFalse(any(criar_semana_achatada([], numero_periodos_por_dia=4)))
+
+    def test_semana_achatada_e_matriz(self):
+        semana = [i % 3 == 0 for i in range(28)]
+        matriz = semana_achatada_para_matriz(semana, numero_periodos_por_dia=4)
+
+        self.assertEqual(len(matriz), 7)
+        self.assertEqual(matriz[0], semana[24:])
+        self.assertEqual(matriz[1], semana[:4])
+        self.assertEqual(matriz_para_semana_achatada(matriz), semana)
+
+    def test_extrair_faixas(self):
+        casos = [
+            ([], []),
+            ([(2, 5)], [(2, 5)]),
+            ([(2, 5), (8, 10)], [(2, 5), (8, 10)]),
+            ([(25, 28)], [(25, 28)]),
+            ([(0, 3), (25, 28)], [(25, 3)]),
+            ([(0, 3), (10, 12), (25, 28)], [(10, 12), (25, 3)]),
+            ([(0, 0)], [(0, 0)]),
+        ]
+
+        for faixas, esperado in casos:
+            with self.subTest(faixas=faixas):
+                semana = criar_semana_achatada(faixas, numero_periodos_por_dia=4)
+                self.assertEqual(extrair_faixas(semana), esperado)
@@ -1,6 +1,18 @@
+import asyncio
+import json
+import re
+from datetime import UTC, datetime, timedelta
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from unittest import mock
 from django.contrib.auth import get_user_model
-from terapia.models import Paciente, Psicologo, Consulta
+from terapia.constantes import NOTIFICACOES_POR_PAGINA, NOTIFICACOES_RECENTES_QUANTIDADE
+from terapia.models import Consulta, EstadoConsulta, Notificacao, Paciente, Psicologo, TipoNotificacao
+from freezegun import freeze_time
+from terapia.views import MinhasConsultasView, PesquisaView
 from .model_test_case import ModelTestCase
 
 Usuario = get_user_model()
@@ -88,3 +100,322 @@ class ViewsTestCase(ModelTestCase):
             psicologo=psicologo,
             data_hora_agendada=data_hora
         ).exists())
+
+    def test_pesquisa_view_ordenada_por_disponivel_mais_cedo(self):
+        response = self.client.get(reverse("pesquisa"), {"ordenacao": "disponivel_mais_cedo"})
+
+        self.assertEqual(response.status_code, 200)
+        psicologos = response.context["psicologos"]
+        self.assertTrue(psicologos)
+        self.assertEqual(
+            [psicologo.proximo_slot_agendavel for psicologo in psicologos],
+            sorted(psicologo.proxima_data_hora_agendavel for psicologo in psicologos),
+        )
+
+    def test_consultas_em_lote_via_perfil_view(self):
+        self.client.force_login(self.paciente_dummy.usuario)
+        psicologo = self.psicologo_sempre_disponivel
+        url = reverse("perfil", kwargs={"pk": psicologo.pk})
+        primeira_data_hora = datetime(2025, 3, 4, 10, 0)
+        consultas = Consulta.objects.filter(paciente=self.paciente_dummy, psicologo=psicologo)
+        numero_de_consultas = consultas.count()
+
+        with freeze_time(datetime(2025, 3, 3, 9, 30, tzinfo=UTC)):
+            numeros_de_queries = []
+
+            for dias in (range(0, 2), range(2, 8)):
+                slots = [(primeira_data_hora + timedelta(days=dia)).isoformat() for dia in dias]
+
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.post(url, {"agendamentos": json.dumps(slots)})
+
+                self.assertRedirects(response, reverse("minhas_consultas"), fetch_redirect_response=False)
+                numeros_de_queries.append(len(queries))
+
+        self.assertEqual(numeros_de_queries[0], numeros_de_queries[1])
+        self.assertEqual(consultas.count(), numero_de_consultas + 8)
+
+    def test_minhas_consultas_view_nao_escreve_estados(self):
+        self.client.force_login(self.paciente_dummy.usuario)
+        consultas = Consulta.objects.filter(paciente=self.paciente_dummy)
+        estados = dict(consultas.values_list("pk", "estado"))
+
+        response = self.client.get(reverse("minhas_consultas"), {"estado": EstadoConsulta.CANCELADA})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(dict(consultas.values_list("pk", "estado")), estados)
+        # As consultas genéricas são solicitações no passado, então efetivamente expiraram
+        self.assertEqual(
+            {consulta.pk for consulta in response.context["consultas"]},
+            {consulta.pk for consulta in self.consultas},
+        )
+        self.assertTrue(all(consulta.estado == EstadoConsulta.CANCELADA for consulta in response.context["consultas"]))
+
+    def criar_notificacoes(self, quantidade):
+        consulta = self.consultas[0]
+        Notificacao.criar_em_lote([
+            Notificacao(
+                tipo=TipoNotificacao.CONSULTA_SOLICITADA,
+                remetente=consulta.paciente.usuario,
+                destinatario=consulta.psicologo.usuario,
+                consulta=consulta,
+            )
+            for _ in range(quantidade)
+        ])
+
+    def test_cabecalho_com_numero_constante_de_queries(self):
+        usuario = self.consultas[0].psicologo.usuario
+        self.client.force_login(usuario)
+        numeros_de_queries = []
+
+        for quantidade in (1, 3 * NOTIFICACOES_RECENTES_QUANTIDADE):
+            self.criar_notificacoes(quantidade)
+
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse("home"))
+
+            self.assertEqual(response.status_code, 200)
+            numeros_de_queries.append(len(queries))
+
+        self.assertEqual(numeros_de_queries[0], numeros_de_queries[1])
+        self.assertContains(response, reverse("notificacoes"))
+        self.assertEqual(len(re.findall(r"Recebida em \d", response.content.decode())), NOTIFICACOES_RECENTES_QUANTIDADE)
+
+    def test_notificacoes_view_paginada(self):
+        usuario = self.consultas[0].psicologo.usuario
+        self.client.force_login(usuario)
+        self.criar_notificacoes(NOTIFICACOES_POR_PAGINA + 1)
+        total = usuario.notificacoes_como_destinatario.count()
+
+        response = self.client.get(reverse("notificacoes"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["notificacoes"]), NOTIFICACOES_POR_PAGINA)
+        self.assertEqual(response.context["paginator"].count, total)
+
+        ultima_pagina = response.context["paginator"].num_pages
+        response = self.client.get(reverse("notificacoes"), {"page": ultima_pagina})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(response.context["notificacoes"]),
+            total - (ultima_pagina - 1) * NOTIFICACOES_POR_PAGINA,
+        )
+
+    def test_notificacoes_novas(self):
+        usuario = self.consultas[0].psicologo.usuario
+        self.client.force_login(usuario)
+        self.criar_notificacoes(3)
+        ultimas = list(usuario.notificacoes_como_destinatario.order_by("-pk").values_list("pk", flat=True)[:3])
+
+        response = self.client.get(reverse("notificacoes_novas"), {"desde": ultimas[-1]})
+        self.assertEqual(response.status_code, 200)
+        dados = response.json()
+
+        self.assertEqual([notificacao["id"] for notificacao in dados["notificacoes"]], sorted(ultimas[:2]))
+        self.assertTrue(all(notificacao["mensagem"] for notificacao in dados["notificacoes"]))
+        usuario.refresh_from_db()
+        self.assertEqual(dados["nao_lidas"], usuario.notificacoes_nao_lidas)
+
+        response = self.client.get(reverse("notificacoes_novas"), {"desde": ultimas[0]})
+        self.assertEqual(response.json()["notificacoes"], [])
+
+        response = self.client.get(reverse("notificacoes_novas"), {"desde": "invalido"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cabecalho_consulta_notificacoes_novas_sem_servidor_asgi(self):
+        self.client.force_login(self.consultas[0].psicologo.usuario)
+
+        response = self.client.get(reverse("pesquisa"))
+        self.assertContains(response, reverse("notificacoes_novas"))
+        self.assertNotContains(response, "EventSource")
+
+        with override_settings(NOTIFICACOES_AO_VIVO_SSE=True):
+            response = self.client.get(reverse("pesquisa"))
+            self.assertContains(response, "EventSource")
+            self.assertContains(response, reverse("notificacoes_ao_vivo"))
+
+    def test_notificacoes_ao_vivo_desabilitadas_sem_servidor_asgi(self):
+        self.client.force_login(self.consultas[0].psicologo.usuario)
+        response = self.client.get(reverse("notificacoes_ao_vivo"))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(NOTIFICACOES_AO_VIVO_SSE=True)
+    async def test_notificacoes_ao_vivo_transmite_antes_do_fim_do_stream(self):
+        usuario = self.consultas[0].psicologo.usuario
+        await self.async_client.aforce_login(usuario)
+        ultima = await usuario.notificacoes_como_destinatario.order_by("-pk").afirst()
+
+        response = await self.async_client.get(reverse("notificacoes_ao_vivo"), {"desde": ultima.pk if ultima else 0})
+        self.assertTrue(response.streaming)
+        self.assertTrue(response.is_async)
+        eventos = aiter(response.streaming_content)
+
+        # O primeiro evento chega na hora, e não só quando o stream termina (NOTIFICACOES_AO_VIVO_DURACAO_MAXIMA)
+        self.assertTrue((await asyncio.wait_for(anext(eventos), 1)).startswith(b"retry:"))
+
+        proximo = asyncio.ensure_future(anext(eventos))
+        await asyncio.sleep(0.1)
+        self.assertFalse(proximo.done())
+
+        proximo.cancel()
+        await response.streaming_content.aclose()
+
+    @override_settings(NOTIFICACOES_AO_VIVO_SSE=True)
+    async def test_notificacoes_ao_vivo(self):
+        usuario = self.consultas[0].psicologo.usuario
+        await self.async_client.aforce_login(usuario)
+        await sync_to_async(self.criar_notificacoes)(1)
+        ultima = await usuario.notificacoes_como_destinatario.order_by("-pk").afirst()
+
+        response = await self.async_client.get(reverse("notificacoes_ao_vivo"), {"desde": ultima.pk - 1})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        eventos = aiter(response.streaming_content)
+
+        self.assertTrue((await anext(eventos)).startswith(b"retry:"))
+        evento = await anext(eventos)
+        self.assertTrue(evento.startswith(f"id: {ultima.pk}\n".encode()))
+
+        # O stream está esperando; a notificação nova deve acordá-lo bem antes do próximo polling
+        proximo = asyncio.ensure_future(anext(eventos))
+        await asyncio.sleep(0.1)
+
+        def criar_notificacao_e_confirmar():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.criar_notificacoes(1)
+
+        await sync_to_async(criar_notificacao_e_confirmar)()
+        evento = json.loads((await asyncio.wait_for(proximo, 5)).decode().split("data: ", 1)[1])
+
+        self.assertEqual(evento["id"], ultima.pk + 1)
+        self.assertFalse(evento["lida"])
+        self.assertTrue(evento["mensagem"])
+        await response.streaming_content.aclose()
+
+    @override_settings(NOTIFICACOES_AO_VIVO_SSE=True)
+    def test_notificacoes_ao_vivo_exige_autenticacao(self):
+        response = self.client.get(reverse("notificacoes_ao_vivo"))
+        self.assertEqual(response.status_code, 403)
+
+    def test_confirmar_notificacoes(self):
+        usuario = self.consultas[0].psicologo.usuario
+        self.client.force_login(usuario)
+        self.criar_notificacoes(3)
+        nao_lidas = list(usuario.notificacoes_como_destinatario.filter(lida=False).values_list("pk", flat=True))
+        confirmar = reverse("confirmar_notificacoes")
+
+        for ids, restantes in ((nao_lidas[:2], len(nao_lidas) - 2), (nao_lidas[:2], len(nao_lidas) - 2), (nao_lidas, 0)):
+            response = self.client.post(confirmar, json.dumps({"ids": ids}), content_type="application/json")
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), {"nao_lidas": restantes})
+
+        self.assertFalse(usuario.notificacoes_como_destinatario.filter(lida=False).exists())
+        response = self.client.post(confirmar, json.dumps({"ids": "x"}), content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def percorrer_paginas(self, url, parametros, chave):
+        """
+        Segue os links de próxima página e retorna os objetos de todas as páginas e o número de
+        queries de cada página.
+        """
+        objetos, numeros_de_queries = [], []
+
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, parametros)
+
+            self.assertEqual(response.status_code, 200)
+            objetos += response.context[chave]
+            numeros_de_queries.append(len(queries))
+
+            if not response.context["proximo_cursor"]:
+                return objetos, numeros_de_queries
+
+            parametros = {**parametros, "cursor": response.context["proximo_cursor"]}
+            self.assertContains(response, f"cursor={response.context['proximo_cursor']}")
+
+    @mock.patch.object(MinhasConsultasView, "paginate_by", 2)
+    def test_minhas_consultas_view_paginada_por_cursor(self):
+        psicologo = self.consultas[0].psicologo
+        self.client.force_login(psicologo.usuario)
+        parametros = {"estado": EstadoConsulta.CANCELADA}
+        Consulta.objects.bulk_create([
+            Consulta(
+                paciente=self.paciente_dummy,
+                psicologo=psicologo,
+                data_hora_agendada=datetime(2025, 3, 4, 10, 0, tzinfo=UTC) + timedelta(days=dia),
+                estado=EstadoConsulta.CANCELADA,
+            )
+            for dia in range(5)
+        ])
+        esperadas = list(
+            Consulta.objects.com_estado_efetivo()
+            .filter(psicologo=psicologo, estado_efetivo=EstadoConsulta.CANCELADA)
+            .order_by("-data_hora_solicitada", "-data_hora_agendada", "pk")
+            .values_list("pk", flat=True)
+        )
+        consultas, numeros_de_queries = self.percorrer_paginas(reverse("minhas_consultas"), parametros, "consultas")
+
+        self.assertEqual([consulta.pk for consulta in consultas], esperadas)
+        self.assertEqual(len(set(numeros_de_queries)), 1)
+
+    @mock.patch.object(PesquisaView, "paginate_by", 2)
+    def test_pesquisa_view_paginada_por_cursor(self):
+        esperados = list(Psicologo.completos.order_by("nome_completo", "pk").values_list("pk", flat=True))
+        self.assertGreater(len(esperados), 2)
+
+        psicologos, _ = self.percorrer_paginas(reverse("pesquisa"), {}, "psicologos")
+
+        self.assertEqual([psicologo.pk for psicologo in psicologos], esperados)
+
+    @mock.patch.object(PesquisaView, "paginate_by", 2)
+    def test_pesquisa_view_ordenada_por_disponivel_mais_cedo_paginada_por_cursor(self):
+        esperados = sorted(
+            (psicologo.proxima_data_hora_agendavel, psicologo.pk) for psicologo in Psicologo.completos.all()
+            if psicologo.proxima_data_hora_agendavel is not None
+        )
+        self.assertGreater(len(esperados), 2)
+
+        psicologos, numeros_de_queries = self.percorrer_paginas(
+            reverse("pesquisa"), {"ordenacao": "disponivel_mais_cedo"}, "psicologos",
+        )
+
+        self.assertEqual([(psicologo.proximo_slot_agendavel, psicologo.pk) for psicologo in psicologos], esperados)
+        self.assertEqual(len(set(numeros_de_queries)), 1)
+
+    def test_cursor_invalido(self):
+        response = self.client.get(reverse("pesquisa"), {"cursor": "invalido"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_pesquisa_view_com_numero_fixo_de_queries(self):
+        usuario_model = get_user_model()
+
+        for ordenacao in ("", "disponivel_mais_cedo"):
+            with self.subTest(ordenacao=ordenacao):
+                numeros_de_queries = []
+
+                for _ in range(2):
+                    with CaptureQueriesContext(connection) as queries:
+                        response = self.client.get(reverse("pesquisa"), {"ordenacao": ordenacao})
+
+                    self.assertEqual(response.status_code, 200)
+                    self.assertTrue(response.context["psicologos"])
+                    numeros_de_queries.append(len(queries))
+
+                    # Mais psicólogos completos (e mais resultados na página) não podem mudar o número de queries
+                    for i in range(5):
+                        psicologo = Psicologo.objects.create(
+                            usuario=usuario_model.objects.create_user(
+                                email=f"psicologo.pesquisa.{ordenacao}.{len(numeros_de_queries)}.{i}@example.com",
+                                password="senha123",
+                            ),
+                            nome_completo=f"Psicólogo Pesquisa {i}",
+                            crp=f"09/{ordenacao[:1]}{len(numeros_de_queries)}{i}",
+                            sobre_mim="Texto longo. " * 1000,
+                            valor_consulta=100.00,
+                        )
+                        psicologo.especializacoes.set(self.especializacoes)
+                        self.set_disponibilidade_generica(psicologo)
+
+                # Especializações do formulário, psicólogos e especializações pré-carregadas,
+                # nas duas ordenações (a por disponibilidade lê o slot materializado na mesma query)
+                self.assertEqual(numeros_de_queries, [3] * 2)
@@ -23,5 +23,9 @@ urlpatterns = [
     path("consultas/<int:pk>/checklist/paciente/", views.ConsultaChecklistPacienteUpdateView.as_view(), name="consulta_checklist_paciente"),
     path("consultas/<int:pk>/anotacoes/", views.ConsultaAnotacoesUpdateView.as_view(), name="consulta_anotacoes"),
     path("consultas/<int:pk>/cancelar/", views.CancelarConsultaPacienteView.as_view(), name="consulta_cancelar"),
+    path('notificacoes/', views.NotificacoesView.as_view(), name='notificacoes'),
+    path('notificacoes/novas/', views.NotificacoesNovasView.as_view(), name='notificacoes_novas'),
+    path('notificacoes/ao-vivo/', views.NotificacoesAoVivoView.as_view(), name='notificacoes_ao_vivo'),
+    path('notificacoes/confirmar/', views.ConfirmarNotificacoesView.as_view(), name='confirmar_notificacoes'),
     path('notificacoes/marcar-como-lidas/', views.MarcarNotificacoesComoLidasView.as_view(), name='marcar_notificacoes_como_lidas'),
 ]
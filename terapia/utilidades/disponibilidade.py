@@ -0,0 +1,147 @@
+from bisect import bisect_right
+from datetime import UTC, timedelta
+from django.utils import timezone
+from terapia.constantes import (
+    CONSULTA_DURACAO,
+    CONSULTA_DURACAO_MINUTOS,
+    NUMERO_PERIODOS_POR_SEMANA,
+)
+
+
+MINUTOS_POR_SEMANA = 7 * 24 * 60
+MASCARA_SEMANA_COMPLETA = (1 << NUMERO_PERIODOS_POR_SEMANA) - 1
+TAMANHO_MASCARA_EM_BYTES = (NUMERO_PERIODOS_POR_SEMANA + 7) // 8
+
+
+def get_minuto_da_semana_utc(data_hora):
+    """
+    Retorna quantos minutos se passaram desde 00:00 de segunda-feira (UTC)
+    até a data-hora enviada. Segundos e microssegundos são desprezados.
+    """
+    data_hora_utc = timezone.localtime(data_hora, UTC)
+    return (data_hora_utc.isoweekday() - 1) * 24 * 60 + data_hora_utc.hour * 60 + data_hora_utc.minute
+
+
+def get_inicio_do_periodo(data_hora):
+    """
+    Retorna o início do período de duração CONSULTA_DURACAO (alinhado à semana em UTC)
+    que contém a data-hora enviada.
+    """
+    data_hora = data_hora.replace(second=0, microsecond=0)
+    return data_hora - timedelta(minutes=get_minuto_da_semana_utc(data_hora) % CONSULTA_DURACAO_MINUTOS)
+
+
+def get_slot(data_hora):
+    """
+    Retorna o índice inteiro do período de duração CONSULTA_DURACAO que contém a data-hora
+    enviada, contado a partir da época Unix (minutos desde a época divididos pela duração).
+    Segundos e microssegundos são desprezados.
+    """
+    return int(data_hora.timestamp()) // 60 // CONSULTA_DURACAO_MINUTOS
+
+
+def get_slots_que_tomariam_tempo_de(data_hora):
+    """
+    Retorna os slots em que uma consulta alinhada tomaria tempo de uma consulta iniciada na
+    data-hora enviada: só o próprio slot se a data-hora estiver alinhada, ou também o seguinte
+    caso contrário.
+    """
+    slot = get_slot(data_hora)
+
+    if get_inicio_do_periodo(data_hora) == data_hora:
+        return [slot]
+
+    return [slot, slot + 1]
+
+
+def _get_bits_dos_periodos(primeiro_periodo, periodo_final):
+    """
+    Retorna a máscara com os bits dos períodos no intervalo [primeiro_periodo, periodo_final),
+    dando a volta na semana se necessário.
+    """
+    if periodo_final <= primeiro_periodo:
+        return 0
+
+    bits = ((1 << (periodo_final - primeiro_periodo)) - 1) << primeiro_periodo
+    return (bits | (bits >> NUMERO_PERIODOS_POR_SEMANA)) & MASCARA_SEMANA_COMPLETA
+
+
+def criar_mascara_disponibilidade(intervalos):
+    """
+    Cria a máscara semanal de disponibilidade a partir de pares
+    (data_hora_inicio, data_hora_fim) de intervalos de disponibilidade.
+    """
+    return criar_mascara_disponibilidade_em_minutos(
+        (get_minuto_da_semana_utc(data_hora_inicio), get_minuto_da_semana_utc(data_hora_fim))
+        for data_hora_inicio, data_hora_fim in intervalos
+    )
+
+
+def criar_mascara_disponibilidade_em_minutos(intervalos):
+    """
+    Cria a máscara semanal de disponibilidade a partir de pares
+    (minuto_inicio, minuto_fim) de minutos da semana em UTC.
+
+    Cada bit da máscara representa um período de duração CONSULTA_DURACAO da
+    semana em UTC, começando em 00:00 de segunda-feira. Um bit só é ligado se
+    o período inteiro estiver contido em algum intervalo.
+    """
+    mascara = 0
+
+    for minuto_inicio, minuto_fim in intervalos:
+        if minuto_inicio == minuto_fim:
+            return MASCARA_SEMANA_COMPLETA
+
+        minuto_fim_sem_virar = minuto_inicio + (minuto_fim - minuto_inicio) % MINUTOS_POR_SEMANA
+        primeiro_periodo = -(-minuto_inicio // CONSULTA_DURACAO_MINUTOS)
+        periodo_final = minuto_fim_sem_virar // CONSULTA_DURACAO_MINUTOS
+        mascara |= _get_bits_dos_periodos(primeiro_periodo, periodo_final)
+
+    return mascara
+
+
+def cabe_consulta_na_mascara(mascara, data_hora):
+    """
+    Verifica se uma consulta que começa na data-hora enviada cabe
+    completamente nos períodos ligados da máscara.
+    """
+    minuto_inicio = get_minuto_da_semana_utc(data_hora)
+    primeiro_periodo = minuto_inicio // CONSULTA_DURACAO_MINUTOS
+    periodo_final = -(-(minuto_inicio + CONSULTA_DURACAO_MINUTOS) // CONSULTA_DURACAO_MINUTOS)
+    bits = _get_bits_dos_periodos(primeiro_periodo, periodo_final)
+    return mascara & bits == bits
+
+
+def tem_consulta_conflitante(datas_hora_ocupadas, data_hora):
+    """
+    Verifica, por busca binária, se alguma das data-horas de início de consultas
+    (ordenadas em ordem crescente) tomaria tempo de uma consulta que começa na data-hora enviada.
+    """
+    i = bisect_right(datas_hora_ocupadas, data_hora - CONSULTA_DURACAO)
+    return i < len(datas_hora_ocupadas) and datas_hora_ocupadas[i] < data_hora + CONSULTA_DURACAO
+
+
+def gerar_datas_hora_agendaveis(mascara, datas_hora_ocupadas, inicio, fim):
+    """
+    Gera, em ordem crescente, as data-horas de início de consulta alinhadas aos períodos
+    de CONSULTA_DURACAO no intervalo [inicio, fim) que cabem na máscara e que não
+    conflitam com as data-horas ocupadas (ordenadas em ordem crescente).
+    """
+    data_hora = get_inicio_do_periodo(inicio)
+
+    if data_hora < inicio:
+        data_hora += CONSULTA_DURACAO
+
+    while data_hora < fim:
+        if cabe_consulta_na_mascara(mascara, data_hora) and not tem_consulta_conflitante(datas_hora_ocupadas, data_hora):
+            yield data_hora
+
+        data_hora += CONSULTA_DURACAO
+
+
+def mascara_para_bytes(mascara):
+    return mascara.to_bytes(TAMANHO_MASCARA_EM_BYTES, "little")
+
+
+def mascara_de_bytes(mascara_em_bytes):
+    return int.from_bytes(bytes(mascara_em_bytes or b""), "little")
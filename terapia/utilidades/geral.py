@@ -1,6 +1,7 @@
 from datetime import date, datetime, UTC
+from functools import lru_cache
 from django.utils import timezone
-from terapia.constantes import NUMERO_PERIODOS_POR_DIA
+from terapia.constantes import CONVERSAO_DIA_SEMANA_CACHE_TAMANHO, NUMERO_PERIODOS_POR_DIA
 
 
 def regra_de_3_numero_periodos_por_dia(n):
@@ -18,17 +19,8 @@ def desprezar_segundos_e_microssegundos(data_hora):
     return data_hora.replace(second=0, microsecond=0)
 
 
-def converter_dia_semana_iso_com_hora_para_data_hora(dia_semana_iso, hora, fuso):
-    """
-    Função para converter um par de dia da semana ISO e hora em um objeto datetime.
-    Essa conversão é necessária apenas para fazer queries e operações de comparação
-    suportadas pelo tipo datetime. Portanto, a data combinada ao dia da semana ISO
-    será apenas um "dummy" para que se possa fazer as operações do tipo datetime.
-
-    Segundos e microssegundos são desprezados.
-    """
-    hora = desprezar_segundos_e_microssegundos(hora)
-
+@lru_cache(maxsize=CONVERSAO_DIA_SEMANA_CACHE_TAMANHO)
+def _converter_dia_semana_iso_com_hora_para_data_hora(dia_semana_iso, hora, fuso):
     data_hora_fuso_original = datetime.combine(
         date(2024, 7, dia_semana_iso),
         hora,
@@ -42,3 +34,45 @@ def converter_dia_semana_iso_com_hora_para_data_hora(dia_semana_iso, hora, fuso)
         data_hora_convertida.time(),
         data_hora_convertida.tzinfo,
     )
+
+
+def converter_dia_semana_iso_com_hora_para_data_hora(dia_semana_iso, hora, fuso):
+    """
+    Função para converter um par de dia da semana ISO e hora em um objeto datetime.
+    Essa conversão é necessária apenas para fazer queries e operações de comparação
+    suportadas pelo tipo datetime. Portanto, a data combinada ao dia da semana ISO
+    será apenas um "dummy" para que se possa fazer as operações do tipo datetime.
+
+    Segundos e microssegundos são desprezados.
+
+    Os resultados são memorizados por (dia da semana, hora, fuso), com descarte dos
+    menos usados recentemente quando a tabela passa de CONVERSAO_DIA_SEMANA_CACHE_TAMANHO.
+    A hora é truncada antes da busca no cache, para que instantes do mesmo minuto (como
+    agora.time()) usem a mesma entrada.
+    """
+    return _converter_dia_semana_iso_com_hora_para_data_hora(
+        dia_semana_iso, desprezar_segundos_e_microssegundos(hora), fuso,
+    )
+
+
+converter_dia_semana_iso_com_hora_para_data_hora.cache_info = _converter_dia_semana_iso_com_hora_para_data_hora.cache_info
+converter_dia_semana_iso_com_hora_para_data_hora.cache_clear = _converter_dia_semana_iso_com_hora_para_data_hora.cache_clear
+
+
+def iterar_lotes_de_pks(queryset, tamanho_lote):
+    """
+    Gera listas de até tamanho_lote chaves primárias do queryset, em ordem crescente, com
+    paginação por chave (pk maior que a última vista). Como cada lote é buscado só depois de
+    o anterior ser processado, o chamador pode apagar as linhas de cada lote.
+    """
+    ultimo_pk = None
+
+    while True:
+        lote = queryset if ultimo_pk is None else queryset.filter(pk__gt=ultimo_pk)
+        pks = list(lote.order_by("pk").values_list("pk", flat=True)[:tamanho_lote])
+
+        if not pks:
+            return
+
+        yield pks
+        ultimo_pk = pks[-1]
@@ -0,0 +1,92 @@
+"""
+Operações sobre a matriz de disponibilidade (7 dias x NUMERO_PERIODOS_POR_DIA períodos).
+
+Internamente, a matriz é tratada como uma semana "achatada" de 7 * NUMERO_PERIODOS_POR_DIA
+posições, começando na segunda-feira às 00:00. Assim, o preenchimento é feito com atribuição
+por fatias e a extração dos intervalos é feita por detecção de sequências contínuas (run-length),
+sem percorrer a matriz célula a célula.
+"""
+from terapia.constantes import NUMERO_PERIODOS_POR_DIA
+
+
+def criar_semana_achatada(faixas, numero_periodos_por_dia=NUMERO_PERIODOS_POR_DIA):
+    """
+    Cria a semana achatada de booleanos (segunda a domingo) a partir de faixas de períodos.
+
+    @param faixas: iterável de pares (inicio, fim) de índices de período na semana achatada.
+    Se fim <= inicio, a faixa vira a semana (e, se fim == inicio, cobre a semana inteira).
+    """
+    numero_periodos_por_semana = 7 * numero_periodos_por_dia
+    semana = [False] * numero_periodos_por_semana
+
+    for inicio, fim in faixas:
+        inicio %= numero_periodos_por_semana
+        fim %= numero_periodos_por_semana
+
+        if fim <= inicio:
+            fim += numero_periodos_por_semana
+
+        if fim <= numero_periodos_por_semana:
+            semana[inicio:fim] = [True] * (fim - inicio)
+        else:
+            semana[inicio:] = [True] * (numero_periodos_por_semana - inicio)
+            semana[:fim - numero_periodos_por_semana] = [True] * (fim - numero_periodos_por_semana)
+
+    return semana
+
+
+def semana_achatada_para_matriz(semana, numero_periodos_por_dia=NUMERO_PERIODOS_POR_DIA):
+    """
+    Converte a semana achatada (segunda a domingo) em uma matriz de 7 linhas de domingo a sábado,
+    que é o formato usado nos templates.
+    """
+    matriz = [semana[i:i + numero_periodos_por_dia] for i in range(0, len(semana), numero_periodos_por_dia)]
+    matriz.insert(0, matriz.pop())
+    return matriz
+
+
+def matriz_para_semana_achatada(matriz):
+    """
+    Converte uma matriz de domingo a sábado na semana achatada (segunda a domingo).
+    """
+    if not matriz:
+        return []
+
+    semana = []
+
+    for linha in matriz[1:]:
+        semana.extend(linha)
+
+    semana.extend(matriz[0])
+    return semana
+
+
+def extrair_faixas(semana):
+    """
+    Extrai as faixas contínuas de períodos disponíveis da semana achatada.
+
+    Retorna uma lista de pares (inicio, fim), com fim exclusivo. Uma faixa que termina no fim da
+    semana é unida à faixa que começa no início dela, resultando em uma faixa que vira a semana
+    (fim <= inicio). Nesse caso, a faixa unida é a última da lista. Se a semana inteira estiver
+    disponível, retorna uma única faixa (0, 0).
+    """
+    numero_periodos_por_semana = len(semana)
+    faixas = []
+    inicio = None
+
+    for indice, disponivel in enumerate(semana):
+        if disponivel and inicio is None:
+            inicio = indice
+        elif not disponivel and inicio is not None:
+            faixas.append((inicio, indice))
+            inicio = None
+
+    if inicio is not None:
+        if inicio == 0:
+            faixas.append((0, 0))
+        elif faixas and faixas[0][0] == 0:
+            faixas.append((inicio, faixas.pop(0)[1]))
+        else:
+            faixas.append((inicio, numero_periodos_por_semana))
+
+    return faixas
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+
+class CanalDeNotificacoes:
+    """
+    Pub/sub em memória que acorda os streams de notificações (NotificacoesAoVivoView) do
+    destinatário assim que uma notificação é confirmada no banco.
+
+    Só alcança os streams do mesmo processo. Os dos outros processos recebem a notificação
+    pela consulta periódica ao banco (NOTIFICACOES_AO_VIVO_INTERVALO_POLLING), que usa o
+    último id enviado, então uma publicação perdida só atrasa a entrega.
+    """
+    def __init__(self):
+        self._assinaturas = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def assinar(self, usuario_id):
+        """
+        Registra um stream do usuário no event loop atual e retorna o asyncio.Event que
+        será ligado a cada publicação para ele.
+        """
+        assinatura = (asyncio.get_running_loop(), asyncio.Event())
+
+        with self._lock:
+            self._assinaturas[usuario_id].add(assinatura)
+
+        return assinatura
+
+    def cancelar(self, usuario_id, assinatura):
+        with self._lock:
+            assinaturas = self._assinaturas.get(usuario_id)
+
+            if assinaturas is not None:
+                assinaturas.discard(assinatura)
+
+                if not assinaturas:
+                    del self._assinaturas[usuario_id]
+
+    def publicar(self, usuarios_ids):
+        """
+        Acorda os streams dos usuários enviados. Pode ser chamado de qualquer thread.
+        """
+        with self._lock:
+            assinaturas = [
+                assinatura
+                for usuario_id in set(usuarios_ids)
+                for assinatura in self._assinaturas.get(usuario_id, ())
+            ]
+
+        for loop, evento in assinaturas:
+            try:
+                loop.call_soon_threadsafe(evento.set)
+            except RuntimeError:
+                # O event loop do stream já foi fechado; a assinatura será cancelada por ele
+                pass
+
+
+canal_de_notificacoes = CanalDeNotificacoes()
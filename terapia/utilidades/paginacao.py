@@ -0,0 +1,65 @@
+import base64
+import binascii
+import json
+from functools import reduce
+from operator import or_
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+def _get_campo(queryset, chave):
+    nome = chave.lstrip("-")
+    anotacao = queryset.query.annotations.get(nome)
+
+    if anotacao is None:
+        modelo = queryset.model
+        return modelo._meta.pk if nome == "pk" else modelo._meta.get_field(nome)
+
+    # Campo de saída da anotação, ligado ao nome dela para que o valor seja lido do objeto
+    campo = anotacao.output_field.clone()
+    campo.set_attributes_from_name(nome)
+    return campo
+
+
+def codificar_cursor(objeto, queryset, ordenacao):
+    """
+    Codifica, numa string segura para URLs, os valores das chaves de ordenação do objeto
+    (campos do modelo ou anotações do queryset, com "-" para ordem decrescente, por exemplo
+    ["-data_hora_solicitada", "pk"]).
+    """
+    valores = [_get_campo(queryset, chave).value_to_string(objeto) for chave in ordenacao]
+    # Sem o preenchimento "=", que precisaria ser escapado na URL
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor, queryset, ordenacao):
+    """
+    Retorna os valores das chaves de ordenação codificados no cursor, convertidos para os
+    tipos dos campos do modelo (ou das anotações do queryset), ou None se o cursor for inválido.
+    """
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode() + b"=" * (-len(cursor) % 4)))
+
+        if not isinstance(valores, list) or len(valores) != len(ordenacao):
+            return None
+
+        return [_get_campo(queryset, chave).to_python(valor) for chave, valor in zip(ordenacao, valores)]
+    except (binascii.Error, FieldDoesNotExist, TypeError, UnicodeError, ValidationError, ValueError):
+        return None
+
+
+def get_filtro_apos_cursor(ordenacao, valores):
+    """
+    Retorna o filtro das linhas que vêm depois do cursor na ordenação enviada (comparação
+    lexicográfica das chaves), para paginar sem OFFSET: cada página é buscada pelo índice a
+    partir da última linha da anterior, com custo que não cresce com o número de páginas.
+    As chaves não podem ser nulas e a última deve ser única.
+    """
+    condicoes = []
+
+    for i, chave in enumerate(ordenacao):
+        iguais = {campo.lstrip("-"): valor for campo, valor in zip(ordenacao[:i], valores[:i])}
+        lookup = "lt" if chave.startswith("-") else "gt"
+        condicoes.append(Q(**iguais, **{f"{chave.lstrip('-')}__{lookup}": valores[i]}))
+
+    return reduce(or_, condicoes)
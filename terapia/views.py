@@ -1,13 +1,16 @@
-from datetime import datetime, timedelta
+import asyncio
+from datetime import timedelta
+from itertools import chain
 import json
 
+from asgiref.sync import sync_to_async
+
 from django.contrib import messages
 from django.contrib.auth import login
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import LoginView
-from django.core.exceptions import ValidationError
-from django.db import transaction
-from django.http import HttpResponseForbidden
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.http import Http404, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
 from django.utils import timezone
@@ -15,6 +18,7 @@ from django.views import View
 from django.views.generic import FormView, ListView, TemplateView, UpdateView
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import ContextMixin, FormMixin, SingleObjectMixin
+from django.views.generic.list import MultipleObjectMixin
 from django.conf import settings
 from django.utils.decorators import method_decorator
 from django_ratelimit.decorators import ratelimit
@@ -25,7 +29,14 @@ from terapia.constantes import (
     CONSULTA_ANTECEDENCIA_MINIMA,
     CONSULTA_DURACAO,
     CONSULTA_DURACAO_MINUTOS,
+    MINHAS_CONSULTAS_POR_PAGINA,
+    NOTIFICACOES_AO_VIVO_DURACAO_MAXIMA,
+    NOTIFICACOES_AO_VIVO_ESPERA_RECONEXAO,
+    NOTIFICACOES_AO_VIVO_INTERVALO_POLLING,
+    NOTIFICACOES_POR_PAGINA,
     NUMERO_PERIODOS_POR_DIA,
+    ORDENACAO_DISPONIVEL_MAIS_CEDO,
+    PESQUISA_PSICOLOGOS_POR_PAGINA,
 )
 from .forms import (
     PacienteCreationForm,
@@ -38,6 +49,9 @@ from .forms import (
     ConsultaFiltrosForm,
 )
 from .models import Consulta, EstadoConsulta, Psicologo, TipoNotificacao
+from .service import AgendamentoService
+from .utilidades.notificacoes_ao_vivo import canal_de_notificacoes
+from .utilidades.paginacao import codificar_cursor, decodificar_cursor, get_filtro_apos_cursor
 from usuario.forms import EmailAuthenticationForm, UsuarioCreationForm
 from .forms import ConsultaChecklistForm
 from .forms import ConsultaAnotacoesForm
@@ -71,6 +85,44 @@ class GetFormMixin(FormMixin):
         return kwargs
 
 
+class PaginacaoPorCursorMixin(MultipleObjectMixin):
+    """
+    Paginação por cursor (keyset) na ordenação estável ordenacao_cursor, cuja última chave
+    deve ser única. Cada página é buscada a partir das chaves da última linha da anterior,
+    sem OFFSET nem COUNT, então o custo não cresce com o histórico. Os links de página
+    preservam os demais parâmetros da URL (os filtros do formulário).
+    """
+    ordenacao_cursor = ["pk"]
+
+    def paginate_queryset(self, queryset, page_size):
+        self.proximo_cursor = None
+        cursor = self.request.GET.get("cursor")
+
+        queryset = queryset.order_by(*self.ordenacao_cursor)
+
+        if cursor:
+            valores = decodificar_cursor(cursor, queryset, self.ordenacao_cursor)
+
+            if valores is None:
+                raise Http404("Página inválida.")
+
+            queryset = queryset.filter(get_filtro_apos_cursor(self.ordenacao_cursor, valores))
+
+        # Uma linha a mais indica se há próxima página
+        objetos = list(queryset[:page_size + 1])
+
+        if len(objetos) > page_size:
+            objetos = objetos[:page_size]
+            self.proximo_cursor = codificar_cursor(objetos[-1], queryset, self.ordenacao_cursor)
+
+        return None, None, objetos, bool(cursor or self.proximo_cursor)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["proximo_cursor"] = self.proximo_cursor
+        return context
+
+
 class FluxoAlternativoLoginContextMixin(ContextMixin):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -204,6 +256,9 @@ class CancelarConsultaPacienteView(DeveTerCargoMixin, View):
         if not (getattr(request.user, "is_paciente", False) or getattr(request.user, "is_psicologo", False)):
             return HttpResponseForbidden("Sua conta precisa ser do tipo paciente ou psicólogo.")
 
+        # Aplica antes as transições automáticas pendentes, já que as listagens não as persistem
+        Consulta.atualizar_estados_automaticamente(Consulta.objects.filter(pk=pk))
+
         if getattr(request.user, "is_paciente", False):
             consulta = get_object_or_404(Consulta, pk=pk, paciente=request.user.paciente)
         else:
@@ -239,6 +294,9 @@ class AceitarConsultaPsicologoView(View):
         if not request.user.is_psicologo:
             return HttpResponseForbidden("Sua conta precisa ser do tipo psicólogo.")
 
+        # Aplica antes as transições automáticas pendentes, já que as listagens não as persistem
+        Consulta.atualizar_estados_automaticamente(Consulta.objects.filter(pk=pk))
+
         consulta = get_object_or_404(
             Consulta,
             pk=pk,
@@ -290,9 +348,13 @@ class PerfilView(FormView, SingleObjectMixin, TabelaDisponibilidadeContextMixin)
         ctx = super().get_context_data(**kwargs)
         ocupados = [
             timezone.localtime(c.data_hora_agendada).strftime("%Y-%m-%dT%H:%M")
-            for c in self.object.consultas.exclude(estado=EstadoConsulta.CANCELADA)
+            for c in self.object.consultas.ocupando_horario()
         ]
         ctx["SLOTS_OCUPADOS_JSON"] = json.dumps(ocupados)
+        ctx["SLOTS_AGENDAVEIS_JSON"] = json.dumps([
+            timezone.localtime(data_hora).strftime("%Y-%m-%dT%H:%M")
+            for data_hora in self.object.slots_agendaveis.agendaveis().values_list("data_hora", flat=True)
+        ])
 
         ctx["perfil_config"] = {
             "matriz": json.loads(self.object.get_matriz_disponibilidade_booleanos_em_json()),
@@ -318,24 +380,11 @@ class PerfilView(FormView, SingleObjectMixin, TabelaDisponibilidadeContextMixin)
                 messages.error(request, "Formato inválido dos horários selecionados.")
                 return self.get(request, *args, **kwargs)
 
-            psicologo = self.get_object()
-            paciente = request.user.paciente
-            tz = timezone.get_current_timezone()
-
-            criadas, falhas = 0, []
-            with transaction.atomic():
-                for s in slots:
-                    try:
-                        dt_naive = datetime.fromisoformat(s)
-                        dt = timezone.make_aware(dt_naive, tz)
-                        c = Consulta(paciente=paciente, psicologo=psicologo, data_hora_agendada=dt)
-                        c.full_clean()
-                        c.save()
-                        criadas += 1
-                    except ValidationError as ve:
-                        falhas.append((s, "; ".join(sum(ve.message_dict.values(), []))))
-                    except Exception as e:
-                        falhas.append((s, str(e)))
+            criadas, falhas = AgendamentoService.criar_consultas_em_lote(
+                paciente=request.user.paciente,
+                psicologo=self.get_object(),
+                slots_horarios=slots,
+            )
 
             if criadas:
                 messages.success(request, f"{criadas} consulta(s) solicitada(s).")
@@ -352,14 +401,16 @@ class PerfilView(FormView, SingleObjectMixin, TabelaDisponibilidadeContextMixin)
         return super().form_valid(form)
     
 
-class PesquisaView(ListView, GetFormMixin):
+class PesquisaView(PaginacaoPorCursorMixin, ListView, GetFormMixin):
     template_name = "pesquisa/pesquisa.html"
     context_object_name = "psicologos"
     form_class = PsicologoFiltrosForm
     allow_empty = True
+    paginate_by = PESQUISA_PSICOLOGOS_POR_PAGINA
+    ordenacao_cursor = ["nome_completo", "pk"]
 
     def get_queryset(self):
-        queryset = Psicologo.completos.all()
+        queryset = Psicologo.objects.para_pesquisa()
 
         form = self.get_form()
 
@@ -379,17 +430,23 @@ class PesquisaView(ListView, GetFormMixin):
                 queryset = queryset.filter(valor_consulta__lte=valor_maximo)
 
             if disponibilidade is not None:
-                psicologo_ids = [psicologo.id for psicologo in queryset.iterator() if psicologo.esta_agendavel_em(disponibilidade)]
-                queryset = queryset.filter(id__in=psicologo_ids)
+                queryset = queryset.com_slot_agendavel_em(disponibilidade)
+
+            if form.cleaned_data.get("ordenacao") == ORDENACAO_DISPONIVEL_MAIS_CEDO:
+                # Ordenados no banco pelo próximo slot materializado, sem carregar os demais candidatos
+                self.ordenacao_cursor = ["proximo_slot_agendavel", "pk"]
+                queryset = queryset.filter(proximo_slot_agendavel__isnull=False)
 
         return queryset
 
 
-class MinhasConsultasView(DeveTerCargoMixin, ListView, GetFormMixin):
+class MinhasConsultasView(DeveTerCargoMixin, PaginacaoPorCursorMixin, ListView, GetFormMixin):
     template_name = "minhas_consultas/minhas_consultas.html"
     allow_empty = True
     context_object_name = "consultas"
     form_class = ConsultaFiltrosForm
+    paginate_by = MINHAS_CONSULTAS_POR_PAGINA
+    ordenacao_cursor = ["-data_hora_solicitada", "-data_hora_agendada", "pk"]
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
@@ -399,13 +456,16 @@ class MinhasConsultasView(DeveTerCargoMixin, ListView, GetFormMixin):
     def get_queryset(self):
         queryset = None
 
+        # O estado efetivo é calculado na leitura, então esta página não escreve no banco. O estado
+        # persistido é atualizado em lote pelo agendador_consultas ou antes de cada ação sobre a consulta
         if self.request.user.is_paciente:
-            queryset = Consulta.objects.filter(paciente=self.request.user.paciente)
+            queryset = Consulta.objects.com_estado_efetivo().filter(
+                paciente=self.request.user.paciente,
+            ).select_related("psicologo")
         elif self.request.user.is_psicologo:
-            queryset = Consulta.objects.filter(psicologo=self.request.user.psicologo)
-
-        if queryset is not None:
-            Consulta.atualizar_estados_automaticamente(queryset)
+            queryset = Consulta.objects.com_estado_efetivo().filter(
+                psicologo=self.request.user.psicologo,
+            ).select_related("paciente")
 
         form = self.get_form()
 
@@ -416,7 +476,7 @@ class MinhasConsultasView(DeveTerCargoMixin, ListView, GetFormMixin):
             data_final = form.cleaned_data.get("data_final")
 
             if estado:
-                queryset = queryset.filter(estado=estado)
+                queryset = queryset.filter(estado_efetivo=estado)
 
             if paciente_ou_psicologo is not None:
                 if self.request.user.is_paciente:
@@ -431,8 +491,29 @@ class MinhasConsultasView(DeveTerCargoMixin, ListView, GetFormMixin):
                 # Somar 1 dia para incluir até as 23:59 da data final especificada
                 queryset = queryset.filter(data_hora_agendada__lt=data_final + timedelta(days=1))
 
+        self.consultas_filtradas = queryset
         return queryset
 
+    def get_proxima_consulta(self):
+        """
+        Busca, entre todas as consultas filtradas (e não só as da página), a consulta em
+        andamento ou, se não houver, a próxima consulta confirmada ou solicitada.
+        """
+        return self.consultas_filtradas.filter(
+            Q(estado_efetivo=EstadoConsulta.EM_ANDAMENTO) |
+            Q(
+                estado_efetivo__in=[EstadoConsulta.CONFIRMADA, EstadoConsulta.SOLICITADA],
+                data_hora_agendada__gte=timezone.now(),
+            )
+        ).order_by(
+            Case(
+                When(estado_efetivo=EstadoConsulta.EM_ANDAMENTO, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            ),
+            "data_hora_agendada",
+        ).first()
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
@@ -445,27 +526,16 @@ class MinhasConsultasView(DeveTerCargoMixin, ListView, GetFormMixin):
             EstadoConsulta.FINALIZADA: "completed",
         }
 
-        agora = timezone.now()
-        proxima_consulta = None
+        proxima_consulta = self.get_proxima_consulta()
 
-        for consulta in context["consultas"]:
+        for consulta in chain(context["consultas"], [proxima_consulta] if proxima_consulta else []):
+            # Só em memória, para que os templates mostrem o estado efetivo
+            consulta.estado = consulta.estado_efetivo
             consulta.classe = consulta_classes_dict.get(consulta.estado, "")
 
             if consulta.estado != EstadoConsulta.EM_ANDAMENTO:
                 consulta.classe += " text-white"
 
-            if proxima_consulta and proxima_consulta.estado == EstadoConsulta.EM_ANDAMENTO:
-                continue
-
-            if consulta.estado == EstadoConsulta.EM_ANDAMENTO:
-                proxima_consulta = consulta
-            elif (
-                    consulta.estado in [EstadoConsulta.CONFIRMADA, EstadoConsulta.SOLICITADA] and
-                    consulta.data_hora_agendada >= agora
-            ):
-                if proxima_consulta is None or consulta.data_hora_agendada < proxima_consulta.data_hora_agendada:
-                    proxima_consulta = consulta
-
         context["proxima_consulta"] = proxima_consulta
         return context
 
@@ -606,6 +676,19 @@ class ConsultaAnotacoesUpdateView(DeveSerPsicologoMixin, View):
         return redirect(next_url)
     
 
+class NotificacoesView(DeveTerCargoMixin, ListView):
+    """
+    Lista paginada de todas as notificações do usuário autenticado. O cabeçalho só mostra as
+    mais recentes (Usuario.notificacoes_recentes).
+    """
+    template_name = "notificacoes/notificacoes.html"
+    context_object_name = "notificacoes"
+    paginate_by = NOTIFICACOES_POR_PAGINA
+
+    def get_queryset(self):
+        return self.request.user.notificacoes_como_destinatario.para_caixa_de_entrada()
+
+
 class MarcarNotificacoesComoLidasView(DeveTerCargoMixin, View):
     """
     Marca todas as notificações do usuário autenticado como lidas.
@@ -614,6 +697,126 @@ class MarcarNotificacoesComoLidasView(DeveTerCargoMixin, View):
         if not request.user.is_authenticated:
             return HttpResponseForbidden("Você precisa estar autenticado para marcar notificações como lidas.")
 
-        Notificacao.objects.filter(destinatario=request.user, lida=False).update(lida=True)
+        Notificacao.objects.marcar_como_lidas(request.user)
         return redirect(request.META.get("HTTP_REFERER", "/"))
 
+
+class NotificacoesNovasView(DeveTerCargoMixin, View):
+    """
+    Retorna, em JSON, as notificações do usuário posteriores ao id enviado no parâmetro "desde"
+    (a notificação mais recente já exibida no cabeçalho) e quantas ainda não foram lidas.
+
+    É consultada pelo cabeçalho a cada NOTIFICACOES_AO_VIVO_INTERVALO_POLLING quando o stream
+    NotificacoesAoVivoView está desabilitado (ver settings.NOTIFICACOES_AO_VIVO_SSE). Cada
+    requisição termina na hora, então não prende um worker do servidor WSGI.
+    """
+    def get(self, request):
+        try:
+            ultimo_id = int(request.GET.get("desde") or 0)
+        except ValueError:
+            return HttpResponseBadRequest("Id de notificação inválido.")
+
+        return JsonResponse({
+            "notificacoes": self.get_notificacoes_novas(request.user.pk, ultimo_id),
+            "nao_lidas": request.user.notificacoes_nao_lidas,
+        })
+
+    @staticmethod
+    def get_notificacoes_novas(usuario_id, ultimo_id):
+        notificacoes = Notificacao.objects.para_caixa_de_entrada().filter(
+            destinatario_id=usuario_id, pk__gt=ultimo_id,
+        ).order_by("pk")
+
+        return [
+            {
+                "id": notificacao.pk,
+                "lida": notificacao.lida,
+                "mensagem": notificacao.mensagem,
+                "data_hora_criada": timezone.localtime(notificacao.data_hora_criada).strftime("%d/%m/%Y %H:%M"),
+            }
+            for notificacao in notificacoes
+        ]
+
+
+class NotificacoesAoVivoView(View):
+    """
+    Stream (server-sent events) das notificações novas do usuário autenticado, a partir do id
+    enviado no cabeçalho Last-Event-ID (reconexão) ou no parâmetro "desde" (a notificação mais
+    recente já exibida no cabeçalho).
+
+    O stream acorda quando Notificacao.publicar avisa pelo canal em memória do processo e,
+    de qualquer forma, a cada NOTIFICACOES_AO_VIVO_INTERVALO_POLLING, para entregar as
+    notificações criadas em outros processos. Ele é encerrado depois de
+    NOTIFICACOES_AO_VIVO_DURACAO_MAXIMA e o EventSource do navegador reconecta sozinho.
+
+    Só fica habilitado com settings.NOTIFICACOES_AO_VIVO_SSE, ou seja, quando o projeto é servido
+    por um servidor ASGI: num servidor WSGI a resposta seria acumulada até o fim do stream e
+    cada aba aberta prenderia um worker.
+    """
+    async def get(self, request):
+        if not settings.NOTIFICACOES_AO_VIVO_SSE:
+            raise Http404("Notificações ao vivo desabilitadas.")
+
+        usuario = await request.auser()
+
+        if not usuario.is_authenticated:
+            return HttpResponseForbidden("Você precisa estar autenticado para receber notificações.")
+
+        try:
+            ultimo_id = int(request.headers.get("Last-Event-ID") or request.GET.get("desde") or 0)
+        except ValueError:
+            return HttpResponseBadRequest("Id de notificação inválido.")
+
+        response = StreamingHttpResponse(
+            self.gerar_eventos(usuario.pk, ultimo_id),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def gerar_eventos(self, usuario_id, ultimo_id):
+        assinatura = canal_de_notificacoes.assinar(usuario_id)
+        _, evento = assinatura
+        fim = asyncio.get_running_loop().time() + NOTIFICACOES_AO_VIVO_DURACAO_MAXIMA.total_seconds()
+
+        try:
+            yield f"retry: {int(NOTIFICACOES_AO_VIVO_ESPERA_RECONEXAO.total_seconds() * 1000)}\n\n"
+
+            while True:
+                evento.clear()
+
+                for notificacao in await sync_to_async(NotificacoesNovasView.get_notificacoes_novas)(usuario_id, ultimo_id):
+                    ultimo_id = notificacao["id"]
+                    yield f"id: {ultimo_id}\ndata: {json.dumps(notificacao)}\n\n"
+
+                restante = fim - asyncio.get_running_loop().time()
+
+                if restante <= 0:
+                    break
+
+                try:
+                    await asyncio.wait_for(
+                        evento.wait(),
+                        min(NOTIFICACOES_AO_VIVO_INTERVALO_POLLING.total_seconds(), restante),
+                    )
+                except asyncio.TimeoutError:
+                    # Mantém a conexão viva através de proxies enquanto não há notificações
+                    yield ": ping\n\n"
+        finally:
+            canal_de_notificacoes.cancelar(usuario_id, assinatura)
+
+
+class ConfirmarNotificacoesView(DeveTerCargoMixin, View):
+    """
+    Marca como lidas só as notificações cujos ids foram enviados (JSON {"ids": [...]}), ou seja,
+    as que o usuário de fato viu, e retorna quantas ainda não foram lidas.
+    """
+    def post(self, request):
+        try:
+            ids = [int(pk) for pk in json.loads(request.body or b"{}").get("ids", [])]
+        except (AttributeError, TypeError, ValueError):
+            return HttpResponseBadRequest("Lista de ids inválida.")
+
+        Notificacao.objects.marcar_como_lidas(request.user, ids)
+        return JsonResponse({"nao_lidas": request.user.notificacoes_nao_lidas})
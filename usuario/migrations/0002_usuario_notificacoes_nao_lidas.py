@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuario', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='notificacoes_nao_lidas',
+            field=models.PositiveIntegerField(default=0, verbose_name='Notificações não lidas'),
+        ),
+    ]
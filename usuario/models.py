@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib import admin
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.auth.models import PermissionsMixin, BaseUserManager
+from django.utils.functional import cached_property
+from terapia.constantes import NOTIFICACOES_RECENTES_QUANTIDADE
 
 
 class UsuarioManager(BaseUserManager):
@@ -29,6 +31,9 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(unique=True)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Mantido por Notificacao (F() ao criar, zerado ao marcar como lidas) para que o cabeçalho
+    # não precise consultar as notificações. Corrigido pelo comando reconciliar_notificacoes_nao_lidas
+    notificacoes_nao_lidas = models.PositiveIntegerField('Notificações não lidas', default=0)
 
     objects = UsuarioManager()
     USERNAME_FIELD = 'email'
@@ -56,8 +61,18 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
     def get_short_name(self):
         return self.email
     
+    @cached_property
+    def notificacoes_recentes(self):
+        """
+        Retorna as NOTIFICACOES_RECENTES_QUANTIDADE notificações mais recentes do usuário,
+        com uma única query. As mais antigas ficam na página de notificações, que é paginada.
+        """
+        return list(
+            self.notificacoes_como_destinatario.para_caixa_de_entrada()[:NOTIFICACOES_RECENTES_QUANTIDADE]
+        )
+
     def tem_notificacao_nao_lida(self):
-        return self.notificacoes_como_destinatario.filter(lida=False).exists()
+        return self.notificacoes_nao_lidas > 0
 
     def __str__(self):
         return self.email